@@ -2,4 +2,6 @@
 
 python manage.py collectstatic --no-input
 
+python manage.py manage_message_partitions
+
 gunicorn wemessage.wsgi:application -w 4 -b 0.0.0.0:8000
\ No newline at end of file
@@ -2,6 +2,11 @@
 This file contains all the v1 API imports for groups app.
 """
 
-from .group import CreateGroupAPI, UpdateGroupAPI
-from .group_member import JoinGroupAPI
-from .group_message import CreateGroupMessageAPI
+from .group import CreateGroupAPI, ListUserGroupAPI, UpdateGroupAPI
+from .group_member import JoinGroupAPI, MarkGroupReadAPI, UnreadCountAPI
+from .group_message import (
+    AsyncCreateGroupMessageAPI,
+    CreateGroupMessageAPI,
+    ListGroupMessageAPI,
+    SearchGroupMessageAPI,
+)
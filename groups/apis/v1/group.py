@@ -2,6 +2,8 @@
 This module contains all the APIs related to group model
 """
 
+from datetime import datetime, timezone
+
 from django.utils.functional import empty
 from rest_framework import serializers
 from rest_framework.permissions import IsAuthenticated
@@ -15,6 +17,8 @@ from rest_framework.status import (
 
 from groups.models import Group
 from groups.services import create_group, update_group
+from groups.user_groups import user_groups
+from utils.pagination import decode_cursor, encode_cursor, get_page_size
 from utils.views import CachingAPIView
 
 
@@ -75,7 +79,7 @@ class CreateGroupAPI(CachingAPIView):
                 status=HTTP_400_BAD_REQUEST,
             )
 
-        self.set_cache(key_name=str(group.id), value=group, model=Group)
+        self.set_versioned_cache(key_name=str(group.id), value=group, model=Group)
         return Response(
             data=self.OutputSerializer(group).data,
             status=HTTP_201_CREATED,
@@ -110,7 +114,7 @@ class UpdateGroupAPI(CachingAPIView):
 
         if not (group := self.get_cache(key_name=str(group_id), model=Group)):
             group = Group.active_objects.get(id=group_id)
-            self.set_cache(key_name=str(group_id), value=group, model=Group)
+            self.set_versioned_cache(key_name=str(group_id), value=group, model=Group)
 
         return group
 
@@ -152,7 +156,98 @@ class UpdateGroupAPI(CachingAPIView):
                 status=HTTP_400_BAD_REQUEST,
             )
 
-        self.set_cache(key_name=str(group.id), value=group, model=Group)
+        self.set_versioned_cache(key_name=str(group.id), value=group, model=Group)
+        return Response(
+            status=HTTP_200_OK,
+        )
+
+
+class ListUserGroupAPI(CachingAPIView):
+    """
+    This API is used to list the groups of the user, latest activity first.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    MAX_PAGE_SIZE = 100
+
+    class OutputSerializer(serializers.ModelSerializer):
+        """
+        This class is used to serializer output parameters for encapsulating API
+        """
+
+        class Meta:
+            """
+            This class defines meta information for output serializer
+            """
+
+            model = Group
+            fields = ("id", "name", "description", "image")
+
+    def get_groups(self, group_ids: list[int]) -> dict[int, Group]:
+        """
+        Returns the active groups for the given ids, from the cache where possible.
+        Groups missing from the cache are fetched in a single query and cached.
+        """
+
+        cached = self.bulk_get_cache([str(group_id) for group_id in group_ids], Group)
+        groups = {
+            group_id: group
+            for group_id in group_ids
+            if (group := cached.get(self.get_model_cache_key(str(group_id), Group)))
+        }
+
+        if missing := [group_id for group_id in group_ids if group_id not in groups]:
+            fetched = {
+                group.id: group for group in Group.active_objects.filter(id__in=missing)
+            }
+            self.bulk_set_versioned_cache(
+                {str(group_id): group for group_id, group in fetched.items()},
+                model=Group,
+            )
+            groups.update(fetched)
+
+        return groups
+
+    def get(self, request):
+        """
+        This method is used to list the groups of the user.
+        """
+
+        try:
+            if cursor := request.query_params.get("cursor"):
+                score, group_id = decode_cursor(cursor)
+                cursor = (float(score), int(group_id))
+        except (TypeError, ValueError):
+            return Response(
+                data={"errors": "Invalid cursor"},
+                status=HTTP_400_BAD_REQUEST,
+            )
+
+        page_size = get_page_size(
+            request.query_params.get("page_size"), self.MAX_PAGE_SIZE
+        )
+        # entries are (last activity, group id) pairs, sorted latest first
+        entries = user_groups.get_groups(
+            request.user.uuid, cursor=cursor, count=page_size + 1
+        )
+        page, next_cursor = entries[:page_size], None
+        if len(entries) > page_size:
+            next_cursor = encode_cursor(*page[-1])
+
+        groups = self.get_groups([group_id for _score, group_id in page])
         return Response(
             status=HTTP_200_OK,
+            data={
+                "results": [
+                    {
+                        **self.OutputSerializer(groups[group_id]).data,
+                        "last_activity_at": datetime.fromtimestamp(
+                            score / 1000, tz=timezone.utc
+                        ),
+                    }
+                    for score, group_id in page
+                    if group_id in groups
+                ],
+                "next": next_cursor,
+            },
         )
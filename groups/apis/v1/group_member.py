@@ -2,11 +2,14 @@
 This file contains all the APIs related to group message model.
 """
 
+from rest_framework import serializers
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
 
+from groups.apis.v1.group_message import GroupMessageBaseAPI
 from groups.models import Group, GroupMember
+from groups.read_state import read_state
 from groups.services import create_group_member
 from utils.views import CachingAPIView
 
@@ -25,7 +28,7 @@ class JoinGroupAPI(CachingAPIView):
 
         if not (group := self.get_cache(key_name=str(group_id), model=Group)):
             group = Group.active_objects.get(id=group_id)
-            self.set_cache(key_name=str(group_id), value=group, model=Group)
+            self.set_versioned_cache(key_name=str(group_id), value=group, model=Group)
 
         return GroupMember.objects.get(group_id=group_id, user_id=user_id)
 
@@ -53,7 +56,7 @@ class JoinGroupAPI(CachingAPIView):
                     status=HTTP_400_BAD_REQUEST,
                 )
 
-            self.set_cache(
+            self.set_versioned_cache(
                 key_name=f"{group_id}-{request.user.uuid}",
                 value=group_member,
                 model=GroupMember,
@@ -75,3 +78,79 @@ class JoinGroupAPI(CachingAPIView):
             data={"errors": "Group member already exists"},
             status=HTTP_400_BAD_REQUEST,
         )
+
+
+class MarkGroupReadAPI(GroupMessageBaseAPI):
+    """
+    This API is used to move the read cursor of the user in a group forward.
+    """
+
+    class InputSerializer(serializers.Serializer):
+        """
+        This class is used to serializer mark group read API request body.
+        """
+
+        seq = serializers.IntegerField(min_value=0, required=False)
+
+    def post(self, request, group_id):
+        """
+        This method is used to mark the messages of a group as read, up to `seq`
+        or up to the latest message if `seq` is not given.
+        """
+
+        serializer = self.InputSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(status=HTTP_400_BAD_REQUEST, data=serializer.errors)
+
+        try:
+            self.validate_request(group_id=group_id, user_id=request.user.uuid)
+        except Group.DoesNotExist:
+            return Response(
+                data={"errors": "Group not found"},
+                status=HTTP_400_BAD_REQUEST,
+            )
+        except GroupMember.DoesNotExist:
+            return Response(
+                data={"errors": "Group member not found"},
+                status=HTTP_400_BAD_REQUEST,
+            )
+
+        # the cached group is never updated by the flushes, it can not be used here
+        group_seq = read_state.get_group_seq(group_id)
+
+        last_read_seq = read_state.mark_read(
+            group_id=group_id,
+            user_id=request.user.uuid,
+            seq=min(serializer.validated_data.get("seq", group_seq), group_seq),
+        )
+
+        return Response(
+            status=HTTP_200_OK,
+            data={
+                "last_read_seq": last_read_seq,
+                "unread": max(group_seq - last_read_seq, 0),
+            },
+        )
+
+
+class UnreadCountAPI(GroupMessageBaseAPI):
+    """
+    This API is used to get the unread counts of all the groups of the user.
+    """
+
+    def get(self, request):
+        """
+        This method is used to get the unread counts of all the groups of the user.
+        """
+
+        return Response(
+            status=HTTP_200_OK,
+            data={
+                "results": [
+                    {"group_id": group_id, "unread": unread}
+                    for group_id, unread in read_state.get_unread_counts(
+                        request.user.uuid
+                    ).items()
+                ]
+            },
+        )
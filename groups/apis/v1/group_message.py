@@ -2,42 +2,63 @@
 This file contains all the APIs related to group message model.
 """
 
+import json
+import logging
+
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
 from django.utils.timezone import now
+from django.views import View
+from redis.exceptions import RedisError
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+from rest_framework.status import (
+    HTTP_200_OK,
+    HTTP_400_BAD_REQUEST,
+    HTTP_401_UNAUTHORIZED,
+    HTTP_429_TOO_MANY_REQUESTS,
+)
 
-from groups.models import Group, GroupMember
-from utils.kafka_mixins import BaseKafkaProducer
+from groups.models import Group, GroupMember, GroupMessage
+from groups.recent_messages import recent_messages
+from groups.search import get_search_backend
+from groups.user_groups import user_groups
+from utils.authentication import AsyncJWTAuthentication
+from utils.kafka_mixins import kafka_clients
+from utils.pagination import (
+    RowLessThan,
+    decode_cursor,
+    encode_cursor,
+    get_cursor_datetime,
+    get_cursor_id,
+    get_page_size,
+)
+from utils.redis import RedisCacheMixin
+from utils.throttling import MESSAGE_THROTTLE_CLASSES
+from utils.tracing import start_trace
 from utils.views import CachingAPIView
 
+logger = logging.getLogger("default")
+
 
-class CreateGroupMessageAPI(CachingAPIView):
+class GroupMessageBaseAPI(CachingAPIView):
     """
-    This API is used to create a group message.
+    This class contains the common functionality of group message APIs.
     """
 
     permission_classes = (IsAuthenticated,)
-    kafka_producer = BaseKafkaProducer()
-
-    class InputSerializer(serializers.Serializer):
-        """
-        This class is used to serializer create group message API request body.
-        """
-
-        group_id = serializers.IntegerField()
-        message = serializers.CharField()
 
     def validate_request(self, group_id: str, user_id: str):
         """
-        Checks if the user is a member of the group
+        Checks if the user is a member of the group and returns the group
         """
 
         if not (group := self.get_cache(key_name=str(group_id), model=Group)):
             group = Group.active_objects.get(id=group_id)
-            self.set_cache(key_name=str(group_id), value=group, model=Group)
+            self.set_versioned_cache(key_name=str(group_id), value=group, model=Group)
 
         if not (
             group_member := self.get_cache(
@@ -47,10 +68,44 @@ class CreateGroupMessageAPI(CachingAPIView):
             group_member = GroupMember.active_objects.get(
                 group_id=group_id, user_id=user_id
             )
-            self.set_cache(
+            self.set_versioned_cache(
                 key_name=f"{group_id}-{user_id}", value=group_member, model=GroupMember
             )
 
+        return group
+
+
+class CreateGroupMessageAPI(GroupMessageBaseAPI):
+    """
+    This API is used to create a group message.
+    """
+
+    throttle_classes = MESSAGE_THROTTLE_CLASSES
+
+    @property
+    def kafka_producer(self):
+        """
+        Returns the kafka producer shared by the views of the process.
+        """
+        return kafka_clients.get_producer()
+
+    class InputSerializer(serializers.Serializer):
+        """
+        This class is used to serializer create group message API request body.
+        """
+
+        group_id = serializers.IntegerField()
+        message = serializers.CharField()
+
+    def check_throttles(self, request):
+        """
+        Stops at the first throttle denying the request, so a throttled sender does
+        not spend the tokens of the other buckets (the group one in particular).
+        """
+        for throttle in self.get_throttles():
+            if not throttle.allow_request(request, self):
+                self.throttled(request, throttle.wait())
+
     def post(self, request):
         """
         This method is used to create a group message.
@@ -85,8 +140,338 @@ class CreateGroupMessageAPI(CachingAPIView):
                 "user_id": str(request.user.uuid),
                 "created_at": now().isoformat(),
             },
+            # the key routes all the messages of a group to the same partition
             key=str(validated_data["group_id"]),
-            partition=f"wm-grp-{validated_data['group_id']}",
+            headers=start_trace(),
         )
 
         return Response(status=HTTP_200_OK, data={"message": "Message sent"})
+
+
+class AsyncCreateGroupMessageAPI(View, RedisCacheMixin):
+    """
+    This API is the asyncio version of CreateGroupMessageAPI, served by ASGI workers
+    (see ASYNC_MESSAGE_API). Redis and kafka are awaited instead of blocking a worker,
+    so a single process keeps thousands of posts in flight.
+    """
+
+    authentication = AsyncJWTAuthentication()
+    InputSerializer = CreateGroupMessageAPI.InputSerializer
+    throttle_classes = MESSAGE_THROTTLE_CLASSES
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # authenticated with jwt only, like every DRF view
+        view.csrf_exempt = True
+        return view
+
+    def unauthorized(self, detail: str) -> JsonResponse:
+        """
+        Returns the response of an unauthenticated request, same as DRF views.
+        """
+        response = JsonResponse({"detail": detail}, status=HTTP_401_UNAUTHORIZED)
+        response["WWW-Authenticate"] = self.authentication.authenticate_header(None)
+        return response
+
+    async def check_throttles(self, request) -> JsonResponse | None:
+        """
+        Returns the response of a throttled request, same as DRF views, None if the
+        request is allowed.
+        """
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not await throttle.aallow_request(request, self):
+                wait = throttle.wait()
+                response = JsonResponse(
+                    {
+                        "detail": f"Request was throttled. Expected available in {wait} seconds."
+                    },
+                    status=HTTP_429_TOO_MANY_REQUESTS,
+                )
+                response["Retry-After"] = str(wait)
+                return response
+        return None
+
+    async def validate_request(self, group_id: int, user_id: str):
+        """
+        Checks if the user is a member of the group and returns the group
+        """
+
+        if not (group := await self.aget_cache(key_name=str(group_id), model=Group)):
+            group = await Group.active_objects.aget(id=group_id)
+            await self.aset_versioned_cache(
+                key_name=str(group_id), value=group, model=Group
+            )
+
+        if not await self.aget_cache(
+            key_name=f"{group_id}-{user_id}", model=GroupMember
+        ):
+            group_member = await GroupMember.active_objects.aget(
+                group_id=group_id, user_id=user_id
+            )
+            await self.aset_versioned_cache(
+                key_name=f"{group_id}-{user_id}", value=group_member, model=GroupMember
+            )
+
+        return group
+
+    async def post(self, request):
+        """
+        This method is used to create a group message.
+        """
+
+        try:
+            if not (authenticated := await self.authentication.aauthenticate(request)):
+                return self.unauthorized(
+                    "Authentication credentials were not provided."
+                )
+        except AuthenticationFailed as error:
+            return self.unauthorized(str(error.detail))
+
+        user, _token = authenticated
+
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse(
+                {"detail": "JSON parse error"}, status=HTTP_400_BAD_REQUEST
+            )
+
+        # throttles read the user and the body, like on DRF requests
+        request.user, request.data = user, data
+        if throttled := await self.check_throttles(request):
+            return throttled
+
+        serializer = self.InputSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=HTTP_400_BAD_REQUEST)
+
+        validated_data = serializer.validated_data
+
+        try:
+            await self.validate_request(
+                group_id=validated_data["group_id"], user_id=user.uuid
+            )
+        except Group.DoesNotExist:
+            return JsonResponse(
+                {"errors": "Group not found"}, status=HTTP_400_BAD_REQUEST
+            )
+        except GroupMember.DoesNotExist:
+            return JsonResponse(
+                {"errors": "Group member not found"}, status=HTTP_400_BAD_REQUEST
+            )
+
+        await kafka_clients.get_async_producer().send_message(
+            topic=settings.MESSAGE_CONSUMER_TOPIC,
+            value={
+                "group_id": validated_data["group_id"],
+                "message": validated_data["message"],
+                "user_id": str(user.uuid),
+                "created_at": now().isoformat(),
+            },
+            # the key routes all the messages of a group to the same partition
+            key=str(validated_data["group_id"]),
+            headers=start_trace(),
+        )
+
+        return JsonResponse({"message": "Message sent"}, status=HTTP_200_OK)
+
+
+class ListGroupMessageAPI(GroupMessageBaseAPI):
+    """
+    This API is used to list the messages of a group, newest first.
+    Uses keyset pagination over (created_at, id), so every page costs the same.
+    """
+
+    MAX_PAGE_SIZE = 100
+    FIELDS = ("id", "created_by_id", "message", "created_at")
+
+    def query_messages(self, group_id: int, cursor: str | None, limit: int):
+        """
+        Returns the rows of up to `limit` messages older than the cursor from postgres.
+        Rows are fetched as tuples, no model instances are created.
+        """
+
+        queryset = GroupMessage.active_objects.filter(group_id=group_id)
+        if cursor:
+            created_at, message_id = decode_cursor(cursor)
+            created_at = get_cursor_datetime(created_at)
+            message_id = get_cursor_id(message_id)
+            # created_at__lte also prunes the monthly partitions newer than the cursor
+            queryset = queryset.filter(
+                RowLessThan(("created_at", "id"), (created_at, message_id)),
+                created_at__lte=created_at,
+            )
+
+        return list(
+            queryset.order_by("-created_at", "-id").values_list(*self.FIELDS)[:limit]
+        )
+
+    def get_recent_messages(self, group_id: int, limit: int):
+        """
+        Returns the rows of the `limit` newest messages from the group's redis buffer.
+        The buffer is filled from postgres if needed, pages larger than the buffer
+        are always read from postgres.
+        """
+
+        if limit > recent_messages.size:
+            return self.query_messages(group_id=group_id, cursor=None, limit=limit)
+
+        try:
+            if (rows := recent_messages.get(group_id, limit)) is not None:
+                return rows
+
+            rows = self.query_messages(
+                group_id=group_id, cursor=None, limit=recent_messages.size
+            )
+            recent_messages.fill(group_id, rows)
+        except RedisError as error:
+            logger.warning(f"Failed to read recent group messages: {str(error)}")
+            return self.query_messages(group_id=group_id, cursor=None, limit=limit)
+
+        return rows[:limit]
+
+    def get_messages(self, group_id: int, cursor: str | None, page_size: int):
+        """
+        Returns the rows of a page of messages and the cursor for the next page.
+        The newest page is served from redis, older pages from postgres.
+        """
+
+        if cursor:
+            rows = self.query_messages(
+                group_id=group_id, cursor=cursor, limit=page_size + 1
+            )
+        else:
+            rows = self.get_recent_messages(group_id=group_id, limit=page_size + 1)
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = encode_cursor(rows[-1][3].isoformat(), rows[-1][0])
+
+        return rows, next_cursor
+
+    def get(self, request, group_id):
+        """
+        This method is used to list the messages of a group.
+        """
+
+        try:
+            self.validate_request(group_id=group_id, user_id=request.user.uuid)
+        except Group.DoesNotExist:
+            return Response(
+                data={"errors": "Group not found"},
+                status=HTTP_400_BAD_REQUEST,
+            )
+        except GroupMember.DoesNotExist:
+            return Response(
+                data={"errors": "Group member not found"},
+                status=HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            rows, next_cursor = self.get_messages(
+                group_id=group_id,
+                cursor=request.query_params.get("cursor"),
+                page_size=get_page_size(
+                    request.query_params.get("page_size"), self.MAX_PAGE_SIZE
+                ),
+            )
+        except (TypeError, ValueError, ValidationError):
+            return Response(
+                data={"errors": "Invalid cursor"},
+                status=HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(
+            status=HTTP_200_OK,
+            data={
+                "results": [
+                    {
+                        "id": message_id,
+                        "user_id": user_id,
+                        "message": message,
+                        "created_at": created_at,
+                    }
+                    for message_id, user_id, message, created_at in rows
+                ],
+                "next": next_cursor,
+            },
+        )
+
+
+class SearchGroupMessageAPI(CachingAPIView):
+    """
+    This API is used to search the messages of the groups of the user, best match first.
+    Results are ranked by the search backend and keyset paginated with its cursor.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    MAX_PAGE_SIZE = 50
+
+    class InputSerializer(serializers.Serializer):
+        """
+        This class is used to serializer search group message API query params.
+        """
+
+        q = serializers.CharField(max_length=256)
+        group_id = serializers.IntegerField(required=False)
+
+    def get_group_ids(self, user_id) -> list[int]:
+        """
+        Returns the ids of the groups of the user, from the user's groups index
+        and from postgres if redis is unavailable.
+        """
+
+        try:
+            return user_groups.get_group_ids(user_id)
+        except RedisError as error:
+            logger.warning(f"Failed to read groups of user: {str(error)}")
+            return list(
+                GroupMember.active_objects.filter(user_id=user_id).values_list(
+                    "group_id", flat=True
+                )
+            )
+
+    def get(self, request):
+        """
+        This method is used to search the messages of the groups of the user.
+        """
+
+        serializer = self.InputSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(status=HTTP_400_BAD_REQUEST, data=serializer.errors)
+
+        validated_data = serializer.validated_data
+
+        group_ids = self.get_group_ids(request.user.uuid)
+        if "group_id" in validated_data:
+            if validated_data["group_id"] not in group_ids:
+                return Response(
+                    data={"errors": "Group member not found"},
+                    status=HTTP_400_BAD_REQUEST,
+                )
+            group_ids = [validated_data["group_id"]]
+
+        if not group_ids:
+            return Response(status=HTTP_200_OK, data={"results": [], "next": None})
+
+        try:
+            results, next_cursor = get_search_backend().search(
+                query=validated_data["q"],
+                group_ids=group_ids,
+                cursor=request.query_params.get("cursor"),
+                limit=get_page_size(
+                    request.query_params.get("page_size"), self.MAX_PAGE_SIZE
+                ),
+            )
+        except (TypeError, ValueError, ValidationError):
+            return Response(
+                data={"errors": "Invalid cursor"},
+                status=HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(
+            status=HTTP_200_OK, data={"results": results, "next": next_cursor}
+        )
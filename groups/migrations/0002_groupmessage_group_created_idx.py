@@ -0,0 +1,29 @@
+"""
+This file contains migration number 0002 for the groups app.
+"""
+
+# Generated by Django 5.1.2 on 2026-10-19 04:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    This class contains all the migrations for the given migration file.
+    """
+
+    dependencies = [
+        ("groups", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="groupmessage",
+            index=models.Index(
+                fields=["group", "-created_at", "-id"],
+                name="groups_msg_group_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+"""
+This file contains migration number 0004 for the groups app.
+"""
+
+# Generated by Django 5.1.2 on 2026-10-19 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    This class contains all the migrations for the given migration file.
+    """
+
+    dependencies = [
+        ("groups", "0003_partition_groupmessage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="group",
+            name="message_seq",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="groupmember",
+            name="last_read_seq",
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
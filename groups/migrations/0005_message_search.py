@@ -0,0 +1,35 @@
+"""
+This file contains migration number 0005 for the groups app.
+"""
+
+# Generated by Django 5.1.2 on 2026-10-19 04:15
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    This class contains all the migrations for the given migration file.
+    """
+
+    dependencies = [
+        ("groups", "0004_read_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="groupmessage",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="groupmessage",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="groups_msg_search_idx"
+            ),
+        ),
+    ]
@@ -3,6 +3,8 @@ This module contains all the model definitions for the groups app.
 """
 
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -32,6 +34,8 @@ class Group(BaseModel):
             ExtensionValidator(allowed_extensions=SUPPORTED_FILE_FORMATS),
         ],
     )
+    # number of messages sent to the group, flushed periodically from redis
+    message_seq = models.BigIntegerField(default=0)
 
     class Meta:
         """
@@ -53,6 +57,11 @@ class GroupMessage(BaseModel):
         "Group", on_delete=models.CASCADE, related_name="messages"
     )
     message = models.TextField()
+    # set in the INSERT of the message, see groups.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # messages are immutable and created in bulk, so changes are never tracked
+    track_changes = False
 
     class Meta:
         """
@@ -60,6 +69,14 @@ class GroupMessage(BaseModel):
         """
 
         ordering = ["-created_at"]
+        indexes = [
+            # used for keyset pagination of a group's message history
+            models.Index(
+                fields=["group", "-created_at", "-id"],
+                name="groups_msg_group_created_idx",
+            ),
+            GinIndex(fields=["search_vector"], name="groups_msg_search_idx"),
+        ]
 
     def __str__(self):
         return f"Message ID: {self.id}"
@@ -75,6 +92,8 @@ class GroupMember(BaseModel):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="members"
     )
     admin = models.BooleanField(default=False)
+    # sequence of the last message read by the member, flushed periodically from redis
+    last_read_seq = models.BigIntegerField(default=0)
 
     def __str__(self):
         return f"{self.user_id} - {self.group_id}"
@@ -0,0 +1,123 @@
+"""
+This module contains the helpers to manage the monthly partitions of group messages.
+
+`groups_groupmessage` is range partitioned on `created_at`, with one partition per
+month and a default partition catching rows outside every monthly range.
+"""
+
+import logging
+from datetime import date, datetime, timezone
+from typing import List, Tuple
+
+from django.db import connection, transaction
+
+from groups.models import GroupMessage
+
+logger = logging.getLogger("default")
+
+PARENT_TABLE = GroupMessage._meta.db_table
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+
+
+def add_months(month: date, months: int) -> date:
+    """
+    Returns the first day of the month `months` away from the given month.
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def get_partition_name(month: date) -> str:
+    """
+    Returns the name of the partition holding the messages of a month.
+    """
+    return f"{PARENT_TABLE}_{month:%Y_%m}"
+
+
+def get_partition_bounds(month: date) -> Tuple[datetime, datetime]:
+    """
+    Returns the [start, end) created_at range of the partition of a month.
+    """
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    end = datetime.combine(add_months(month, 1), start.timetz())
+    return start, end
+
+
+def list_partitions() -> List[str]:
+    """
+    Returns the names of all the monthly partitions currently attached.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = %s AND child.relname <> %s
+            ORDER BY child.relname
+            """,
+            [PARENT_TABLE, DEFAULT_PARTITION],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def create_partition(month: date) -> bool:
+    """
+    Creates the partition of a month, if it does not exist.
+    Rows of that month which already landed in the default partition are moved
+    into the new partition before it is attached. The default partition is locked
+    for the whole move, otherwise rows inserted into it between the move and the
+    attach would make the attach fail.
+    Returns whether a partition was created.
+    """
+    name = get_partition_name(month)
+    if name in list_partitions():
+        return False
+
+    start, end = get_partition_bounds(month)
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        # the attach takes this lock anyway, taking it first blocks inserts into the
+        # default partition from the move until the commit
+        cursor.execute(
+            f"LOCK TABLE {quote(DEFAULT_PARTITION)} IN ACCESS EXCLUSIVE MODE"
+        )
+        if name in list_partitions():
+            return False
+
+        cursor.execute(
+            f"CREATE TABLE {quote(name)} "
+            f"(LIKE {quote(PARENT_TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute(
+            f"WITH moved AS ("
+            f"DELETE FROM {quote(DEFAULT_PARTITION)} "
+            f"WHERE created_at >= %s AND created_at < %s RETURNING *"
+            f") INSERT INTO {quote(name)} SELECT * FROM moved",
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {quote(PARENT_TABLE)} ATTACH PARTITION {quote(name)} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+
+    logger.info(f"Created message partition {name}")
+    return True
+
+
+def detach_partition(name: str, drop: bool = False) -> None:
+    """
+    Detaches a monthly partition, leaving it as a standalone archive table.
+    The table is dropped instead if `drop` is True.
+    """
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE {quote(PARENT_TABLE)} DETACH PARTITION {quote(name)}"
+        )
+        if drop:
+            cursor.execute(f"DROP TABLE {quote(name)}")
+
+    logger.info(f"{'Dropped' if drop else 'Detached'} message partition {name}")
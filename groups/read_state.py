@@ -0,0 +1,269 @@
+"""
+This module contains the per (group, user) read state, held in redis and flushed
+to postgres in coalesced batches.
+
+Every group has a message sequence, the number of messages sent to it, which is
+incremented once per group for every persisted batch. Every member has a read
+cursor, the sequence of the last message they have read. The unread count of a
+member is the difference of the two, so a new message never writes per member.
+
+Changed sequences and cursors are tracked in dirty sets and periodically written
+to `Group.message_seq` and `GroupMember.last_read_seq`, many rows per statement.
+"""
+
+import logging
+from collections import Counter
+from typing import Dict, Iterable, Tuple
+
+from django.db import connection, transaction
+
+from groups.models import Group, GroupMember, GroupMessage
+from utils.metrics import metrics
+from utils.redis import get_redis_client, get_redis_script, make_cache_key
+
+logger = logging.getLogger("default")
+
+# KEYS[1]: read cursors hash of the user, KEYS[2]: dirty read cursors set
+# ARGV[1]: group id, ARGV[2]: sequence, ARGV[3]: dirty member
+# Read cursors only ever move forward.
+MARK_READ_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+if tonumber(ARGV[2]) <= current then
+    return current
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('SADD', KEYS[2], ARGV[3])
+return tonumber(ARGV[2])
+"""
+
+# UPDATE ... FROM (VALUES ...) writes a whole batch in a single statement.
+# Values never move backwards, even if an older flush is retried.
+UPDATE_GROUP_SEQ_SQL = """
+UPDATE {table} SET message_seq = GREATEST(message_seq, batch.seq)
+FROM (VALUES {values}) AS batch (id, seq)
+WHERE {table}.id = batch.id
+"""
+
+UPDATE_READ_SEQ_SQL = """
+UPDATE {table} SET last_read_seq = GREATEST(last_read_seq, batch.seq)
+FROM (VALUES {values}) AS batch (group_id, user_id, seq)
+WHERE {table}.group_id = batch.group_id AND {table}.user_id = batch.user_id
+"""
+
+
+class ReadStateStore:
+    """
+    This class is used to maintain group sequences and member read cursors.
+    """
+
+    group_seq_key = "GRP:SEQ"
+    read_seq_key = "GRP:READ"
+    dirty_group_seq_key = "GRP:SEQ:DIRTY"
+    dirty_read_seq_key = "GRP:READ:DIRTY"
+
+    def get_read_seq_key(self, user_id) -> str:
+        """
+        Returns the redis key of the read cursors hash of a user.
+        """
+        return make_cache_key(f"{self.read_seq_key}:{user_id}")
+
+    def increment_group_seqs(self, group_messages: Iterable[GroupMessage]) -> None:
+        """
+        Increment the sequence of every group of a persisted batch of messages,
+        once per group. Sequences missing from redis are restored from postgres.
+        """
+        counts = Counter(group_message.group_id for group_message in group_messages)
+        if not counts:
+            return
+
+        client = get_redis_client()
+        key = make_cache_key(self.group_seq_key)
+
+        pipeline = client.pipeline(transaction=False)
+        for group_id in counts:
+            pipeline.hexists(key, group_id)
+        missing = [
+            group_id
+            for group_id, exists in zip(counts, pipeline.execute())
+            if not exists
+        ]
+
+        pipeline = client.pipeline(transaction=False)
+        if missing:
+            self._restore_group_seqs(pipeline, missing)
+
+        for group_id, count in counts.items():
+            pipeline.hincrby(key, group_id, count)
+        pipeline.sadd(make_cache_key(self.dirty_group_seq_key), *counts)
+        pipeline.execute()
+
+    def _restore_group_seqs(self, pipeline, group_ids: Iterable[int]) -> None:
+        """
+        Queue the restore of the sequences of groups missing from redis, from postgres.
+        """
+        key = make_cache_key(self.group_seq_key)
+        # the flushed sequence may lag behind by at most one flush interval
+        for group_id, message_seq in Group.objects.filter(id__in=group_ids).values_list(
+            "id", "message_seq"
+        ):
+            pipeline.hsetnx(key, group_id, message_seq)
+
+    def get_group_seq(self, group_id: int) -> int:
+        """
+        Returns the sequence of a group, restored from postgres if missing from redis.
+        """
+        if (seq := self.get_group_seqs([group_id])[group_id]) is not None:
+            return seq
+
+        pipeline = get_redis_client().pipeline(transaction=False)
+        self._restore_group_seqs(pipeline, [group_id])
+        pipeline.hget(make_cache_key(self.group_seq_key), group_id)
+        seq = pipeline.execute()[-1]
+        return 0 if seq is None else int(seq)
+
+    def get_group_seqs(self, group_ids: Iterable[int]) -> Dict[int, int | None]:
+        """
+        Returns the sequences of the given groups, None if missing from redis.
+        """
+        group_ids = list(group_ids)
+        if not group_ids:
+            return {}
+
+        values = get_redis_client().hmget(make_cache_key(self.group_seq_key), group_ids)
+        return {
+            group_id: None if value is None else int(value)
+            for group_id, value in zip(group_ids, values)
+        }
+
+    def get_read_seqs(self, user_id) -> Dict[int, int]:
+        """
+        Returns the read cursors of a user held in redis, by group id.
+        """
+        return {
+            int(group_id): int(seq)
+            for group_id, seq in get_redis_client()
+            .hgetall(self.get_read_seq_key(user_id))
+            .items()
+        }
+
+    def mark_read(self, group_id: int, user_id, seq: int) -> int:
+        """
+        Move the read cursor of a member forward to `seq`.
+        Returns the read cursor after the update.
+        """
+        return get_redis_script(MARK_READ_SCRIPT)(
+            keys=[
+                self.get_read_seq_key(user_id),
+                make_cache_key(self.dirty_read_seq_key),
+            ],
+            args=[group_id, seq, f"{group_id}:{user_id}"],
+        )
+
+    def get_unread_counts(self, user_id) -> Dict[int, int]:
+        """
+        Returns the unread counts of all the active groups of a user.
+        Uses a single query and a single redis round trip.
+        """
+        members = list(
+            GroupMember.active_objects.filter(
+                user_id=user_id, group__is_active=True
+            ).values_list("group_id", "group__message_seq", "last_read_seq")
+        )
+        if not members:
+            return {}
+
+        client = get_redis_client()
+        pipeline = client.pipeline(transaction=False)
+        pipeline.hmget(
+            make_cache_key(self.group_seq_key), [group_id for group_id, *_ in members]
+        )
+        pipeline.hgetall(self.get_read_seq_key(user_id))
+        group_seqs, read_seqs = pipeline.execute()
+
+        unread_counts = {}
+        for (group_id, message_seq, last_read_seq), group_seq in zip(
+            members, group_seqs
+        ):
+            group_seq = message_seq if group_seq is None else int(group_seq)
+            read_seq = max(
+                last_read_seq, int(read_seqs.get(str(group_id).encode("utf-8"), 0))
+            )
+            unread_counts[group_id] = max(group_seq - read_seq, 0)
+        return unread_counts
+
+    def _pop_dirty(self, key: str, count: int) -> list:
+        return [
+            member.decode("utf-8")
+            for member in get_redis_client().spop(make_cache_key(key), count) or ()
+        ]
+
+    def _restore_dirty(self, key: str, members: list) -> None:
+        if members:
+            get_redis_client().sadd(make_cache_key(key), *members)
+
+    def flush(self, batch_size: int) -> Tuple[int, int]:
+        """
+        Write up to `batch_size` changed group sequences and read cursors to postgres.
+        Returns the number of group sequences and read cursors written.
+        """
+        group_ids = self._pop_dirty(self.dirty_group_seq_key, batch_size)
+        read_members = self._pop_dirty(self.dirty_read_seq_key, batch_size)
+        if not group_ids and not read_members:
+            return 0, 0
+
+        try:
+            client = get_redis_client()
+            pipeline = client.pipeline(transaction=False)
+            if group_ids:
+                pipeline.hmget(make_cache_key(self.group_seq_key), group_ids)
+            for member in read_members:
+                group_id, user_id = member.split(":", 1)
+                pipeline.hget(self.get_read_seq_key(user_id), group_id)
+            values = pipeline.execute()
+
+            group_seqs = []
+            if group_ids:
+                group_seqs = [
+                    (int(group_id), int(seq))
+                    for group_id, seq in zip(group_ids, values.pop(0))
+                    if seq is not None
+                ]
+            read_seqs = [
+                (int(member.split(":", 1)[0]), member.split(":", 1)[1], int(seq))
+                for member, seq in zip(read_members, values)
+                if seq is not None
+            ]
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                if group_seqs:
+                    cursor.execute(
+                        UPDATE_GROUP_SEQ_SQL.format(
+                            table=connection.ops.quote_name(Group._meta.db_table),
+                            values=", ".join(
+                                ["(%s::bigint, %s::bigint)"] * len(group_seqs)
+                            ),
+                        ),
+                        [value for row in group_seqs for value in row],
+                    )
+                if read_seqs:
+                    cursor.execute(
+                        UPDATE_READ_SEQ_SQL.format(
+                            table=connection.ops.quote_name(GroupMember._meta.db_table),
+                            values=", ".join(
+                                ["(%s::bigint, %s::uuid, %s::bigint)"] * len(read_seqs)
+                            ),
+                        ),
+                        [value for row in read_seqs for value in row],
+                    )
+        except Exception:
+            # flushed again on the next run, values only move forward
+            self._restore_dirty(self.dirty_group_seq_key, group_ids)
+            self._restore_dirty(self.dirty_read_seq_key, read_members)
+            raise
+
+        metrics.increment("read_state_group_seqs_flushed_total", len(group_seqs))
+        metrics.increment("read_state_read_seqs_flushed_total", len(read_seqs))
+        return len(group_seqs), len(read_seqs)
+
+
+read_state = ReadStateStore()
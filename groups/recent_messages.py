@@ -0,0 +1,131 @@
+"""
+This module contains the redis buffer of the most recent messages of each group.
+
+Every group has a sorted set holding its newest messages, scored by `created_at`.
+Members are prefixed with the zero padded message id, so messages created at the
+same instant are ordered by id, same as the (created_at, id) keyset in postgres.
+
+Writers always merge their messages into the set, while a sentinel member marks a
+set as filled from postgres. Sets without the sentinel may be missing older
+messages and are never served, so a concurrent fill can not lose messages.
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from groups.models import GroupMessage
+from utils.metrics import metrics
+from utils.redis import get_redis_client, make_cache_key
+
+logger = logging.getLogger("default")
+
+MessageRow = Tuple[int, str, str, datetime]
+
+
+class RecentMessageBuffer:
+    """
+    This class is used to store and read the newest messages of groups in redis.
+    """
+
+    key = "GRP:MESSAGES"
+    sentinel = "FILLED"
+
+    def __init__(self, size: int, timeout: int) -> None:
+        self.size = size
+        self.timeout = timeout
+
+    def get_key(self, group_id: int) -> str:
+        """
+        Returns the redis key of the buffer of a group.
+        """
+        return make_cache_key(f"{self.key}:{group_id}")
+
+    @staticmethod
+    def encode(row: MessageRow) -> Tuple[str, float]:
+        """
+        Returns the sorted set member and score of a message row.
+        """
+        message_id, user_id, message, created_at = row
+        member = json.dumps(
+            [str(user_id) if user_id else None, message, created_at.isoformat()],
+            separators=(",", ":"),
+        )
+        return f"{message_id:020d}:{member}", int(created_at.timestamp() * 1_000_000)
+
+    @staticmethod
+    def decode(member: bytes) -> MessageRow:
+        """
+        Returns the message row of a sorted set member.
+        """
+        message_id, row = member.decode("utf-8").split(":", 1)
+        user_id, message, created_at = json.loads(row)
+        return int(message_id), user_id, message, datetime.fromisoformat(created_at)
+
+    def _add(self, pipeline, group_id: int, rows: Iterable[MessageRow]) -> None:
+        key = self.get_key(group_id)
+        pipeline.zadd(key, dict(self.encode(row) for row in rows))
+        # keeps the sentinel (scored +inf) and the newest `size` messages
+        pipeline.zremrangebyrank(key, 0, -(self.size + 2))
+        pipeline.expire(key, self.timeout)
+
+    def add(self, group_messages: Iterable[GroupMessage]) -> None:
+        """
+        Add persisted messages to the buffers of their groups.
+        """
+        rows = {}
+        for group_message in group_messages:
+            rows.setdefault(group_message.group_id, []).append(
+                (
+                    group_message.id,
+                    group_message.created_by_id,
+                    group_message.message,
+                    group_message.created_at,
+                )
+            )
+
+        if not rows:
+            return
+
+        pipeline = get_redis_client().pipeline(transaction=False)
+        for group_id, group_rows in rows.items():
+            self._add(pipeline, group_id, group_rows)
+        pipeline.execute()
+
+    def fill(self, group_id: int, rows: List[MessageRow]) -> None:
+        """
+        Merge the newest messages of a group read from postgres into its buffer,
+        and mark the buffer as filled.
+        """
+        pipeline = get_redis_client().pipeline()
+        pipeline.zadd(self.get_key(group_id), {self.sentinel: float("inf")})
+        if rows:
+            self._add(pipeline, group_id, rows)
+        else:
+            pipeline.expire(self.get_key(group_id), self.timeout)
+        pipeline.execute()
+
+    def get(self, group_id: int, count: int) -> Optional[List[MessageRow]]:
+        """
+        Returns up to `count` newest messages of a group, newest first.
+        Returns None if the buffer of the group is not filled.
+        """
+        if count > self.size:
+            return None
+
+        members = get_redis_client().zrevrange(self.get_key(group_id), 0, count)
+        if not members or members[0] != self.sentinel.encode("utf-8"):
+            metrics.increment("recent_messages_misses_total")
+            return None
+
+        metrics.increment("recent_messages_hits_total")
+        return [self.decode(member) for member in members[1:]]
+
+
+recent_messages = RecentMessageBuffer(
+    size=settings.GROUP_RECENT_MESSAGES_SIZE,
+    timeout=settings.GROUP_RECENT_MESSAGES_TIMEOUT,
+)
@@ -0,0 +1,21 @@
+"""
+This package contains the full-text search over group messages.
+
+Search is served by a pluggable backend, configured with MESSAGE_SEARCH_BACKEND,
+see `groups.search.base.BaseMessageSearchBackend` for the interface.
+"""
+
+from functools import cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .base import BaseMessageSearchBackend
+
+
+@cache
+def get_search_backend() -> BaseMessageSearchBackend:
+    """
+    Returns the configured message search backend, created once per process.
+    """
+    return import_string(settings.MESSAGE_SEARCH_BACKEND)()
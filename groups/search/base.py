@@ -0,0 +1,52 @@
+"""
+This file contains the interface of message search backends.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Optional, Tuple
+
+from groups.models import GroupMessage
+
+
+class BaseMessageSearchBackend(ABC):
+    """
+    This class defines the interface every message search backend must implement.
+
+    Backends index messages as they are created (see `prepare`) and return ranked
+    results in pages, using an opaque cursor owned by the backend. Messages missed
+    when they were created are indexed from the CDC stream or by `backfill`.
+    """
+
+    @abstractmethod
+    def prepare(self, group_messages: Iterable[GroupMessage]) -> None:
+        """
+        Sets the search fields of messages which are about to be inserted, so they
+        are searchable without writing the rows again.
+        """
+
+    @abstractmethod
+    def index(self, group_messages: Iterable[GroupMessage]) -> None:
+        """
+        Add existing messages to the search index.
+        """
+
+    @abstractmethod
+    def backfill(self, batch_size: int) -> int:
+        """
+        Index up to `batch_size` messages which are not indexed yet.
+        Returns the number of messages indexed.
+        """
+
+    @abstractmethod
+    def search(
+        self,
+        query: str,
+        group_ids: List[int],
+        cursor: Optional[str],
+        limit: int,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Returns a page of the messages of the given groups matching a query, best
+        match first, and the cursor of the next page (None for the last page).
+        Raises ValueError for an invalid cursor.
+        """
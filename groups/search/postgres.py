@@ -0,0 +1,115 @@
+"""
+This file contains the postgres full-text search backend for group messages.
+"""
+
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import F, FloatField, Q, TextField, Value
+from django.db.models.functions import Cast
+
+from groups.models import GroupMessage
+from groups.search.base import BaseMessageSearchBackend
+from utils.pagination import (
+    RowLessThan,
+    decode_cursor,
+    encode_cursor,
+    get_cursor_datetime,
+    get_cursor_id,
+)
+
+
+class PostgresSearchBackend(BaseMessageSearchBackend):
+    """
+    This class implements message search over a tsvector column with a GIN index.
+    """
+
+    FIELDS = ("id", "group_id", "created_by_id", "message", "created_at", "rank")
+
+    def __init__(self) -> None:
+        self.config = settings.MESSAGE_SEARCH_CONFIG
+
+    def prepare(self, group_messages: Iterable[GroupMessage]) -> None:
+        # computed by postgres in the INSERT, an expression can not reference the
+        # message column there, hence the message is passed as a value
+        for group_message in group_messages:
+            group_message.search_vector = SearchVector(
+                Value(group_message.message, output_field=TextField()),
+                config=self.config,
+            )
+
+    def index(self, group_messages: Iterable[GroupMessage]) -> None:
+        # filtering by created_at as well prunes the partitions of other months
+        condition = Q()
+        for group_message in group_messages:
+            condition |= Q(id=group_message.id, created_at=group_message.created_at)
+        if not condition:
+            return
+
+        GroupMessage.objects.filter(condition).update(
+            search_vector=SearchVector("message", config=self.config)
+        )
+
+    def backfill(self, batch_size: int) -> int:
+        ids = (
+            GroupMessage.objects.filter(search_vector__isnull=True)
+            .order_by()
+            .values("id")[:batch_size]
+        )
+        return GroupMessage.objects.filter(id__in=ids).update(
+            search_vector=SearchVector("message", config=self.config)
+        )
+
+    def search(
+        self,
+        query: str,
+        group_ids: List[int],
+        cursor: Optional[str],
+        limit: int,
+    ) -> Tuple[List[dict], Optional[str]]:
+        search_query = SearchQuery(query, search_type="websearch", config=self.config)
+        queryset = GroupMessage.active_objects.filter(
+            group_id__in=group_ids, search_vector=search_query
+        ).annotate(
+            # ts_rank returns a real, cast to double precision so the rank
+            # round trips through the cursor without losing precision
+            rank=Cast(SearchRank(F("search_vector"), search_query), FloatField())
+        )
+
+        if cursor:
+            rank, created_at, message_id = decode_cursor(cursor)
+            if isinstance(rank, bool):
+                raise ValueError("Invalid cursor")
+            rank = float(rank)
+            created_at = get_cursor_datetime(created_at)
+            message_id = get_cursor_id(message_id)
+            queryset = queryset.filter(
+                RowLessThan(
+                    ("rank", "created_at", "id"), (rank, created_at, message_id)
+                )
+            )
+
+        rows = list(
+            queryset.order_by("-rank", "-created_at", "-id").values_list(*self.FIELDS)[
+                : limit + 1
+            ]
+        )
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            message_id, _group_id, _user_id, _message, created_at, rank = rows[-1]
+            next_cursor = encode_cursor(rank, created_at.isoformat(), message_id)
+
+        return [
+            {
+                "id": message_id,
+                "group_id": group_id,
+                "user_id": user_id,
+                "message": message,
+                "created_at": created_at,
+                "rank": rank,
+            }
+            for message_id, group_id, user_id, message, created_at, rank in rows
+        ], next_cursor
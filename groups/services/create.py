@@ -2,6 +2,7 @@
 This module contains all the create services for the groups app.
 """
 
+import logging
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional, Tuple
@@ -10,13 +11,19 @@ from uuid import UUID
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from redis.exceptions import RedisError
 
 from groups.models import Group, GroupMember, GroupMessage
+from groups.read_state import read_state
+from groups.search import get_search_backend
 from utils.misc import extract_validation_error
+from utils.outbox import record_change
 
 User = get_user_model()
 
+logger = logging.getLogger("default")
+
 
 @dataclass
 class GroupMessageData:
@@ -38,14 +45,29 @@ def create_group_member(
     This service is used to create a group member
     """
 
+    # the messages sent before joining are not unread
+    try:
+        last_read_seq = read_state.get_group_seq(group_id)
+    except RedisError as error:
+        logger.warning(f"Failed to read group sequence: {str(error)}")
+        last_read_seq = (
+            Group.objects.filter(id=group_id)
+            .values_list("message_seq", flat=True)
+            .first()
+            or 0
+        )
+
     group_member = GroupMember(
         group_id=group_id,
         user_id=user_id,
         admin=is_admin,
+        last_read_seq=last_read_seq,
     )
 
     try:
-        group_member.save()
+        with transaction.atomic():
+            group_member.save()
+            record_change(group_member, "create")
     except ValidationError as error:
         return False, extract_validation_error(error)
 
@@ -71,12 +93,15 @@ def create_group(
         created_by_id=created_by_id,
     )
     try:
-        group.save()
-        success, group_member = create_group_member(
-            group_id=group.id, user_id=created_by_id, is_admin=True
-        )
-        if not success:
-            raise ValidationError(group_member)
+        # the group is only created along with its admin
+        with transaction.atomic():
+            group.save()
+            record_change(group, "create")
+            success, group_member = create_group_member(
+                group_id=group.id, user_id=created_by_id, is_admin=True
+            )
+            if not success:
+                raise ValidationError(group_member)
     except ValidationError as error:
         return False, extract_validation_error(error)
 
@@ -99,8 +124,10 @@ def bulk_create_group_messages(group_messages: list[GroupMessageData]):
     ]
 
     try:
+        GroupMessage.run_bulk_validators(group_messages)
+        get_search_backend().prepare(group_messages)
         group_messages = GroupMessage.objects.bulk_create(group_messages)
-    except [ValidationError, IntegrityError] as error:
+    except (ValidationError, IntegrityError) as error:
         return False, (
             extract_validation_error(error)
             if isinstance(error, ValidationError)
@@ -2,11 +2,14 @@
 This module contains all the delete services for the groups app.
 """
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.db import transaction
 
 from groups.models import Group, GroupMember
 from utils.misc import extract_validation_error
+from utils.outbox import get_initial_row, get_row, record_change, record_changes
 
 User = get_user_model()
 
@@ -17,9 +20,25 @@ def delete_group(group: Group):
     """
 
     group.is_active = False
+    before = get_initial_row(group)
     try:
-        group.save()
-        GroupMember.objects.filter(group_id=group.id).update(is_active=False)
+        with transaction.atomic():
+            group.save()
+            record_change(group, "update", before=before)
+
+            group_members = GroupMember.objects.filter(group_id=group.id)
+            # members are only loaded to record their changes in the outbox
+            changed_members = list(
+                group_members.filter(is_active=True).select_for_update()
+                if settings.OUTBOX_ENABLED
+                else ()
+            )
+            group_members.update(is_active=False)
+
+            befores = [get_row(group_member) for group_member in changed_members]
+            for group_member in changed_members:
+                group_member.is_active = False
+            record_changes(changed_members, "update", befores=befores)
     except ValidationError as error:
         return False, extract_validation_error(error)
 
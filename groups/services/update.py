@@ -6,11 +6,13 @@ from typing import Dict, List, Optional, Tuple
 from uuid import UUID
 
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.models import ImageField
 from django.utils.functional import empty
 
 from groups.models import Group
 from utils.misc import extract_validation_error
+from utils.outbox import get_initial_row, record_change
 
 
 def update_group(
@@ -62,8 +64,13 @@ def update_group(
     group.updated_by_id = updated_by_id
     updation_fields["updated_by_id"] = updated_by_id
 
+    before = get_initial_row(group)
+
+    # updated_at is the row version used by the cache, so it must be persisted as well
     try:
-        group.save(update_fields=updation_fields.keys())
+        with transaction.atomic():
+            group.save(update_fields=[*updation_fields.keys(), "updated_at"])
+            record_change(group, "update", before=before)
     except ValidationError as error:
         return False, extract_validation_error(error)
 
@@ -0,0 +1,8 @@
+BEGIN;
+
+--
+-- Create index groups_msg_group_created_idx on field(s) group, -created_at, -id of model groupmessage
+--
+CREATE INDEX "groups_msg_group_created_idx" ON "groups_groupmessage" ("group_id", "created_at" DESC, "id" DESC);
+
+COMMIT;
\ No newline at end of file
@@ -0,0 +1,95 @@
+BEGIN;
+
+--
+-- Raw SQL operation
+--
+ALTER TABLE "groups_groupmessage" RENAME TO "groups_groupmessage_unpartitioned";
+
+CREATE TABLE "groups_groupmessage" (
+    "id" bigint NOT NULL,
+    "created_at" timestamp with time zone NOT NULL,
+    "updated_at" timestamp with time zone NOT NULL,
+    "is_active" boolean NOT NULL,
+    "message" text NOT NULL,
+    "created_by_id" uuid NULL,
+    "group_id" bigint NOT NULL,
+    "updated_by_id" uuid NULL
+) PARTITION BY RANGE ("created_at");
+
+CREATE TABLE "groups_groupmessage_default" PARTITION OF "groups_groupmessage" DEFAULT;
+
+-- one partition per month of existing messages, up to the next month
+DO $$
+DECLARE
+    month date := date_trunc(
+        'month',
+        COALESCE((SELECT MIN("created_at") FROM "groups_groupmessage_unpartitioned"), now())
+        AT TIME ZONE 'UTC'
+    );
+BEGIN
+    WHILE month <= date_trunc('month', now() AT TIME ZONE 'UTC') + interval '1 month' LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF "groups_groupmessage" FOR VALUES FROM (%L) TO (%L)',
+            'groups_groupmessage_' || to_char(month, 'YYYY_MM'),
+            month::timestamp AT TIME ZONE 'UTC',
+            (month + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+        );
+        month := month + interval '1 month';
+    END LOOP;
+END
+$$;
+
+INSERT INTO "groups_groupmessage" (
+    "id", "created_at", "updated_at", "is_active", "message",
+    "created_by_id", "group_id", "updated_by_id"
+)
+SELECT
+    "id", "created_at", "updated_at", "is_active", "message",
+    "created_by_id", "group_id", "updated_by_id"
+FROM "groups_groupmessage_unpartitioned";
+
+DROP TABLE "groups_groupmessage_unpartitioned";
+
+-- identity columns are not supported on partitioned tables before postgres 17
+CREATE SEQUENCE "groups_groupmessage_id_seq" AS bigint OWNED BY "groups_groupmessage"."id";
+
+SELECT setval(
+    '"groups_groupmessage_id_seq"',
+    COALESCE((SELECT MAX("id") FROM "groups_groupmessage"), 0) + 1,
+    false
+);
+
+ALTER TABLE "groups_groupmessage"
+    ALTER COLUMN "id" SET DEFAULT nextval('"groups_groupmessage_id_seq"');
+
+-- the partition key has to be part of the primary key
+ALTER TABLE "groups_groupmessage" ADD PRIMARY KEY ("id", "created_at");
+
+ALTER TABLE "groups_groupmessage" ADD CONSTRAINT "groups_groupmessage_created_by_id_d1953350_fk_users_user_uuid" FOREIGN KEY ("created_by_id") REFERENCES "users_user" ("uuid") DEFERRABLE INITIALLY DEFERRED;
+
+ALTER TABLE "groups_groupmessage" ADD CONSTRAINT "groups_groupmessage_group_id_cf48fa26_fk_groups_group_id" FOREIGN KEY ("group_id") REFERENCES "groups_group" ("id") DEFERRABLE INITIALLY DEFERRED;
+
+ALTER TABLE "groups_groupmessage" ADD CONSTRAINT "groups_groupmessage_updated_by_id_bc0798af_fk_users_user_uuid" FOREIGN KEY ("updated_by_id") REFERENCES "users_user" ("uuid") DEFERRABLE INITIALLY DEFERRED;
+
+CREATE INDEX "groups_groupmessage_created_by_id_d1953350" ON "groups_groupmessage" ("created_by_id");
+
+CREATE INDEX "groups_groupmessage_group_id_cf48fa26" ON "groups_groupmessage" ("group_id");
+
+CREATE INDEX "groups_groupmessage_updated_by_id_bc0798af" ON "groups_groupmessage" ("updated_by_id");
+
+CREATE INDEX "groups_msg_group_created_idx" ON "groups_groupmessage" ("group_id", "created_at" DESC, "id" DESC);
+
+-- publish changes of every partition as changes of groups_groupmessage, so that
+-- debezium keeps emitting them on the cdc.public.groups_groupmessage topic
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_publication WHERE pubname = 'dbz_publication') THEN
+        DROP PUBLICATION "dbz_publication";
+    END IF;
+    CREATE PUBLICATION "dbz_publication"
+        FOR TABLE "groups_group", "groups_groupmember", "groups_groupmessage", "users_user"
+        WITH (publish_via_partition_root = true);
+END
+$$;
+
+COMMIT;
\ No newline at end of file
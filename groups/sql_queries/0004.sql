@@ -0,0 +1,17 @@
+BEGIN;
+
+--
+-- Add field message_seq to group
+--
+ALTER TABLE "groups_group" ADD COLUMN "message_seq" bigint DEFAULT 0 NOT NULL;
+
+ALTER TABLE "groups_group" ALTER COLUMN "message_seq" DROP DEFAULT;
+
+--
+-- Add field last_read_seq to groupmember
+--
+ALTER TABLE "groups_groupmember" ADD COLUMN "last_read_seq" bigint DEFAULT 0 NOT NULL;
+
+ALTER TABLE "groups_groupmember" ALTER COLUMN "last_read_seq" DROP DEFAULT;
+
+COMMIT;
\ No newline at end of file
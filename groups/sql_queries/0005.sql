@@ -0,0 +1,13 @@
+BEGIN;
+
+--
+-- Add field search_vector to groupmessage
+--
+ALTER TABLE "groups_groupmessage" ADD COLUMN "search_vector" tsvector NULL;
+
+--
+-- Create index groups_msg_search_idx on field(s) search_vector of model groupmessage
+--
+CREATE INDEX "groups_msg_search_idx" ON "groups_groupmessage" USING gin ("search_vector");
+
+COMMIT;
\ No newline at end of file
@@ -2,8 +2,11 @@
 This file contains all the subscribers for groups module.
 """
 
-from groups.models import Group, GroupMember
+from groups.models import Group, GroupMember, GroupMessage
+from groups.search import get_search_backend
+from groups.user_groups import user_groups
 from message_sdk.consumer import MessageConsumer
+from realtime.publisher import publish_member_removed
 from utils.redis import RedisCacheMixin
 
 cache_object = RedisCacheMixin()
@@ -20,10 +23,14 @@ class GroupSubscriber(MessageConsumer):
     @classmethod
     def consume(cls, instance):
         if not instance.is_active:
-            cache_object.delete_cache(key_name=str(instance.id), model=cls.model)
+            cache_object.delete_versioned_cache(
+                key_name=str(instance.id), value=instance, model=cls.model
+            )
+            # real-time connections only check the groups when they connect
+            publish_member_removed(group_id=instance.id)
             return
 
-        cache_object.set_cache(
+        cache_object.set_versioned_cache(
             key_name=str(instance.id), value=instance, model=cls.model
         )
 
@@ -39,13 +46,76 @@ class GroupMemberSubscriber(MessageConsumer):
     @classmethod
     def consume(cls, instance):
         if not instance.is_active:
-            cache_object.delete_cache(
-                key_name=f"{instance.group_id}-{instance.user_id}", model=cls.model
+            cache_object.delete_versioned_cache(
+                key_name=f"{instance.group_id}-{instance.user_id}",
+                value=instance,
+                model=cls.model,
             )
             return
 
-        cache_object.set_cache(
+        cache_object.set_versioned_cache(
             key_name=f"{instance.group_id}-{instance.user_id}",
             value=instance,
             model=cls.model,
         )
+
+
+class GroupMemberIndexSubscriber(MessageConsumer):
+    """
+    This subscriber is used to keep the groups index of users (and the real-time
+    connections of removed members) in sync with creation and updation of group members
+    """
+
+    model = GroupMember
+    trigger = {"create": True, "update": True}
+
+    @classmethod
+    def consume(cls, instance):
+        if not instance.is_active:
+            user_groups.remove_member(
+                group_id=instance.group_id, user_id=instance.user_id
+            )
+            publish_member_removed(group_id=instance.group_id, user_id=instance.user_id)
+            return
+
+        user_groups.add_member(
+            group_id=instance.group_id,
+            user_id=instance.user_id,
+            joined_at=instance.created_at,
+        )
+
+
+class GroupMemberDeleteSubscriber(MessageConsumer):
+    """
+    This subscriber is used to remove deleted group members from the groups index
+    of users and from the real-time connections of the group
+    """
+
+    model = GroupMember
+    trigger = {"delete": True}
+
+    @classmethod
+    def consume(cls, instance):
+        user_groups.remove_member(group_id=instance.group_id, user_id=instance.user_id)
+        publish_member_removed(group_id=instance.group_id, user_id=instance.user_id)
+
+
+class GroupMessageSearchSubscriber(MessageConsumer):
+    """
+    This subscriber is used to index created group messages which were not indexed
+    when they were inserted, e.g. rows written outside `bulk_create_group_messages`
+    """
+
+    model = GroupMessage
+    # messages are immutable, indexing a message updates its row which must not
+    # be consumed again, hence only creation is captured
+    trigger = {"create": True}
+
+    @classmethod
+    def should_trigger(cls, instance, operation) -> bool:
+        # messages created by the service are indexed in their INSERT
+        return instance.search_vector is None
+
+    @classmethod
+    def consume(cls, instance):
+        get_search_backend().index([instance])
@@ -3,27 +3,94 @@ This file contains all the celery tasks for groups module
 """
 
 import logging
+from time import perf_counter
 
 from celery import shared_task
+from django.conf import settings
 
+from groups.read_state import read_state
+from groups.recent_messages import recent_messages
 from groups.services import (
     bulk_create_group_messages as bulk_create_group_messages_service,
 )
+from groups.user_groups import user_groups
+from realtime.publisher import publish_group_messages
+from utils.batching import write_latency
+from utils.tracing import finish_traces, get_task_traces, record_hop
 
 logger = logging.getLogger("default")
 
 
 @shared_task(
+    bind=True,
     autoretry_for=(TimeoutError,),
     retry_kwargs={"max_retries": 3},
     default_retry_delay=200,
     serializer="pickle",
 )
-def bulk_create_group_messages(group_messages: list[dict]):
+def bulk_create_group_messages(self, group_messages: list[dict]):
     """
     This task is used to bulk create group messages
     """
 
+    # traces are aligned with the messages, None for messages which are not traced
+    traces = get_task_traces(self.request) or []
+    for trace in traces:
+        record_hop(trace, "task_started")
+
+    started_at = perf_counter()
     success, group_messages = bulk_create_group_messages_service(group_messages)
     if not success:
         logger.error(f"Error creating group messages: {group_messages}")
+        return
+
+    try:
+        # read by the consumer to size the batches it dispatches
+        write_latency.record(perf_counter() - started_at, len(group_messages))
+    except Exception as error:
+        logger.warning(f"Failed to record group message write latency: {str(error)}")
+
+    try:
+        for trace in traces:
+            record_hop(trace, "persisted")
+        finish_traces(traces)
+    except Exception as error:
+        logger.warning(f"Failed to record group message traces: {str(error)}")
+
+    try:
+        recent_messages.add(group_messages)
+    except Exception as error:
+        # buffers are only a read optimization, postgres remains the source of truth
+        logger.warning(f"Failed to buffer recent group messages: {str(error)}")
+
+    try:
+        read_state.increment_group_seqs(group_messages)
+    except Exception as error:
+        logger.error(f"Failed to increment group message sequences: {str(error)}")
+
+    try:
+        user_groups.touch_groups(group_messages)
+    except Exception as error:
+        logger.warning(f"Failed to update group activity: {str(error)}")
+
+    try:
+        publish_group_messages(group_messages)
+    except Exception as error:
+        logger.warning(f"Failed to publish group messages: {str(error)}")
+
+
+@shared_task
+def flush_read_state():
+    """
+    This task is used to write changed group sequences and read cursors to postgres
+    """
+
+    while True:
+        group_seqs, read_seqs = read_state.flush(
+            batch_size=settings.READ_STATE_FLUSH_BATCH_SIZE
+        )
+        if (
+            group_seqs < settings.READ_STATE_FLUSH_BATCH_SIZE
+            and read_seqs < settings.READ_STATE_FLUSH_BATCH_SIZE
+        ):
+            return
@@ -2,6 +2,7 @@
 This module contains all the v1 urls for the groups app.
 """
 
+from django.conf import settings
 from django.urls import path
 
 from groups.apis.v1 import *
@@ -9,6 +10,27 @@ from groups.apis.v1 import *
 urlpatterns = [
     path("", CreateGroupAPI.as_view(), name="create_group"),
     path("<int:group_id>/", UpdateGroupAPI.as_view(), name="update_group"),
-    path("message/", CreateGroupMessageAPI.as_view(), name="create_group_message"),
+    path(
+        "<int:group_id>/messages/",
+        ListGroupMessageAPI.as_view(),
+        name="list_group_messages",
+    ),
+    path("<int:group_id>/read/", MarkGroupReadAPI.as_view(), name="mark_group_read"),
+    path(
+        "messages/search/",
+        SearchGroupMessageAPI.as_view(),
+        name="search_group_messages",
+    ),
+    path("mine/", ListUserGroupAPI.as_view(), name="list_user_groups"),
+    path("unread/", UnreadCountAPI.as_view(), name="unread_counts"),
+    path(
+        "message/",
+        (
+            AsyncCreateGroupMessageAPI.as_view()
+            if settings.ASYNC_MESSAGE_API
+            else CreateGroupMessageAPI.as_view()
+        ),
+        name="create_group_message",
+    ),
     path("join/", JoinGroupAPI.as_view(), name="join_group"),
 ]
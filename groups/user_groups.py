@@ -0,0 +1,221 @@
+"""
+This module contains the per user index of groups, ordered by latest activity.
+
+Every user has a sorted set of the groups they are an active member of, scored by
+the time they joined, maintained from GroupMember CDC events. The time of the last
+message of every group is kept once per group in a shared sorted set, maintained
+by the message consumer. Listing merges the two on redis, so a message never writes
+to the index of every member of its group.
+
+A sentinel member marks indexes filled from postgres, indexes without it may be
+missing memberships and are filled again before being served. Filling an index also
+seeds the activity of its groups from their last message, so the activity survives
+a redis flush.
+
+Pages are read from a short lived view of the index scored by the latest of joining
+and the last message of every group, built on redis with ZINTERSTORE/ZUNIONSTORE,
+so a page is a range read of the view and only the page leaves redis. The order of
+the view may lag the activity by up to USER_GROUPS_VIEW_TIMEOUT.
+"""
+
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+
+from groups.models import GroupMember, GroupMessage
+from utils.redis import get_redis_client, get_redis_script, make_cache_key
+
+# KEYS[1]: index of the user, KEYS[2]: group activity, KEYS[3]: view of the user
+# ARGV[1]: sentinel, ARGV[2]: index timeout in seconds, ARGV[3]: view timeout in ms,
+# ARGV[4]: count, ARGV[5]: score of the cursor or '', ARGV[6]: group id of the cursor
+# Returns a flat list of group id and score pairs after the cursor, latest activity
+# first, or nil if the index is not filled. Equal scores are ordered by group id
+# (as strings), descending, same as ZREVRANGEBYSCORE.
+LIST_USER_GROUPS_SCRIPT = """
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    return false
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    -- last message of the groups of the user
+    redis.call('ZINTERSTORE', KEYS[3], 2, KEYS[1], KEYS[2], 'WEIGHTS', 0, 1)
+    -- latest of joining and the last message, groups without messages included
+    redis.call('ZUNIONSTORE', KEYS[3], 2, KEYS[1], KEYS[3], 'AGGREGATE', 'MAX')
+    redis.call('ZREM', KEYS[3], ARGV[1])
+    redis.call('PEXPIRE', KEYS[3], ARGV[3])
+end
+
+local count = tonumber(ARGV[4])
+local max = ARGV[5] == '' and '+inf' or ARGV[5]
+local page = {}
+local offset = 0
+while #page < count * 2 do
+    local entries = redis.call(
+        'ZREVRANGEBYSCORE', KEYS[3], max, '-inf', 'WITHSCORES', 'LIMIT', offset, count
+    )
+    if #entries == 0 then
+        break
+    end
+    for index = 1, #entries, 2 do
+        -- entries with the score of the cursor and up to its group were served
+        if #page < count * 2 and (
+            ARGV[5] == ''
+            or tonumber(entries[index + 1]) < tonumber(ARGV[5])
+            or entries[index] < ARGV[6]
+        ) then
+            page[#page + 1] = entries[index]
+            page[#page + 1] = entries[index + 1]
+        end
+    end
+    offset = offset + count
+end
+return page
+"""
+
+
+def to_score(value: datetime) -> float:
+    """
+    Returns the sorted set score of a datetime, in milliseconds since epoch.
+    """
+    return value.timestamp() * 1000
+
+
+class UserGroupIndex:
+    """
+    This class is used to maintain and read the groups of users by latest activity.
+    """
+
+    key = "USR:GROUPS"
+    view_key = "USR:GROUPS:VIEW"
+    activity_key = "GRP:ACTIVITY"
+    sentinel = "FILLED"
+
+    def get_key(self, user_id) -> str:
+        """
+        Returns the redis key of the index of a user.
+        """
+        return make_cache_key(f"{self.key}:{user_id}")
+
+    def get_view_key(self, user_id) -> str:
+        """
+        Returns the redis key of the view of the index of a user, by latest activity.
+        """
+        return make_cache_key(f"{self.view_key}:{user_id}")
+
+    def touch_groups(self, group_messages: Iterable[GroupMessage]) -> None:
+        """
+        Move the last activity of the groups of a persisted batch of messages forward.
+        """
+        activity = {}
+        for group_message in group_messages:
+            score = to_score(group_message.created_at)
+            activity[group_message.group_id] = max(
+                score, activity.get(group_message.group_id, score)
+            )
+
+        if activity:
+            get_redis_client().zadd(
+                make_cache_key(self.activity_key), activity, gt=True
+            )
+
+    def add_member(self, group_id: int, user_id, joined_at: datetime) -> None:
+        """
+        Add a group to the index of a user.
+        """
+        pipeline = get_redis_client().pipeline(transaction=False)
+        pipeline.zadd(self.get_key(user_id), {group_id: to_score(joined_at)})
+        pipeline.delete(self.get_view_key(user_id))
+        pipeline.execute()
+
+    def remove_member(self, group_id: int, user_id) -> None:
+        """
+        Remove a group from the index of a user.
+        """
+        pipeline = get_redis_client().pipeline(transaction=False)
+        pipeline.zrem(self.get_key(user_id), group_id)
+        pipeline.delete(self.get_view_key(user_id))
+        pipeline.execute()
+
+    def fill(self, user_id) -> None:
+        """
+        Fill the index of a user from postgres, and mark it as filled.
+        The activity of the groups is moved forward to their last message.
+        """
+        last_message_at = (
+            GroupMessage.active_objects.filter(group_id=OuterRef("group_id"))
+            .order_by("-created_at")
+            .values("created_at")[:1]
+        )
+        members, activity = {self.sentinel: -1}, {}
+        for group_id, joined_at, last_activity_at in (
+            GroupMember.active_objects.filter(user_id=user_id, group__is_active=True)
+            .annotate(last_message_at=Subquery(last_message_at))
+            .values_list("group_id", "created_at", "last_message_at")
+        ):
+            members[group_id] = to_score(joined_at)
+            if last_activity_at is not None:
+                activity[group_id] = to_score(last_activity_at)
+
+        key = self.get_key(user_id)
+        pipeline = get_redis_client().pipeline()
+        if activity:
+            pipeline.zadd(make_cache_key(self.activity_key), activity, gt=True)
+        pipeline.zadd(key, members)
+        pipeline.expire(key, settings.USER_GROUPS_INDEX_TIMEOUT)
+        pipeline.delete(self.get_view_key(user_id))
+        pipeline.execute()
+
+    def _list(
+        self, user_id, cursor: Optional[Tuple[float, int]], count: int
+    ) -> Optional[list]:
+        score, group_id = cursor or ("", "")
+        return get_redis_script(LIST_USER_GROUPS_SCRIPT)(
+            keys=[
+                self.get_key(user_id),
+                make_cache_key(self.activity_key),
+                self.get_view_key(user_id),
+            ],
+            args=[
+                self.sentinel,
+                settings.USER_GROUPS_INDEX_TIMEOUT,
+                int(settings.USER_GROUPS_VIEW_TIMEOUT * 1000),
+                count,
+                repr(float(score)) if cursor else "",
+                str(group_id),
+            ],
+        )
+
+    def get_groups(
+        self, user_id, cursor: Optional[Tuple[float, int]] = None, count: int = 100
+    ) -> List[Tuple[float, int]]:
+        """
+        Returns (last activity score, group id) of up to `count` groups of a user
+        after the (score, group id) cursor, latest activity first.
+        """
+        if (groups := self._list(user_id, cursor, count)) is None:
+            self.fill(user_id)
+            groups = self._list(user_id, cursor, count) or []
+
+        return [
+            (float(score), int(group_id))
+            for group_id, score in zip(*[iter(groups)] * 2)
+        ]
+
+    def get_group_ids(self, user_id) -> List[int]:
+        """
+        Returns the ids of all the groups of a user, in no particular order.
+        """
+        members = get_redis_client().zrange(self.get_key(user_id), 0, -1)
+        if self.sentinel.encode("utf-8") not in members:
+            self.fill(user_id)
+            members = get_redis_client().zrange(self.get_key(user_id), 0, -1)
+
+        return [
+            int(member) for member in members if member != self.sentinel.encode("utf-8")
+        ]
+
+
+user_groups = UserGroupIndex()
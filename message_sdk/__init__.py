@@ -3,6 +3,6 @@ This file contains all the necessary imports from message-sdk module
 """
 
 from .consumer import MessageConsumer
-from .subs import capture_debezium_message
-from .tasks import capture_cdc_events
+from .subs import capture_debezium_message, capture_outbox_message
+from .tasks import capture_cdc_events, capture_outbox_events
 from .trigger import After, Before
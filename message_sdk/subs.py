@@ -1,11 +1,12 @@
 """
-Consumer function to process data published through debezium
+Consumer functions to process data published through debezium and the outbox relay
 """
 
 from message_sdk.exceptions import MessageException
 from message_sdk.helpers import filter_message
 
 operation_mapping = {"c": "create", "r": "read", "u": "update", "d": "delete"}
+outbox_operations = {"create", "update", "delete"}
 
 
 def capture_debezium_message(data, **kwargs):
@@ -69,3 +70,28 @@ def capture_debezium_message(data, **kwargs):
             after=data["payload"]["after"],
             table=data["payload"]["source"]["table"],
         )
+
+
+def capture_outbox_message(data, **kwargs):
+    """
+    This function is used to validate data published by the outbox relay
+    It further triggers all the consumer functions based on db operations
+    """
+
+    for key in ("table", "operation", "before", "after"):
+        if key not in data:
+            raise MessageException(
+                f"No {key} data found in message_sdk.subs.capture_outbox_message"
+            )
+
+    if data["operation"] not in outbox_operations:
+        raise MessageException(
+            f"Invalid operation: {data['operation']} found in message_sdk.subs.capture_outbox_message"
+        )
+
+    filter_message(
+        operation=data["operation"],
+        before=data["before"],
+        after=data["after"],
+        table=data["table"],
+    )
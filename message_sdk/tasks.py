@@ -6,7 +6,7 @@ import logging
 
 from celery import shared_task
 
-from .subs import capture_debezium_message
+from .subs import capture_debezium_message, capture_outbox_message
 
 logger = logging.getLogger("default")
 
@@ -24,3 +24,18 @@ def capture_cdc_events(data):
 
     for message in data:
         capture_debezium_message(message)
+
+
+@shared_task(
+    autoretry_for=(TimeoutError,),
+    retry_kwargs={"max_retries": 3},
+    default_retry_delay=200,
+    serializer="pickle",
+)
+def capture_outbox_events(data):
+    """
+    This task is used to capture outbox events
+    """
+
+    for message in data:
+        capture_outbox_message(message)
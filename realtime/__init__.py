@@ -0,0 +1,4 @@
+"""
+This package contains the real-time delivery of group messages over websockets and
+server sent events, served by the ASGI application.
+"""
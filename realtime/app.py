@@ -0,0 +1,256 @@
+"""
+This file contains the ASGI application serving real-time group messages.
+
+Clients connect over a websocket, or over server sent events where websockets are
+not available, authenticated by the same jwt as the http APIs. The token is read
+from the Authorization header, or from the `token` query parameter since browsers
+can not set headers on websocket and event source requests. Connections are closed
+when their token expires or is revoked, and stop receiving the messages of a group
+once the user is removed from it (see `realtime.broker`).
+
+A connection costs a queue and two pending futures while idle, every frame is
+serialized once per group by the publisher (see `realtime.broker`).
+"""
+
+import asyncio
+import logging
+from time import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+
+from groups.models import GroupMember
+from realtime.broker import UNAUTHORIZED, broker
+from utils.authentication import JWTAuthentication
+from utils.metrics import metrics
+
+logger = logging.getLogger("default")
+
+authentication = JWTAuthentication()
+
+
+def get_token(scope) -> str | None:
+    """
+    Returns the jwt token of a connection.
+    """
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            token_type, _, token = value.decode("latin-1").partition(" ")
+            if token_type.lower() == "bearer" and token:
+                return token.strip()
+
+    tokens = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("token")
+    return tokens[0] if tokens else None
+
+
+# connections are independent, so their lookups run concurrently on the default
+# executor instead of one at a time on the single thread sensitive worker
+@sync_to_async(thread_sensitive=False)
+def authenticate(scope) -> tuple | None:
+    """
+    Returns the user of a connection and its token payload, or None if it is not
+    authenticated.
+    """
+    if not (token := get_token(scope)):
+        return None
+
+    try:
+        return authentication.authenticate_token_payload(token)
+    except AuthenticationFailed:
+        return None
+
+
+@sync_to_async(thread_sensitive=False)
+def get_group_ids(user) -> list[int]:
+    """
+    Returns the ids of the active groups the user is an active member of.
+    """
+    return list(
+        GroupMember.active_objects.filter(
+            user_id=user.uuid, group__is_active=True
+        ).values_list("group_id", flat=True)
+    )
+
+
+async def deliver(
+    user, payload: dict, group_ids, receive, send_frame, send_heartbeat=None
+) -> object | None:
+    """
+    Send the frames of the given groups to a connection until it disconnects, or
+    until its token expires.
+    Returns None if the client disconnected, else the reason the server closed the
+    stream (`realtime.broker.CLOSE` or `UNAUTHORIZED`).
+    """
+    queue = asyncio.Queue(maxsize=settings.REALTIME_QUEUE_SIZE)
+    await broker.subscribe(group_ids, queue, user_id=user.uuid, jti=payload.get("jti"))
+    metrics.increment("realtime_connections_opened_total")
+
+    receiver, getter = asyncio.ensure_future(receive()), None
+    try:
+        while True:
+            timeout = payload["exp"] - time() if "exp" in payload else None
+            if timeout is not None and timeout <= 0:
+                return UNAUTHORIZED
+            if send_heartbeat:
+                timeout = min(
+                    timeout or float("inf"), settings.REALTIME_HEARTBEAT_INTERVAL
+                )
+
+            getter = getter or asyncio.ensure_future(queue.get())
+            done, _pending = await asyncio.wait(
+                (receiver, getter), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            if receiver in done:
+                if receiver.result()["type"] in (
+                    "websocket.disconnect",
+                    "http.disconnect",
+                ):
+                    return None
+                # messages sent by clients are ignored
+                receiver = asyncio.ensure_future(receive())
+
+            if getter in done:
+                frame, getter = getter.result(), None
+                if not isinstance(frame, str):
+                    return frame
+                await send_frame(frame)
+                metrics.increment("realtime_frames_sent_total")
+
+            if not done and send_heartbeat:
+                await send_heartbeat()
+    finally:
+        receiver.cancel()
+        if getter is not None:
+            getter.cancel()
+        await broker.unsubscribe(group_ids, queue)
+        metrics.increment("realtime_connections_closed_total")
+
+
+async def websocket_application(scope, receive, send):
+    """
+    Streams the messages of the user's groups over a websocket.
+    """
+    if (await receive())["type"] != "websocket.connect":
+        return
+
+    if (authenticated := await authenticate(scope)) is None:
+        await send({"type": "websocket.close", "code": 4401})
+        return
+
+    user, payload = authenticated
+    group_ids = await get_group_ids(user)
+    await send({"type": "websocket.accept"})
+
+    async def send_frame(frame: str):
+        await send({"type": "websocket.send", "text": frame})
+
+    reason = await deliver(user, payload, group_ids, receive, send_frame)
+    if reason is UNAUTHORIZED:
+        # the token expired or was revoked, the client needs a new one
+        await send({"type": "websocket.close", "code": 4401})
+    elif reason is not None:
+        # server side close, e.g. the client could not keep up, it should reconnect
+        await send({"type": "websocket.close", "code": 1013})
+
+
+async def sse_application(scope, receive, send):
+    """
+    Streams the messages of the user's groups as server sent events.
+    """
+    if scope["method"] != "GET":
+        await send({"type": "http.response.start", "status": 405, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    if (authenticated := await authenticate(scope)) is None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 401,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"www-authenticate", b"Bearer"),
+                ],
+            }
+        )
+        await send(
+            {"type": "http.response.body", "body": b'{"detail":"Invalid token"}'}
+        )
+        return
+
+    user, payload = authenticated
+    group_ids = await get_group_ids(user)
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                # disables response buffering in nginx
+                (b"x-accel-buffering", b"no"),
+            ],
+        }
+    )
+
+    async def send_frame(frame: str):
+        await send(
+            {
+                "type": "http.response.body",
+                "body": f"data: {frame}\n\n".encode("utf-8"),
+                "more_body": True,
+            }
+        )
+
+    async def send_heartbeat():
+        await send(
+            {
+                "type": "http.response.body",
+                "body": b": heartbeat\n\n",
+                "more_body": True,
+            }
+        )
+
+    if await deliver(user, payload, group_ids, receive, send_frame, send_heartbeat):
+        await send({"type": "http.response.body", "body": b""})
+
+
+class RealtimeApplication:
+    """
+    ASGI application routing real-time connections to their handlers, and every
+    other request to the wrapped (django) application.
+    """
+
+    def __init__(self, application) -> None:
+        self.application = application
+
+    async def lifespan(self, receive, send):
+        """
+        Handles the ASGI lifespan protocol, which django does not support.
+        """
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await broker.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        if scope["type"] == "websocket":
+            if scope["path"] != settings.REALTIME_WEBSOCKET_PATH:
+                await send({"type": "websocket.close", "code": 4404})
+                return
+            return await websocket_application(scope, receive, send)
+
+        if scope["type"] == "http" and scope["path"] == settings.REALTIME_SSE_PATH:
+            return await sse_application(scope, receive, send)
+
+        return await self.application(scope, receive, send)
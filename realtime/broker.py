@@ -0,0 +1,313 @@
+"""
+This file contains the per node broker used to fan-out group messages to the
+connections of this node (ASGI process).
+
+The broker keeps a local registry mapping groups to the queues of their local
+connections, and registers the node in the redis node registry of those groups,
+renewing its entries with a heartbeat.
+It listens on a single redis pub/sub channel of its own, on which publishers send
+one frame per group batch (see `realtime.publisher`). Frames are put as is on the
+queue of every local connection of the group, so a frame is serialized once
+regardless of the number of receivers.
+
+Connections are only authorized when they connect, so the broker also unsubscribes
+the connections of members removed from a group (from the control frames of the
+node channel) and closes the connections of revoked tokens (from the revocation
+list, see `utils.token_revocation`).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+from typing import Dict, Iterable, Optional, Set
+from uuid import uuid4
+
+from django.conf import settings
+
+from realtime.publisher import (
+    REGISTER_NODE_SCRIPT,
+    REMOVAL_PREFIX,
+    decode_node_frame,
+    decode_removal_frame,
+    get_group_nodes_key,
+    get_node_channel,
+)
+from utils.metrics import metrics
+from utils.redis import get_async_redis_client
+from utils.token_revocation import revoked_tokens
+
+logger = logging.getLogger("default")
+
+# put on a connection's queue to close it, e.g. when it can not keep up
+CLOSE = object()
+# put on a connection's queue to close it when its token is no longer valid
+UNAUTHORIZED = object()
+
+
+def close_queue(queue: asyncio.Queue, reason: object = CLOSE) -> None:
+    """
+    Ask the connection reading from a queue to close, dropping a pending frame
+    if the queue is full.
+    """
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(reason)
+
+
+class GroupMessageBroker:
+    """
+    This class is used to subscribe connection queues to groups and to dispatch
+    the frames published to this node to them.
+    """
+
+    def __init__(self) -> None:
+        self.node_id = f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:8]}"
+        self._client = None
+        self._pubsub = None
+        self._reader = None
+        self._refresher = None
+        self._lock = None
+        self._queues: Dict[int, Set[asyncio.Queue]] = {}
+        # user id and token id of every local connection, by queue
+        self._connections: Dict[asyncio.Queue, tuple[str, Optional[str]]] = {}
+        self._tokens: Dict[str, Set[asyncio.Queue]] = {}
+        self._listening = False
+
+    async def start(self) -> None:
+        """
+        Connect to redis and start reading the node channel, if not started yet.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if (
+                self._client is not None
+                and self._reader is not None
+                and not self._reader.done()
+            ):
+                return
+
+            if not self._listening:
+                loop = asyncio.get_running_loop()
+                revoked_tokens.add_listener(
+                    lambda jtis: loop.call_soon_threadsafe(self.close_tokens, jtis)
+                )
+                self._listening = True
+
+            self._client = get_async_redis_client()
+            self._pubsub = self._client.pubsub()
+            await self._pubsub.subscribe(get_node_channel(self.node_id))
+            self._reader = asyncio.create_task(self._read())
+            if self._refresher is None:
+                self._refresher = asyncio.create_task(self._refresh())
+
+    async def stop(self) -> None:
+        """
+        Stop reading the node channel, deregister the node and close the connection.
+        """
+        for task in (self._reader, self._refresher):
+            if task is not None:
+                task.cancel()
+        self._reader = self._refresher = None
+
+        if self._client is not None:
+            await self._register(self._queues, add=False)
+        pubsub, client = self._pubsub, self._client
+        self._pubsub = self._client = None
+        await self._close_connection(pubsub, client)
+
+    @staticmethod
+    async def _close_connection(pubsub, client) -> None:
+        """
+        Close a pub/sub connection and its client, ignoring errors of broken ones.
+        """
+        for connection in (pubsub, client):
+            if connection is None:
+                continue
+            try:
+                await connection.aclose()
+            except Exception as error:
+                logger.debug(f"Failed to close realtime connection: {str(error)}")
+
+    @property
+    def registry_ttl(self) -> int:
+        """
+        Returns the time to live of the registry entries of this node in milliseconds,
+        entries survive two missed heartbeats.
+        """
+        return int(settings.REALTIME_REGISTRY_REFRESH_INTERVAL * 3 * 1000)
+
+    async def _register(self, group_ids: Iterable[int], add: bool = True) -> None:
+        """
+        Add (or remove) this node to the node registry of the given groups.
+        """
+        keys = [get_group_nodes_key(group_id) for group_id in group_ids]
+        if not keys:
+            return
+
+        if add:
+            await self._client.register_script(REGISTER_NODE_SCRIPT)(
+                keys=keys, args=[self.node_id, self.registry_ttl]
+            )
+            return
+
+        pipeline = self._client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.zrem(key, self.node_id)
+        await pipeline.execute()
+
+    async def subscribe(
+        self,
+        group_ids: Iterable[int],
+        queue: asyncio.Queue,
+        user_id: Optional[str] = None,
+        jti: Optional[str] = None,
+    ) -> None:
+        """
+        Subscribe a connection's queue to the messages of the given groups, on behalf
+        of a user authenticated by the token `jti`.
+        """
+        await self.start()
+
+        if user_id is not None:
+            self._connections[queue] = (str(user_id), jti)
+        if jti:
+            self._tokens.setdefault(jti, set()).add(queue)
+
+        new_group_ids = []
+        for group_id in group_ids:
+            if group_id not in self._queues:
+                self._queues[group_id] = set()
+                new_group_ids.append(group_id)
+            self._queues[group_id].add(queue)
+
+        if new_group_ids:
+            await self._register(new_group_ids)
+
+    async def unsubscribe(self, group_ids: Iterable[int], queue: asyncio.Queue) -> None:
+        """
+        Unsubscribe a connection's queue from the given groups.
+        The node is removed from the registry of groups left without local connections.
+        """
+        _user_id, jti = self._connections.pop(queue, (None, None))
+        if jti and (queues := self._tokens.get(jti)) is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._tokens[jti]
+
+        removed_group_ids = []
+        for group_id in group_ids:
+            queues = self._queues.get(group_id)
+            if queues is None:
+                continue
+
+            queues.discard(queue)
+            if not queues:
+                del self._queues[group_id]
+                removed_group_ids.append(group_id)
+
+        if removed_group_ids and self._client is not None:
+            await self._register(removed_group_ids, add=False)
+
+    async def remove_member(self, group_id: int, user_id: Optional[str]) -> int:
+        """
+        Unsubscribe the local connections of a user (of every user if None) from a
+        group, they are sent a frame telling so and keep their other groups.
+        Returns the number of connections unsubscribed.
+        """
+        queues = self._queues.get(group_id, set())
+        removed = [
+            queue
+            for queue in queues
+            if user_id is None or self._connections.get(queue, (None,))[0] == user_id
+        ]
+        if not removed:
+            return 0
+
+        frame = json.dumps(
+            {"type": "removed", "group_id": group_id}, separators=(",", ":")
+        )
+        for queue in removed:
+            queues.discard(queue)
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                close_queue(queue)
+
+        if not queues:
+            del self._queues[group_id]
+            if self._client is not None:
+                await self._register([group_id], add=False)
+        return len(removed)
+
+    def close_tokens(self, jtis: Iterable[str]) -> int:
+        """
+        Close the local connections authenticated by the given (revoked) tokens.
+        Returns the number of connections closed.
+        """
+        closed = 0
+        for jti in jtis:
+            for queue in self._tokens.pop(jti, ()):
+                close_queue(queue, UNAUTHORIZED)
+                closed += 1
+        return closed
+
+    def dispatch(self, group_id: int, frame: str) -> int:
+        """
+        Put a frame on the queue of every local connection of a group.
+        Connections whose queue is full are closed instead of buffering forever.
+        Returns the number of connections the frame was queued for.
+        """
+        queued = 0
+        for queue in tuple(self._queues.get(group_id, ())):
+            try:
+                queue.put_nowait(frame)
+                queued += 1
+            except asyncio.QueueFull:
+                metrics.increment("realtime_slow_connections_total")
+                self._queues[group_id].discard(queue)
+                close_queue(queue)
+        return queued
+
+    async def _read(self) -> None:
+        try:
+            async for message in self._pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                if message["data"].startswith(REMOVAL_PREFIX.encode("utf-8")):
+                    await self.remove_member(*decode_removal_frame(message["data"]))
+                else:
+                    self.dispatch(*decode_node_frame(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            logger.error(f"Realtime broker stopped reading: {str(error)}")
+            # let the next subscription reconnect, and drop current connections so
+            # that clients reconnect instead of silently missing messages
+            pubsub, client = self._pubsub, self._client
+            self._pubsub = self._client = None
+            for queues in self._queues.values():
+                for queue in queues:
+                    close_queue(queue)
+            await self._close_connection(pubsub, client)
+
+    async def _refresh(self) -> None:
+        """
+        Periodically renew the registry entries of this node for its groups, entries
+        of nodes which stopped (e.g. crashed) expire instead.
+        """
+        while True:
+            await asyncio.sleep(settings.REALTIME_REGISTRY_REFRESH_INTERVAL)
+            try:
+                if self._queues and self._client is not None:
+                    await self._register(tuple(self._queues))
+            except Exception as error:
+                logger.warning(
+                    f"Failed to refresh realtime node registry: {str(error)}"
+                )
+
+
+broker = GroupMessageBroker()
@@ -0,0 +1,167 @@
+"""
+This file contains the publishing side of real-time group message delivery.
+
+Every gateway node (ASGI process) registers itself in the node registry of the
+groups it has local connections for, and listens on its own node channel. The
+registry of a group is a sorted set of nodes scored by the expiry of their last
+heartbeat, nodes which stop sending heartbeats (e.g. crashed) are skipped once their
+entry expires.
+A batch of messages is serialized once per group and published once per
+(group, node), never once per recipient, fan-out to the recipients of a group
+happens locally on each node (see `realtime.broker`).
+Removals of members (or of a whole group) are published the same way, as control
+frames, so nodes stop delivering the group to the connections of those members.
+"""
+
+import json
+from typing import Iterable, Optional
+
+from groups.models import GroupMessage
+from utils.metrics import metrics
+from utils.redis import get_redis_script, make_cache_key
+
+GROUP_NODES_KEY = "REALTIME:GROUP:NODE_EXPIRY"
+NODE_CHANNEL = "REALTIME:NODE"
+# starts the control frames published to nodes, never the group id of a frame
+REMOVAL_PREFIX = "!"
+
+# KEYS[i]: node registry of the i-th group
+# ARGV[1]: node id, ARGV[2]: time to live of the entry in milliseconds
+# Entries expire at the time of the redis server, so node clocks do not matter.
+REGISTER_NODE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+for _, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now + tonumber(ARGV[2]), ARGV[1])
+    -- the latest heartbeat always expires last, the set never outlives an entry
+    redis.call('PEXPIRE', key, ARGV[2])
+end
+return #KEYS
+"""
+
+# KEYS[i]: node registry of the i-th group
+# ARGV[1]: node channel prefix, ARGV[i + 1]: frame of the i-th group
+# Expired nodes are removed from the registry. Nodes with no subscriber on their
+# channel are kept, they may be reconnecting and expire if they do not come back.
+FANOUT_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local published = 0
+for index, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now)
+    for _, node in ipairs(redis.call('ZRANGE', key, 0, -1)) do
+        if redis.call('PUBLISH', ARGV[1] .. node, ARGV[index + 1]) > 0 then
+            published = published + 1
+        end
+    end
+end
+return published
+"""
+
+
+def get_group_nodes_key(group_id: int) -> str:
+    """
+    Returns the redis key of the registry of nodes with connections to a group.
+    """
+    return make_cache_key(f"{GROUP_NODES_KEY}:{group_id}")
+
+
+def get_node_channel(node_id: str) -> str:
+    """
+    Returns the redis pub/sub channel of a gateway node.
+    """
+    return make_cache_key(f"{NODE_CHANNEL}:{node_id}")
+
+
+def serialize_group_messages(group_id: int, group_messages: list) -> str:
+    """
+    Returns the frame delivered to clients for a batch of messages of a group.
+    """
+    return json.dumps(
+        {
+            "type": "messages",
+            "group_id": group_id,
+            "messages": [
+                {
+                    "id": group_message.id,
+                    "user_id": group_message.created_by_id,
+                    "message": group_message.message,
+                    "created_at": group_message.created_at.isoformat(),
+                }
+                for group_message in group_messages
+            ],
+        },
+        separators=(",", ":"),
+        default=str,
+    )
+
+
+def encode_node_frame(group_id: int, frame: str) -> str:
+    """
+    Returns a frame prefixed with its group id, so that nodes can route it to
+    local connections without parsing it.
+    """
+    return f"{group_id}\n{frame}"
+
+
+def decode_node_frame(data: bytes) -> tuple[int, str]:
+    """
+    Returns the group id and the frame of a message received on a node channel.
+    """
+    group_id, frame = data.decode("utf-8").split("\n", 1)
+    return int(group_id), frame
+
+
+def encode_removal_frame(group_id: int, user_id: Optional[str] = None) -> str:
+    """
+    Returns the control frame removing a member, or every member, from a group.
+    """
+    return f"{REMOVAL_PREFIX}{group_id}\n{user_id or ''}"
+
+
+def decode_removal_frame(data: bytes) -> tuple[int, Optional[str]]:
+    """
+    Returns the group id and the user id (None for every member) of a control frame.
+    """
+    group_id, user_id = data[len(REMOVAL_PREFIX) :].decode("utf-8").split("\n", 1)
+    return int(group_id), user_id or None
+
+
+def publish_member_removed(group_id: int, user_id: Optional[str] = None) -> int:
+    """
+    Publish the removal of a member (or of every member, when the group is deleted)
+    to the gateway nodes of the group. Returns the number of frames published.
+    """
+    return get_redis_script(FANOUT_SCRIPT)(
+        keys=[get_group_nodes_key(group_id)],
+        args=[
+            get_node_channel(""),
+            encode_removal_frame(group_id, None if user_id is None else str(user_id)),
+        ],
+    )
+
+
+def publish_group_messages(group_messages: Iterable[GroupMessage]) -> int:
+    """
+    Publish persisted messages to the gateway nodes of their groups, in a single
+    round trip to redis. Returns the number of frames published.
+    """
+    batches = {}
+    for group_message in group_messages:
+        batches.setdefault(group_message.group_id, []).append(group_message)
+
+    if not batches:
+        return 0
+
+    published = get_redis_script(FANOUT_SCRIPT)(
+        keys=[get_group_nodes_key(group_id) for group_id in batches],
+        args=[
+            get_node_channel(""),
+            *(
+                encode_node_frame(group_id, serialize_group_messages(group_id, batch))
+                for group_id, batch in batches.items()
+            ),
+        ],
+    )
+    metrics.increment("realtime_frames_published_total", published)
+    return published
@@ -2,4 +2,4 @@
 This file contains all the v1 API imports for users app
 """
 
-from .user import CreateUserAPI, GenerateUserTokenAPI, UpdateUserAPI
+from .user import CreateUserAPI, GenerateUserTokenAPI, RevokeUserTokenAPI, UpdateUserAPI
@@ -12,10 +12,12 @@ from rest_framework.status import (
     HTTP_201_CREATED,
     HTTP_400_BAD_REQUEST,
     HTTP_404_NOT_FOUND,
+    HTTP_429_TOO_MANY_REQUESTS,
 )
 from rest_framework.views import APIView
 
 from users.services import get_or_create_user, update_user
+from utils.authentication import login_rate_limiter, revoke_user_jwt_token
 from utils.views import CachingAPIView
 
 User = get_user_model()
@@ -49,7 +51,7 @@ class GenerateUserTokenAPI(APIView):
         """
         This method is used to generate user token.
         Response Codes:
-            200, 400, 404
+            200, 400, 404, 429, 503
         """
 
         serializer = self.InputSerializer(data=request.data)
@@ -61,6 +63,14 @@ class GenerateUserTokenAPI(APIView):
         email = validated_data.get("email")
         password = validated_data.get("password")
 
+        identifier = username or email
+        if retry_after := login_rate_limiter.hit(identifier):
+            return Response(
+                status=HTTP_429_TOO_MANY_REQUESTS,
+                data={"errors": "Too many login attempts. Please try again later."},
+                headers={"Retry-After": str(retry_after)},
+            )
+
         if username:
             user = authenticate(username=username, password=password)
         else:
@@ -72,12 +82,36 @@ class GenerateUserTokenAPI(APIView):
                 data={"errors": "Invalid credentials or user not found."},
             )
 
+        login_rate_limiter.reset(identifier)
         return Response(
             status=HTTP_200_OK,
             data={"token": user.token},
         )
 
 
+class RevokeUserTokenAPI(APIView):
+    """
+    This API is used to revoke the token used to authenticate the request.
+    Response Codes:
+        200, 400
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        """
+        This method is used to revoke user token.
+        """
+
+        if not revoke_user_jwt_token(request.auth):
+            return Response(
+                status=HTTP_400_BAD_REQUEST,
+                data={"errors": "Token cannot be revoked."},
+            )
+
+        return Response(status=HTTP_200_OK, data={"message": "Token revoked"})
+
+
 class CreateUserAPI(CachingAPIView):
     """
     This API is used to create user.
@@ -125,7 +159,7 @@ class CreateUserAPI(CachingAPIView):
                 data={"errors": user},
             )
 
-        self.set_cache(key_name=str(user.uuid), value=user, model=User)
+        self.set_versioned_cache(key_name=str(user.uuid), value=user, model=User)
         return Response(status=HTTP_201_CREATED, data={"token": user.token})
 
 
@@ -175,5 +209,5 @@ class UpdateUserAPI(CachingAPIView):
                 data={"errors": user},
             )
 
-        self.set_cache(key_name=str(user.uuid), value=user, model=User)
+        self.set_versioned_cache(key_name=str(user.uuid), value=user, model=User)
         return Response(status=HTTP_200_OK)
@@ -0,0 +1,25 @@
+"""
+This file contains migration number 0002 for the users app.
+"""
+
+# Generated by Django 5.1.2 on 2026-10-19 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    This class contains all the migrations for the given migration file.
+    """
+
+    dependencies = [
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="updated at"),
+        ),
+    ]
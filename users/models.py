@@ -6,6 +6,7 @@ import uuid
 
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils.translation import gettext_lazy as _
 
 from utils.misc import FileRenamer
@@ -34,6 +35,7 @@ class User(AbstractUser, ModelDiffMixin):
     first_name = models.CharField(_("first name"), max_length=150)
     last_name = models.CharField(_("last name"), max_length=150, null=True, blank=True)
     date_joined = models.DateTimeField(_("date joined"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
     is_active = models.BooleanField(_("active"), default=True)
     profile_image = models.ImageField(
         _("profile image"),
@@ -53,6 +55,11 @@ class User(AbstractUser, ModelDiffMixin):
 
         verbose_name = _("User")
         verbose_name_plural = _("Users")
+        indexes = [
+            # used by case insensitive login lookups
+            models.Index(Lower("username"), name="users_user_username_lower_idx"),
+            models.Index(Lower("email"), name="users_user_email_lower_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.username
@@ -6,10 +6,12 @@ from typing import Dict, List, Tuple
 
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.models import ImageField
 from django.utils.functional import empty
 
 from utils.misc import extract_validation_error
+from utils.outbox import get_initial_row, record_change
 
 User = get_user_model()
 
@@ -59,8 +61,13 @@ def update_user(
     if not user.has_changed:
         return True, user
 
+    before = get_initial_row(user)
+
+    # updated_at is the row version used by the cache, so it must be persisted as well
     try:
-        user.save(update_fields=updation_fields.keys())
+        with transaction.atomic():
+            user.save(update_fields=[*updation_fields.keys(), "updated_at"])
+            record_change(user, "update", before=before)
     except ValidationError as error:
         return False, extract_validation_error(error)
 
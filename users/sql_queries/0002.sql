@@ -0,0 +1,15 @@
+BEGIN;
+
+--
+-- Add field updated_at to user
+--
+ALTER TABLE "users_user"
+ADD COLUMN "updated_at" timestamp
+with
+    time zone DEFAULT now() NOT NULL;
+
+ALTER TABLE "users_user"
+ALTER COLUMN "updated_at"
+DROP DEFAULT;
+
+COMMIT;
\ No newline at end of file
@@ -0,0 +1,13 @@
+BEGIN;
+
+--
+-- Create index users_user_username_lower_idx on Lower(F(username)) on model user
+--
+CREATE INDEX "users_user_username_lower_idx" ON "users_user" ((LOWER("username")));
+
+--
+-- Create index users_user_email_lower_idx on Lower(F(email)) on model user
+--
+CREATE INDEX "users_user_email_lower_idx" ON "users_user" ((LOWER("email")));
+
+COMMIT;
\ No newline at end of file
@@ -22,6 +22,6 @@ class UserSubscriber(MessageConsumer):
 
     @classmethod
     def consume(cls, instance):
-        cache_object.set_cache(
+        cache_object.set_versioned_cache(
             key_name=str(instance.uuid), value=instance, model=cls.model
         )
@@ -9,5 +9,6 @@ from users.apis.v1 import *
 urlpatterns = [
     path("", CreateUserAPI.as_view(), name="create-user"),
     path("token/", GenerateUserTokenAPI.as_view(), name="generate-user-token"),
+    path("token/revoke/", RevokeUserTokenAPI.as_view(), name="revoke-user-token"),
     path("update/", UpdateUserAPI.as_view(), name="update-user"),
 ]
@@ -0,0 +1,5 @@
+"""
+This file contains all the v1 API imports for utils app.
+"""
+
+from .metrics import MetricsAPI
@@ -0,0 +1,28 @@
+"""
+This file contains all the APIs related to project metrics.
+"""
+
+from django.http import HttpResponse
+from rest_framework.views import APIView
+
+from utils.metrics import metrics
+from utils.permissions import HasMetricsToken
+
+
+class MetricsAPI(APIView):
+    """
+    This API is used to export project metrics in prometheus text format.
+    """
+
+    authentication_classes = ()
+    permission_classes = (HasMetricsToken,)
+
+    def get(self, request):
+        """
+        This method is used to render all the recorded metrics.
+        """
+
+        return HttpResponse(
+            metrics.render_prometheus(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
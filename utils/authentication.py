@@ -2,29 +2,41 @@
 This module contains all the authentication related utilities
 """
 
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import timedelta
+from time import time
+from typing import Callable, Optional
+from uuid import uuid4
 
 import jwt
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import BaseBackend
-from django.db.models import Q
+from django.contrib.auth.hashers import check_password
+from django.db.models.functions import Lower
 from django.utils.timezone import now
 from rest_framework.authentication import BaseAuthentication
-from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.exceptions import APIException, AuthenticationFailed
+from rest_framework.status import HTTP_503_SERVICE_UNAVAILABLE
 
-from utils.redis import RedisCacheMixin
+from utils.redis import RedisCacheMixin, get_redis_client, make_cache_key
+from utils.token_revocation import revoked_tokens
 
 User = get_user_model()
 
 
-def create_user_jwt_token(user_id: str, expiry: int = 259200) -> str:
+def create_user_jwt_token(user_id: str, expiry: int = settings.JWT_EXPIRY) -> str:
     """
     This function creates a jwt token for a user
     """
 
     payload = {
         "user_id": str(user_id),
+        "jti": uuid4().hex,
         "iat": now(),
         "exp": now() + timedelta(seconds=expiry),
         "iss": settings.JWT_ISSUER,
@@ -55,13 +67,122 @@ def decode_user_jwt_token(token: str) -> dict | None:
         return None
 
 
+def revoke_user_jwt_token(token: str) -> bool:
+    """
+    This function revokes a jwt token for a user.
+    Returns False if the token is invalid or cannot be revoked.
+    """
+
+    payload = decode_user_jwt_token(token)
+    if not payload or not payload.get("jti"):
+        return False
+
+    revoked_tokens.revoke(jti=payload["jti"], expires_at=payload["exp"])
+    verified_tokens.evict_token(token)
+    return True
+
+
+class VerifiedTokenCache:
+    """
+    Bounded, in-process LRU cache of verified jwt payloads.
+
+    Entries are keyed by a digest of the token and are kept until the token expires,
+    so a token reused across requests is only verified once per process.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._user_tokens = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_digest(token: str) -> bytes:
+        """
+        Returns the digest used as the cache key for the token.
+        """
+        return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, token: str) -> dict | None:
+        """
+        Returns the cached payload for the token, or None if it is not cached or expired.
+        """
+        digest = self.get_digest(token)
+        with self._lock:
+            if not (payload := self._entries.get(digest)):
+                return None
+
+            if payload["exp"] <= time():
+                self._remove(digest)
+                return None
+
+            self._entries.move_to_end(digest)
+            return payload
+
+    def set(self, token: str, payload: dict) -> None:
+        """
+        Caches the verified payload for the token.
+        """
+        if self.max_size <= 0:
+            return
+
+        digest = self.get_digest(token)
+        with self._lock:
+            self._entries[digest] = payload
+            self._entries.move_to_end(digest)
+            self._user_tokens[payload["user_id"]].add(digest)
+
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def evict_token(self, token: str) -> None:
+        """
+        Removes a token from the cache.
+        """
+        with self._lock:
+            self._remove(self.get_digest(token))
+
+    def evict_user(self, user_id: str) -> None:
+        """
+        Removes all the cached tokens of a user.
+        """
+        with self._lock:
+            for digest in list(self._user_tokens.get(user_id, ())):
+                self._remove(digest)
+
+    def clear(self) -> None:
+        """
+        Removes all the cached tokens.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._user_tokens.clear()
+
+    def _remove(self, digest: bytes) -> None:
+        payload = self._entries.pop(digest, None)
+        if payload is None:
+            return
+
+        user_tokens = self._user_tokens.get(payload["user_id"])
+        if user_tokens is not None:
+            user_tokens.discard(digest)
+            if not user_tokens:
+                del self._user_tokens[payload["user_id"]]
+
+
+verified_tokens = VerifiedTokenCache(max_size=settings.JWT_VERIFIED_TOKEN_CACHE_SIZE)
+
+
 class JWTAuthentication(BaseAuthentication, RedisCacheMixin):
     """
     Custom JWT authentication for DRF
     Extracts the JWT token from the Authorization header
     """
 
-    def authenticate(self, request):
+    def get_bearer_token(self, request) -> str | None:
+        """
+        Returns the jwt token of the Authorization header, None if there is none.
+        """
         auth_header = request.headers.get("Authorization")
         if not auth_header:
             return None
@@ -69,23 +190,62 @@ class JWTAuthentication(BaseAuthentication, RedisCacheMixin):
         try:
             # Extract token from "Bearer <token>"
             token_type, token = auth_header.split()
-            if token_type.lower() != "bearer":
-                return None
+        except ValueError:
+            raise AuthenticationFailed("Invalid token")
+
+        if token_type.lower() != "bearer":
+            return None
+
+        return token
+
+    def authenticate(self, request):
+        if not (token := self.get_bearer_token(request)):
+            return None
+
+        return (self.authenticate_token(token), token)
+
+    def authenticate_token(self, token: str):
+        """
+        Returns the active user a jwt token belongs to.
+        Raises AuthenticationFailed if the token or its user is not valid.
+        """
 
-            # Decode token and get payload
-            payload = decode_user_jwt_token(token)
-            if not payload:
-                raise AuthenticationFailed("Invalid token")
+        return self.authenticate_token_payload(token)[0]
+
+    def authenticate_token_payload(self, token: str) -> tuple:
+        """
+        Returns the active user a jwt token belongs to and the token payload.
+        Raises AuthenticationFailed if the token or its user is not valid.
+        """
+
+        try:
+            # Decode token and get payload, tokens already verified by this process
+            # are served from the in-process cache until they expire
+            if not (payload := verified_tokens.get(token)):
+                payload = decode_user_jwt_token(token)
+                if not payload:
+                    raise AuthenticationFailed("Invalid token")
+                verified_tokens.set(token, payload)
+
+            # revocations are replicated locally, only bloom filter hits reach redis
+            if revoked_tokens.is_revoked(payload.get("jti")):
+                verified_tokens.evict_token(token)
+                raise AuthenticationFailed("Token has been revoked")
 
             # Get user from payload
             if not (user := self.get_cache(key_name=payload["user_id"], model=User)):
                 user = User.objects.get(uuid=payload["user_id"])
-                self.set_cache(key_name=payload["user_id"], value=user, model=User)
+                self.set_versioned_cache(
+                    key_name=payload["user_id"], value=user, model=User
+                )
 
+            # user is always resolved through the user cache,
+            # so deactivation is noticed even for tokens verified earlier
             if not user.is_active:
+                verified_tokens.evict_user(payload["user_id"])
                 raise AuthenticationFailed("User is inactive")
 
-            return (user, token)
+            return user, payload
 
         except (ValueError, User.DoesNotExist) as _error:
             raise AuthenticationFailed("Invalid token")
@@ -94,26 +254,203 @@ class JWTAuthentication(BaseAuthentication, RedisCacheMixin):
         return "Bearer"
 
 
+class AsyncJWTAuthentication(JWTAuthentication):
+    """
+    Asyncio version of JWTAuthentication, used by async views.
+    Redis is awaited on the event loop's client, postgres through django's async ORM.
+    """
+
+    async def aauthenticate(self, request):
+        if not (token := self.get_bearer_token(request)):
+            return None
+
+        return (await self.aauthenticate_token(token), token)
+
+    async def aauthenticate_token(self, token: str):
+        """
+        Returns the active user a jwt token belongs to.
+        Raises AuthenticationFailed if the token or its user is not valid.
+        """
+
+        try:
+            if not (payload := verified_tokens.get(token)):
+                payload = decode_user_jwt_token(token)
+                if not payload:
+                    raise AuthenticationFailed("Invalid token")
+                verified_tokens.set(token, payload)
+
+            if await revoked_tokens.ais_revoked(payload.get("jti")):
+                verified_tokens.evict_token(token)
+                raise AuthenticationFailed("Token has been revoked")
+
+            if not (
+                user := await self.aget_cache(key_name=payload["user_id"], model=User)
+            ):
+                user = await User.objects.aget(uuid=payload["user_id"])
+                await self.aset_versioned_cache(
+                    key_name=payload["user_id"], value=user, model=User
+                )
+
+            if not user.is_active:
+                verified_tokens.evict_user(payload["user_id"])
+                raise AuthenticationFailed("User is inactive")
+
+            return user
+
+        except (ValueError, User.DoesNotExist) as _error:
+            raise AuthenticationFailed("Invalid token")
+
+
+class LoginCapacityExceeded(APIException):
+    """
+    Raised when too many password checks are already in flight in this process.
+    """
+
+    status_code = HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many login attempts in progress, please retry."
+    default_code = "login_capacity_exceeded"
+    wait = 1
+
+
+class PasswordHasherPool:
+    """
+    Bounded thread pool used to run password hash checks off the request thread.
+
+    At most `max_workers` hashes run concurrently and at most `max_pending` wait for
+    a worker, any further login is rejected immediately instead of queueing up
+    and starving the process.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, timeout: float) -> None:
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hasher"
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+
+    def check_password(
+        self, password: str, encoded: str, setter: Optional[Callable] = None
+    ) -> bool:
+        """
+        Checks a raw password against an encoded password. `setter` is called with the
+        raw password, in the pool, when the encoded password must be upgraded.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise LoginCapacityExceeded()
+
+        try:
+            future = self._executor.submit(check_password, password, encoded, setter)
+        except Exception:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _future: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise LoginCapacityExceeded()
+
+
+password_hashers = PasswordHasherPool(
+    max_workers=settings.LOGIN_HASHER_WORKERS,
+    max_pending=settings.LOGIN_HASHER_QUEUE_SIZE,
+    timeout=settings.LOGIN_HASHER_TIMEOUT,
+)
+
+
+class LoginRateLimiter:
+    """
+    Fixed window rate limiter for login attempts of a single account.
+    """
+
+    key = "LOGIN:ATTEMPTS"
+
+    def __init__(self, limit: int, window: int) -> None:
+        self.limit = limit
+        self.window = window
+
+    def get_key(self, identifier: str) -> str:
+        """
+        Returns the redis key counting attempts for an account identifier.
+        """
+        digest = hashlib.sha256(identifier.lower().encode("utf-8")).hexdigest()
+        return make_cache_key(f"{self.key}:{digest}")
+
+    def hit(self, identifier: str) -> int:
+        """
+        Records a login attempt.
+
+        Returns:
+            int: Seconds to wait before retrying if the account is rate limited, 0 otherwise.
+        """
+        pipeline = get_redis_client().pipeline()
+        pipeline.set(self.get_key(identifier), 0, ex=self.window, nx=True)
+        pipeline.incr(self.get_key(identifier))
+        pipeline.ttl(self.get_key(identifier))
+        _, attempts, ttl = pipeline.execute()
+
+        if attempts > self.limit:
+            return max(ttl, 1)
+        return 0
+
+    def reset(self, identifier: str) -> None:
+        """
+        Resets the attempts of an account, used after a successful login.
+        """
+        get_redis_client().delete(self.get_key(identifier))
+
+
+login_rate_limiter = LoginRateLimiter(
+    limit=settings.LOGIN_RATE_LIMIT, window=settings.LOGIN_RATE_LIMIT_WINDOW
+)
+
+
 class CustomModelBackend(BaseBackend):
     """
     Custom authentication backend that supports both email and username authentication
     """
 
+    def get_login_user(self, username=None, email=None):
+        """
+        Returns the active user matching the username or email (case insensitive).
+
+        Lookups are done on lower(field), which is served by functional indexes.
+        """
+        field, value = ("username", username) if username else ("email", email)
+        if not value:
+            raise User.DoesNotExist
+
+        users = User.objects.annotate(login_value=Lower(field)).filter(
+            login_value=value.lower(), is_active=True
+        )
+        try:
+            return users.get()
+        except User.MultipleObjectsReturned:
+            # accounts differing only in case, prefer the exact match
+            return users.get(**{field: value})
+
     def authenticate(self, request, username=None, email=None, password=None, **kwargs):
         try:
-            query = Q(is_active=True)
-            if username:
-                query |= Q(username__iexact=username)
-            if email:
-                query |= Q(email__iexact=email)
-
-            user = User.objects.get(query)
-            if user.check_password(password):
-                return user
-            return None
+            user = self.get_login_user(username=username, email=email)
         except User.DoesNotExist:
             return None
 
+        encoded = user.password
+        # same as `user.check_password`, the new hash is computed in the pool when the
+        # hasher or its iterations changed, and saved here on the request thread
+        if not (
+            password
+            and password_hashers.check_password(
+                password, encoded, setter=user.set_password
+            )
+        ):
+            return None
+
+        if user.password != encoded:
+            user._password = None
+            user.save(update_fields=["password"])
+        return user
+
     def get_user(self, user_id):
         try:
             return User.objects.get(pk=user_id)
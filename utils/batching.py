@@ -0,0 +1,162 @@
+"""
+This file contains the adaptive batching of the group message consumer.
+
+Celery workers report how long writing every batch of messages to postgres took, and
+the consumer adjusts the size of the batches it dispatches and how long it lingers to
+fill them, so writes stay under a latency target:
+
+    - writes slower than the target shrink the batches (multiplicative decrease) and
+      linger longer, so postgres receives fewer, smaller writes
+    - writes well under the target while the consumer lags grow the batches (additive
+      increase) and stop lingering, to drain the backlog with fewer round trips
+    - writes well under the target without lag stop lingering, to keep messages fast
+"""
+
+import logging
+from time import monotonic, time
+from typing import Callable, List, Optional
+
+from django.conf import settings
+
+from utils.metrics import metrics
+from utils.redis import get_redis_client, make_cache_key
+
+logger = logging.getLogger("default")
+
+
+class WriteLatencyLog:
+    """
+    This class is used to share the latencies of the message writes, recorded by the
+    celery workers, with the consumer. Only the most recent samples are kept in redis.
+    """
+
+    key = "CONSUMER:WRITE_LATENCY"
+
+    def __init__(self, max_samples: int) -> None:
+        self.max_samples = max_samples
+
+    def record(self, latency: float, batch_size: int) -> None:
+        """
+        Records the time taken to write a batch of messages, in seconds.
+        """
+        pipeline = get_redis_client().pipeline(transaction=False)
+        pipeline.lpush(make_cache_key(self.key), f"{time()}:{latency}:{batch_size}")
+        pipeline.ltrim(make_cache_key(self.key), 0, self.max_samples - 1)
+        pipeline.execute()
+
+    def get_recent(self, since: float) -> List[float]:
+        """
+        Returns the latencies of the writes done since the given timestamp.
+        """
+        latencies = []
+        for sample in get_redis_client().lrange(make_cache_key(self.key), 0, -1):
+            recorded_at, latency, _batch_size = sample.decode("utf-8").split(":")
+            if float(recorded_at) >= since:
+                latencies.append(float(latency))
+        return latencies
+
+
+write_latency = WriteLatencyLog(max_samples=settings.CONSUMER_WRITE_LATENCY_SAMPLES)
+
+
+class AdaptiveBatchController:
+    """
+    This class decides the batch size and linger time of the consumer (AIMD).
+    """
+
+    # writes under this fraction of the target leave room to grow the batches
+    low_watermark = 0.7
+    decrease_factor = 0.5
+
+    def __init__(
+        self,
+        target_latency: float,
+        min_batch_size: int,
+        max_batch_size: int,
+        min_linger: float,
+        max_linger: float,
+        adjust_interval: float,
+        batch_size: Optional[int] = None,
+    ) -> None:
+        self.target_latency = target_latency
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.min_linger = min_linger
+        self.max_linger = max_linger
+        self.adjust_interval = adjust_interval
+        self.batch_size = min(
+            max(batch_size or min_batch_size, min_batch_size), max_batch_size
+        )
+        self.linger = min_linger
+        self._last_adjustment = monotonic()
+        # writes of batches sized before the last change are not representative
+        self._last_change = 0
+
+    @property
+    def increase_step(self) -> int:
+        return self.min_batch_size
+
+    def get_write_latency(self) -> Optional[float]:
+        """
+        Returns the 90th percentile of the recent write latencies, None without writes.
+        """
+        try:
+            latencies = sorted(
+                write_latency.get_recent(
+                    since=max(self._last_change, time() - self.adjust_interval * 5)
+                )
+            )
+        except Exception as error:
+            logger.warning(f"Failed to read message write latencies: {str(error)}")
+            return None
+
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(0.9 * len(latencies)))]
+
+    def adjust(self, latency: Optional[float], lag: Optional[int]) -> str:
+        """
+        Adjusts the batch size and linger time to the observed write latency and
+        consumer lag, returns the decision taken.
+        """
+        if latency is not None and latency > self.target_latency:
+            decision = "shrink"
+            self.batch_size = max(
+                self.min_batch_size, int(self.batch_size * self.decrease_factor)
+            )
+            self.linger = min(
+                self.max_linger, max(self.linger * 2, self.min_linger * 2)
+            )
+        elif latency is not None and latency < self.target_latency * self.low_watermark:
+            if lag and lag > self.batch_size and self.batch_size < self.max_batch_size:
+                decision = "grow"
+                self.batch_size = min(
+                    self.max_batch_size, self.batch_size + self.increase_step
+                )
+            else:
+                decision = "hold"
+            self.linger = max(self.min_linger, self.linger / 2)
+        else:
+            decision = "hold"
+
+        if decision != "hold":
+            self._last_change = time()
+
+        metrics.increment("consumer_batch_adjustments_total", decision=decision)
+        metrics.set_gauge("consumer_batch_size", self.batch_size)
+        metrics.set_gauge("consumer_linger_seconds", self.linger)
+        if latency is not None:
+            metrics.set_gauge("consumer_write_latency_seconds", latency)
+        if lag is not None:
+            metrics.set_gauge("consumer_lag_records", lag)
+        return decision
+
+    def maybe_adjust(self, get_lag: Callable[[], Optional[int]]) -> Optional[str]:
+        """
+        Adjusts the batches if the adjust interval has elapsed since the last time.
+        """
+        if monotonic() - self._last_adjustment < self.adjust_interval:
+            return None
+
+        self._last_adjustment = monotonic()
+        return self.adjust(latency=self.get_write_latency(), lag=get_lag())
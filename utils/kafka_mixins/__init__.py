@@ -4,3 +4,5 @@ This module contains all the imports from kafka mixins.
 
 from .kafka_consumer_mixin import BaseKafkaConsumer
 from .kafka_producer_mixin import BaseKafkaProducer
+from .lag_monitor import ConsumerLagMonitor, start_health_server
+from .registry import kafka_clients
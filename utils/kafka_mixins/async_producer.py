@@ -0,0 +1,141 @@
+"""
+This file contains the kafka producer used by asyncio code (async views).
+"""
+
+import asyncio
+import logging
+import os
+import weakref
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+
+from .transports import get_transport
+from .wire import encode_value
+
+logger = logging.getLogger("default")
+
+
+class BaseAsyncKafkaProducer:
+    """
+    Kafka producer for asyncio code, backed by aiokafka.
+
+    An aiokafka producer is bound to the event loop it was started in, so one is
+    started on first use in every event loop (i.e. per worker process) and shared
+    by everything running in it.
+    """
+
+    def __init__(
+        self,
+        *args,
+        bootstrap_servers: Optional[list[str]] = None,
+        **kwargs,
+    ):
+        """
+        This constructor is used to initialise an asyncio Kafka Producer.
+        Parameters:
+        bootstrap_servers: list[str] - List of kafka broker(s) addresses to connect to.
+                                       Defaults to KAFKA_SERVERS environment variable
+            acks: int|str - Acknowledgement level for the kafka producer. Defaults to 'all'
+            linger_ms: int - Time in milliseconds to wait for more messages before sending the current batch. Defaults to 10
+            compression_type: str - Message Compression type for the kafka producer (gzip, snappy, lz4, zstd).
+                                    Defaults to KAFKA_COMPRESSION_TYPE setting
+            max_batch_size: int - Maximum size of a batch in bytes. Defaults to 16384
+            request_timeout_ms: int - Timeout (in milliseconds) for requests to kafka broker(s). Defaults to 30000
+            transport: str - Kafka transport, see utils.kafka_mixins.transports.
+                             Defaults to KAFKA_TRANSPORT setting
+        """
+        self.__bootstrap_servers = bootstrap_servers or os.environ[
+            "KAFKA_SERVERS"
+        ].split(",")
+        self.__acks = kwargs.get("acks", "all")
+        self.__linger_ms = kwargs.get("linger_ms", 10)
+        self.__compression_type = kwargs.get(
+            "compression_type", settings.KAFKA_COMPRESSION_TYPE
+        )
+        self.__max_batch_size = kwargs.get("max_batch_size", 16384)
+        self.__request_timeout_ms = kwargs.get("request_timeout_ms", 30000)
+        self.__transport = kwargs.get("transport", settings.KAFKA_TRANSPORT)
+
+        # event loop -> task starting its producer
+        self._producers = weakref.WeakKeyDictionary()
+
+    def get_client_id(self) -> str:
+        """
+        Returns the kafka producer client id
+        """
+        return "async_kafka_producer"
+
+    def get_value_serializer(self) -> Callable:
+        """
+        Returns the kafka producer value serializer
+        """
+        return encode_value
+
+    def get_key_serializer(self) -> Callable:
+        """
+        Returns the kafka producer key serializer
+        """
+        return str.encode
+
+    async def _start_producer(self):
+        producer = get_transport(self.__transport, asynchronous=True).AIOKafkaProducer(
+            bootstrap_servers=self.__bootstrap_servers,
+            client_id=self.get_client_id(),
+            value_serializer=self.get_value_serializer(),
+            key_serializer=self.get_key_serializer(),
+            acks=self.__acks,
+            linger_ms=self.__linger_ms,
+            compression_type=self.__compression_type,
+            max_batch_size=self.__max_batch_size,
+            request_timeout_ms=self.__request_timeout_ms,
+        )
+        await producer.start()
+        return producer
+
+    async def get_producer(self):
+        """
+        Returns the started kafka producer of the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if (started := self._producers.get(loop)) is None:
+            started = self._producers[loop] = loop.create_task(self._start_producer())
+
+        try:
+            return await asyncio.shield(started)
+        except Exception as error:
+            logger.error(f"Failed to initialize Kafka producer: {str(error)}")
+            if self._producers.get(loop) is started:
+                del self._producers[loop]
+            raise
+
+    async def send_message(
+        self,
+        topic: str,
+        value: Any,
+        key: Any,
+        partition: Optional[int] = None,
+        headers: Optional[list[tuple[str, bytes]]] = None,
+    ) -> None:
+        """
+        Send a message to Kafka and wait for its acknowledgement
+        """
+        try:
+            producer = await self.get_producer()
+            await asyncio.wait_for(
+                producer.send_and_wait(
+                    topic, value=value, key=key, partition=partition, headers=headers
+                ),
+                timeout=3,
+            )
+        except Exception as e:
+            logger.error(f"Failed to send message to {topic}: {str(e)}")
+            raise
+
+    async def close_connection(self) -> None:
+        """
+        Close the kafka producer connection of the running event loop
+        """
+        started = self._producers.pop(asyncio.get_running_loop(), None)
+        if started is not None and started.done() and not started.exception():
+            await started.result().stop()
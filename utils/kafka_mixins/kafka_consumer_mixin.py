@@ -2,15 +2,19 @@
 This file contains mixins for Kafka Consumers
 """
 
-import json
 import logging
 import os
+import threading
 from abc import ABC, abstractmethod
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 
-from kafka import KafkaConsumer
+from django.conf import settings
+from kafka import KafkaConsumer, TopicPartition
 from kafka.errors import KafkaError
 
+from .transports import get_transport
+from .wire import decode_value
+
 logger = logging.getLogger("default")
 
 
@@ -23,13 +27,14 @@ class BaseKafkaConsumerMixin(ABC):
         self,
         *args,
         topics: list[str],
-        bootstrap_servers: list[str] = os.environ["KAFKA_SERVERS"].split(","),
+        bootstrap_servers: Optional[list[str]] = None,
         **kwargs,
     ):
         """
         Initialize a Kafka Consumer.
         Parameters:
-        bootstrap_servers: list[str] - List of kafka broker(s) addresses to connect to
+        bootstrap_servers: list[str] - List of kafka broker(s) addresses to connect to.
+                                       Defaults to KAFKA_SERVERS environment variable
             group_id: str - Consumer group ID
             auto_offset_reset: str - Where to start reading messages from when no offset ('earliest' or 'latest')
             enable_auto_commit: bool - Whether to auto-commit offsets
@@ -37,9 +42,13 @@ class BaseKafkaConsumerMixin(ABC):
             key_deserializer: Callable - Function to deserialize message keys
             max_poll_records: int - Maximum number of records returned in a single call to poll()
             session_timeout_ms: int - Timeout used to detect consumer failures
+            transport: str - Kafka transport, see utils.kafka_mixins.transports.
+                             Defaults to KAFKA_TRANSPORT setting
         """
         self.__topics = topics
-        self.__bootstrap_servers = bootstrap_servers
+        self.__bootstrap_servers = bootstrap_servers or os.environ[
+            "KAFKA_SERVERS"
+        ].split(",")
         self.__group_id = self.get_group_id()
         self.__value_deserializer = self.get_value_deserializer()
         self.__key_deserializer = self.get_key_deserializer()
@@ -47,15 +56,20 @@ class BaseKafkaConsumerMixin(ABC):
         self.__enable_auto_commit = kwargs.get("enable_auto_commit", True)
         self.__max_poll_records = kwargs.get("max_poll_records", 500)
         self.__session_timeout_ms = kwargs.get("session_timeout_ms", 10000)
+        self.__transport = kwargs.get("transport", settings.KAFKA_TRANSPORT)
 
-        self._initialize_consumer()
+        # the client connects to the broker(s), so it is only created on first use,
+        # and created again in forked processes (gunicorn, celery workers)
+        self._kafka_consumer = None
+        self._pid = None
+        self._lock = threading.Lock()
 
     def _initialize_consumer(self) -> None:
         """
         Initialize the Kafka consumer with error handling
         """
         try:
-            self._kafka_consumer = KafkaConsumer(
+            self._kafka_consumer = get_transport(self.__transport).KafkaConsumer(
                 *self.__topics,
                 bootstrap_servers=self.__bootstrap_servers,
                 group_id=self.__group_id,
@@ -92,8 +106,13 @@ class BaseKafkaConsumerMixin(ABC):
     @property
     def consumer(self) -> KafkaConsumer:
         """
-        Returns the kafka consumer
+        Returns the kafka consumer of the current process, created on first use
         """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._initialize_consumer()
+                    self._pid = os.getpid()
         return self._kafka_consumer
 
     def subscribe(self, topics: list[str]) -> None:
@@ -107,17 +126,71 @@ class BaseKafkaConsumerMixin(ABC):
             logger.error(f"Failed to subscribe to topics {topics}: {str(e)}")
             raise
 
-    def consume_messages(self, timeout_ms: int = 10) -> list[Any]:
+    def consume_messages(
+        self, timeout_ms: int = 10, max_records: Optional[int] = None
+    ) -> list[Any]:
         """
-        Consume messages from subscribed topics
+        Consume messages from subscribed topics.
+        Returns at most `max_records` records, defaults to `max_poll_records`.
         """
         try:
-            messages = self.consumer.poll(timeout_ms=timeout_ms)
+            messages = self.consumer.poll(
+                timeout_ms=timeout_ms, max_records=max_records
+            )
             return messages
         except Exception as e:
             logger.error(f"Error consuming messages: {str(e)}")
             raise
 
+    def get_lag(self, topics: Optional[list[str]] = None) -> Optional[int]:
+        """
+        Returns the number of records between the position of the consumer and the end
+        of its assigned partitions (of the given topics only, if provided).
+        Returns None if the offsets cannot be fetched.
+        """
+        try:
+            partitions = [
+                partition
+                for partition in self.consumer.assignment()
+                if topics is None or partition.topic in topics
+            ]
+            if not partitions:
+                return 0
+
+            end_offsets = self.consumer.end_offsets(partitions)
+            return sum(
+                max(0, end_offset - self.consumer.position(partition))
+                for partition, end_offset in end_offsets.items()
+            )
+        except Exception as error:
+            logger.warning(f"Failed to get consumer lag: {str(error)}")
+            return None
+
+    def get_partition_lags(self, topics: list[str]) -> dict[TopicPartition, int]:
+        """
+        Returns the lag of the consumer group on every partition of the given topics,
+        that is the number of records between the committed offset and the end of the
+        partition. Partitions without committed offset lag from their beginning.
+        """
+        partitions = [
+            TopicPartition(topic, partition)
+            for topic in topics
+            for partition in sorted(self.consumer.partitions_for_topic(topic) or ())
+        ]
+        if not partitions:
+            return {}
+
+        end_offsets = self.consumer.end_offsets(partitions)
+        beginning_offsets = None
+        lags = {}
+        for partition in partitions:
+            if (committed := self.consumer.committed(partition)) is None:
+                if beginning_offsets is None:
+                    beginning_offsets = self.consumer.beginning_offsets(partitions)
+                committed = beginning_offsets[partition]
+            lags[partition] = max(0, end_offsets[partition] - committed)
+        return lags
+
     def commit(self) -> None:
         """
         Commit consumed offsets
@@ -140,9 +213,13 @@ class BaseKafkaConsumerMixin(ABC):
 
     def close_connection(self) -> None:
         """
-        Close the kafka consumer connection
+        Close the kafka consumer connection, if created by the current process
         """
+        if self._kafka_consumer is None or self._pid != os.getpid():
+            return
+
         self.consumer.close()
+        self._kafka_consumer, self._pid = None, None
         logger.info(f"Kafka consumer closed: {self.__group_id}")
 
 
@@ -161,4 +238,4 @@ class BaseKafkaConsumer(BaseKafkaConsumerMixin):
         """
         Returns the kafka consumer value deserializer
         """
-        return lambda value: json.loads(value.decode("utf-8"))
+        return decode_value
@@ -2,15 +2,19 @@
 This file contains mixins for Kafka Producers
 """
 
-import json
 import logging
 import os
+import threading
 from abc import ABC, abstractmethod
 from typing import Any, Callable, Optional
 
+from django.conf import settings
 from kafka import KafkaProducer
 from kafka.errors import KafkaError
 
+from .transports import get_transport
+from .wire import encode_value
+
 logger = logging.getLogger("default")
 
 
@@ -22,13 +26,14 @@ class BaseKafkaProducerMixin(ABC):
     def __init__(
         self,
         *args,
-        bootstrap_servers: list[str] = os.environ["KAFKA_SERVERS"].split(","),
+        bootstrap_servers: Optional[list[str]] = None,
         **kwargs,
     ):
         """
         This constructor is used to initialise a Kafka Producer.
         Parameters:
-        bootstrap_servers: list[str] - List of kafka broker(s) addresses to connect to
+        bootstrap_servers: list[str] - List of kafka broker(s) addresses to connect to.
+                                       Defaults to KAFKA_SERVERS environment variable
             client_id: str - Client ID for the kafka producer̦
             value_serializer: str - Serializer for the value to sent as message to kafka broker(s)
             acks: int|str - Acknowledgement level for the kafka producer. Defaults to 'all'
@@ -37,11 +42,16 @@ class BaseKafkaProducerMixin(ABC):
             max_in_flight_requests_per_connection: int - Maximum number of concurrent requests a single kafka broker
                                                         can receive at a time. Defaults to 5 in case of retries > 0
             linger_ms: int - Time in milliseconds to wait for more messages before sending the current batch. Defaults to 10
-            compression_type: str - Message Compression type for the kafka producer. Defaults to None
+            compression_type: str - Message Compression type for the kafka producer (gzip, snappy, lz4, zstd).
+                                    Defaults to KAFKA_COMPRESSION_TYPE setting
             batch_size: int - Maximum size of request in bytes to send to kafka broker(s). Defaults to 16384
             request_timeout_ms: int - Timeout (in milliseconds) for requests to kafka broker(s). Defaults to 30000
+            transport: str - Kafka transport, see utils.kafka_mixins.transports.
+                             Defaults to KAFKA_TRANSPORT setting
         """
-        self.__bootstrap_servers = bootstrap_servers
+        self.__bootstrap_servers = bootstrap_servers or os.environ[
+            "KAFKA_SERVERS"
+        ].split(",")
         self.__client_id = self.get_client_id()
         self.__value_serializer = self.get_value_serializer()
         self.__key_serializer = self.get_key_serializer()
@@ -49,18 +59,25 @@ class BaseKafkaProducerMixin(ABC):
         self.__retries = kwargs.get("retries", 0)
         self.__max_in_flight_requests_per_connection = 5 if not self.__retries else 1
         self.__linger_ms = kwargs.get("linger_ms", 10)
-        self.__compression_type = kwargs.get("compression_type", None)
+        self.__compression_type = kwargs.get(
+            "compression_type", settings.KAFKA_COMPRESSION_TYPE
+        )
         self.__batch_size = kwargs.get("batch_size", 16384)
         self.__request_timeout_ms = kwargs.get("request_timeout_ms", 30000)
+        self.__transport = kwargs.get("transport", settings.KAFKA_TRANSPORT)
 
-        self._initialize_producer()
+        # the client connects to the broker(s), so it is only created on first use,
+        # and created again in forked processes (gunicorn, celery workers)
+        self._kafka_producer = None
+        self._pid = None
+        self._lock = threading.Lock()
 
     def _initialize_producer(self) -> None:
         """
         Initialize the Kafka producer with error handling
         """
         try:
-            self._kafka_producer = KafkaProducer(
+            self._kafka_producer = get_transport(self.__transport).KafkaProducer(
                 bootstrap_servers=self.__bootstrap_servers,
                 client_id=self.__client_id,
                 value_serializer=self.__value_serializer,
@@ -98,8 +115,13 @@ class BaseKafkaProducerMixin(ABC):
     @property
     def producer(self) -> KafkaProducer:
         """
-        Returns the kafka producer
+        Returns the kafka producer of the current process, created on first use
         """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._initialize_producer()
+                    self._pid = os.getpid()
         return self._kafka_producer
 
     def send_message(
@@ -108,6 +130,7 @@ class BaseKafkaProducerMixin(ABC):
         value: Any,
         key: Any,
         partition: Optional[Any] = None,
+        headers: Optional[list[tuple[str, bytes]]] = None,
     ) -> None:
         """
         Send a message to Kafka with monitoring
@@ -117,10 +140,11 @@ class BaseKafkaProducerMixin(ABC):
             value: Message payload
             key: Message key
             partition: Specific partition (optional)
+            headers: Message headers as (name, value) pairs (optional)
         """
         try:
             future = self.producer.send(
-                topic=topic, value=value, key=key, partition=partition
+                topic=topic, value=value, key=key, partition=partition, headers=headers
             )
             future.get(timeout=3)
         except Exception as e:
@@ -150,17 +174,21 @@ class BaseKafkaProducerMixin(ABC):
         Check the health of the kafka producer
         """
         try:
-            self.producer.bootstrap_connected()
+            return self.producer.bootstrap_connected()
         except Exception as error:
             logger.error(f"Health check failed: {str(error)}")
             return False
 
     def close_connection(self) -> None:
         """
-        Close the kafka producer connection
+        Close the kafka producer connection, if created by the current process
         """
+        if self._kafka_producer is None or self._pid != os.getpid():
+            return
+
         self.producer.flush()
         self.producer.close()
+        self._kafka_producer, self._pid = None, None
 
 
 class BaseKafkaProducer(BaseKafkaProducerMixin):
@@ -178,4 +206,4 @@ class BaseKafkaProducer(BaseKafkaProducerMixin):
         """
         Returns the kafka producer value serializer
         """
-        return lambda value: json.dumps(value).encode("utf-8")
+        return encode_value
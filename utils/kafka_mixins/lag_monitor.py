@@ -0,0 +1,181 @@
+"""
+This file contains the lag monitor of kafka consumers and its http health server.
+
+The monitor is updated from the thread polling the consumer, since kafka clients are
+not thread safe, and the health server only ever reads its last snapshot. The lag of
+a partition is its end offset minus the offset committed by the consumer group, the
+throughput is the number of records consumed per second since the last update.
+"""
+
+import json
+import logging
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, time
+from typing import Optional
+
+from utils.metrics import metrics
+
+from .kafka_consumer_mixin import BaseKafkaConsumerMixin
+
+logger = logging.getLogger("default")
+
+
+class ConsumerLagMonitor:
+    """
+    This class periodically computes the lag and throughput of a kafka consumer.
+    """
+
+    def __init__(
+        self, consumer: BaseKafkaConsumerMixin, topics: list[str], interval: float
+    ) -> None:
+        self.consumer = consumer
+        self.topics = topics
+        self.interval = interval
+        self._consumed = defaultdict(int)
+        self._lock = threading.Lock()
+        self._last_update = monotonic()
+        self._last_success = None
+        self._snapshot = {
+            "healthy": False,
+            "connected": False,
+            "updated_at": None,
+            "total_lag": None,
+            "lag": {},
+            "throughput": {},
+        }
+
+    def record_consumed(self, topic: str, count: int) -> None:
+        """
+        Records the number of records consumed from a topic.
+        """
+        with self._lock:
+            self._consumed[topic] += count
+
+    def update(self) -> None:
+        """
+        Computes the lag of every partition and the throughput of every topic.
+        """
+        now = monotonic()
+        with self._lock:
+            consumed, self._consumed = self._consumed, defaultdict(int)
+        elapsed, self._last_update = now - self._last_update, now
+
+        throughput = {
+            topic: consumed.get(topic, 0) / elapsed if elapsed > 0 else 0.0
+            for topic in self.topics
+        }
+        for topic, rate in throughput.items():
+            metrics.set_gauge("kafka_consumer_throughput", rate, topic=topic)
+
+        connected = self.consumer.health_check()
+        lag, total_lag = {}, None
+        try:
+            partition_lags = self.consumer.get_partition_lags(self.topics)
+        except Exception as error:
+            logger.warning(f"Failed to compute consumer lag: {str(error)}")
+        else:
+            self._last_success = now
+            total_lag = sum(partition_lags.values())
+            for partition, partition_lag in partition_lags.items():
+                lag.setdefault(partition.topic, {})[partition.partition] = partition_lag
+                metrics.set_gauge(
+                    "kafka_consumer_lag",
+                    partition_lag,
+                    topic=partition.topic,
+                    partition=partition.partition,
+                )
+            metrics.set_gauge("kafka_consumer_total_lag", total_lag)
+
+        self._snapshot = {
+            "healthy": self.is_healthy(connected),
+            "connected": connected,
+            "updated_at": time(),
+            "total_lag": total_lag,
+            "lag": lag,
+            "throughput": throughput,
+        }
+
+    def is_healthy(self, connected: bool) -> bool:
+        """
+        Returns whether the consumer is connected and its lag was computed recently.
+        """
+        return (
+            connected
+            and self._last_success is not None
+            and monotonic() - self._last_success <= self.interval * 3
+        )
+
+    @property
+    def snapshot(self) -> dict:
+        """
+        Returns the result of the last update.
+        """
+        snapshot = dict(self._snapshot)
+        # the polling thread may be stuck, in which case the snapshot is stale
+        snapshot["healthy"] = snapshot["healthy"] and (
+            monotonic() - self._last_update <= self.interval * 3
+        )
+        return snapshot
+
+    def render_prometheus(self) -> str:
+        """
+        Returns the lag and throughput of the last update in prometheus text format.
+        """
+        snapshot = self.snapshot
+        values = {"kafka_consumer_up": float(snapshot["healthy"])}
+        for topic, partitions in snapshot["lag"].items():
+            for partition, partition_lag in partitions.items():
+                values[
+                    f'kafka_consumer_lag{{partition="{partition}",topic="{topic}"}}'
+                ] = partition_lag
+        if snapshot["total_lag"] is not None:
+            values["kafka_consumer_total_lag"] = snapshot["total_lag"]
+        for topic, rate in snapshot["throughput"].items():
+            values[f'kafka_consumer_throughput{{topic="{topic}"}}'] = rate
+        return metrics.render_prometheus(values)
+
+
+def start_health_server(
+    monitor: ConsumerLagMonitor, port: int, host: str = "0.0.0.0"
+) -> Optional[ThreadingHTTPServer]:
+    """
+    Serves the monitor of a consumer over http from a daemon thread:
+        /health - the last snapshot as json, 503 if the consumer is not healthy
+        /metrics - the lag and throughput in prometheus text format
+    """
+
+    class HealthRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/health":
+                snapshot = monitor.snapshot
+                status = 200 if snapshot["healthy"] else 503
+                body, content_type = json.dumps(snapshot), "application/json"
+            elif self.path == "/metrics":
+                status = 200
+                body = monitor.render_prometheus()
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                status, body, content_type = 404, "", "text/plain"
+
+            body = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f"Health server: {format % args}")
+
+    try:
+        server = ThreadingHTTPServer((host, port), HealthRequestHandler)
+    except OSError as error:
+        logger.error(f"Failed to start consumer health server: {str(error)}")
+        return None
+
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Consumer health server listening on {host}:{port}")
+    return server
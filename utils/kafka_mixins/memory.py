@@ -0,0 +1,571 @@
+"""
+This file contains an in-process kafka transport, used for benchmarks, soak tests and
+local runs without brokers.
+
+Selected with KAFKA_TRANSPORT=memory. Topics are partitioned logs kept in the memory of
+the current process, so producers and consumers only see each other within a single
+process. The transport follows the kafka-python client contracts the project relies on:
+    - records are routed with kafka-python's default (murmur2) partitioner
+    - offsets are per partition and consumers read from their committed offset,
+      or from `auto_offset_reset` when the group has no committed offset
+    - consumers sharing a group id split the partitions (range assignment), the
+      group is rebalanced whenever a consumer joins or leaves
+    - offsets are committed explicitly or automatically every `auto_commit_interval_ms`
+"""
+
+import threading
+from collections import defaultdict
+from time import monotonic, time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+from uuid import uuid4
+
+from django.conf import settings
+from kafka.consumer.fetcher import ConsumerRecord
+from kafka.errors import IllegalStateError, KafkaTimeoutError
+from kafka.partitioner import DefaultPartitioner
+from kafka.producer.future import RecordMetadata
+from kafka.structs import OffsetAndMetadata, TopicPartition
+
+
+class ConsumerGroup:
+    """
+    This class holds the members of a consumer group and their assigned partitions.
+    """
+
+    def __init__(self) -> None:
+        self.generation = 0
+        self.subscriptions: Dict[str, Set[str]] = {}
+        self.assignments: Dict[str, Set[TopicPartition]] = {}
+
+
+class InMemoryKafkaBroker:
+    """
+    This class holds the partitioned logs, consumer groups and committed offsets
+    of the process.
+    """
+
+    def __init__(self, partitions: int) -> None:
+        self.partitions = partitions
+        self._condition = threading.Condition()
+        self._topics: Dict[str, List[list]] = {}
+        self._groups: Dict[str, ConsumerGroup] = defaultdict(ConsumerGroup)
+        self._offsets: Dict[tuple, OffsetAndMetadata] = {}
+
+    def _get_topic(self, topic: str) -> List[list]:
+        # topics are created on first use, like auto.create.topics.enable
+        if topic not in self._topics:
+            self._topics[topic] = [[] for _partition in range(self.partitions)]
+            for group in self._groups.values():
+                self._rebalance(group)
+        return self._topics[topic]
+
+    def topics(self) -> Set[str]:
+        with self._condition:
+            return set(self._topics)
+
+    def partitions_for(self, topic: str) -> Set[int]:
+        """
+        Returns the partition ids of a topic, creating the topic if needed.
+        """
+        with self._condition:
+            return set(range(len(self._get_topic(topic))))
+
+    def append(
+        self,
+        topic: str,
+        partition: int,
+        key: Optional[bytes],
+        value: Optional[bytes],
+        headers: list,
+    ) -> RecordMetadata:
+        """
+        Appends a record to a partition of a topic and returns its metadata.
+        """
+        with self._condition:
+            log = self._get_topic(topic)[partition]
+            record = ConsumerRecord(
+                topic=topic,
+                partition=partition,
+                offset=len(log),
+                timestamp=int(time() * 1000),
+                timestamp_type=0,
+                key=key,
+                value=value,
+                headers=headers,
+                checksum=None,
+                serialized_key_size=len(key) if key is not None else -1,
+                serialized_value_size=len(value) if value is not None else -1,
+                serialized_header_size=sum(
+                    len(name) + len(header_value or b"")
+                    for name, header_value in headers
+                ),
+            )
+            log.append(record)
+            self._condition.notify_all()
+
+        return RecordMetadata(
+            topic,
+            partition,
+            TopicPartition(topic, partition),
+            record.offset,
+            record.timestamp,
+            0,
+            None,
+            record.serialized_key_size,
+            record.serialized_value_size,
+            record.serialized_header_size,
+        )
+
+    def fetch(self, partition: TopicPartition, offset: int, max_records: int) -> list:
+        """
+        Returns up to `max_records` records of a partition, starting at `offset`.
+        """
+        with self._condition:
+            return self._get_topic(partition.topic)[partition.partition][
+                offset : offset + max_records
+            ]
+
+    def end_offset(self, partition: TopicPartition) -> int:
+        with self._condition:
+            return len(self._get_topic(partition.topic)[partition.partition])
+
+    def wait(self, timeout: float) -> None:
+        """
+        Blocks until a record is appended or the timeout expires.
+        """
+        with self._condition:
+            self._condition.wait(timeout)
+
+    def _rebalance(self, group: ConsumerGroup) -> None:
+        # range assignment, every topic is split in contiguous ranges between
+        # the members subscribed to it, sorted by member id
+        assignments = {member_id: set() for member_id in group.subscriptions}
+        topics = set().union(*group.subscriptions.values())
+        for topic in sorted(topics & set(self._topics)):
+            members = sorted(
+                member_id
+                for member_id, subscription in group.subscriptions.items()
+                if topic in subscription
+            )
+            partitions = len(self._topics[topic])
+            size, extra = divmod(partitions, len(members))
+            start = 0
+            for index, member_id in enumerate(members):
+                end = start + size + (1 if index < extra else 0)
+                assignments[member_id].update(
+                    TopicPartition(topic, partition) for partition in range(start, end)
+                )
+                start = end
+
+        group.assignments = assignments
+        group.generation += 1
+
+    def join(self, group_id: str, member_id: str, topics: Iterable[str]) -> None:
+        """
+        Adds (or updates the subscription of) a member of a consumer group.
+        """
+        with self._condition:
+            for topic in topics:
+                self._get_topic(topic)
+            group = self._groups[group_id]
+            group.subscriptions[member_id] = set(topics)
+            self._rebalance(group)
+
+    def leave(self, group_id: str, member_id: str) -> None:
+        """
+        Removes a member from a consumer group.
+        """
+        with self._condition:
+            group = self._groups[group_id]
+            if group.subscriptions.pop(member_id, None) is not None:
+                self._rebalance(group)
+
+    def get_assignment(self, group_id: str, member_id: str) -> tuple:
+        """
+        Returns the generation of a consumer group and the partitions of a member.
+        """
+        with self._condition:
+            group = self._groups[group_id]
+            return group.generation, set(group.assignments.get(member_id, ()))
+
+    def commit(
+        self, group_id: str, offsets: Dict[TopicPartition, OffsetAndMetadata]
+    ) -> None:
+        with self._condition:
+            for partition, offset in offsets.items():
+                self._offsets[group_id, partition] = offset
+
+    def committed(
+        self, group_id: str, partition: TopicPartition
+    ) -> Optional[OffsetAndMetadata]:
+        with self._condition:
+            return self._offsets.get((group_id, partition))
+
+    def clear(self) -> None:
+        """
+        Removes all the topics, consumer groups and committed offsets.
+        """
+        with self._condition:
+            self._topics.clear()
+            self._groups.clear()
+            self._offsets.clear()
+
+
+class InMemoryFuture:
+    """
+    This class mimics the future returned by `KafkaProducer.send`, records are
+    appended synchronously so the future is always resolved.
+    """
+
+    def __init__(self, metadata: RecordMetadata) -> None:
+        self.metadata = metadata
+
+    def get(self, timeout: Optional[float] = None) -> RecordMetadata:
+        return self.metadata
+
+
+class InMemoryKafkaProducer:
+    """
+    This class implements the subset of `KafkaProducer` used by the project.
+    """
+
+    def __init__(
+        self,
+        broker: Optional[InMemoryKafkaBroker] = None,
+        key_serializer: Optional[Callable] = None,
+        value_serializer: Optional[Callable] = None,
+        **configs,
+    ) -> None:
+        self.broker = broker or memory_broker
+        self.key_serializer = key_serializer
+        self.value_serializer = value_serializer
+        self.partitioner = DefaultPartitioner()
+        self._closed = False
+
+    def send(
+        self,
+        topic: str,
+        value: Any = None,
+        key: Any = None,
+        headers: Optional[list] = None,
+        partition: Optional[int] = None,
+        timestamp_ms: Optional[int] = None,
+    ) -> InMemoryFuture:
+        if self._closed:
+            raise KafkaTimeoutError("Producer is closed")
+        # same contract as kafka-python, which only accepts partition ids
+        assert partition is None or isinstance(partition, int), "partition must be int"
+
+        key_bytes = self.key_serializer(key) if self.key_serializer else key
+        value_bytes = self.value_serializer(value) if self.value_serializer else value
+
+        partitions = sorted(self.broker.partitions_for(topic))
+        if partition is None:
+            partition = self.partitioner(key_bytes, partitions, partitions)
+        elif partition not in partitions:
+            raise KafkaTimeoutError(f"Partition {partition} of {topic} not available")
+
+        return InMemoryFuture(
+            self.broker.append(topic, partition, key_bytes, value_bytes, headers or [])
+        )
+
+    def partitions_for(self, topic: str) -> Set[int]:
+        return self.broker.partitions_for(topic)
+
+    def bootstrap_connected(self) -> bool:
+        return not self._closed
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        return None
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        self._closed = True
+
+
+class InMemoryKafkaConsumer:
+    """
+    This class implements the subset of `KafkaConsumer` used by the project.
+    """
+
+    def __init__(
+        self,
+        *topics,
+        broker: Optional[InMemoryKafkaBroker] = None,
+        group_id: Optional[str] = None,
+        key_deserializer: Optional[Callable] = None,
+        value_deserializer: Optional[Callable] = None,
+        auto_offset_reset: str = "latest",
+        enable_auto_commit: bool = True,
+        auto_commit_interval_ms: int = 5000,
+        max_poll_records: int = 500,
+        **configs,
+    ) -> None:
+        self.broker = broker or memory_broker
+        self.group_id = group_id
+        self.member_id = f"{group_id}-{uuid4().hex}"
+        self.key_deserializer = key_deserializer
+        self.value_deserializer = value_deserializer
+        self.auto_offset_reset = auto_offset_reset
+        self.enable_auto_commit = enable_auto_commit and group_id is not None
+        self.auto_commit_interval = auto_commit_interval_ms / 1000
+        self.max_poll_records = max_poll_records
+
+        self._subscription: Set[str] = set()
+        self._assignment: Set[TopicPartition] = set()
+        self._generation = None
+        self._positions: Dict[TopicPartition, int] = {}
+        self._last_commit = monotonic()
+        self._closed = False
+
+        if topics:
+            self.subscribe(topics)
+
+    def subscribe(self, topics: Iterable[str] = (), pattern=None, listener=None):
+        self._subscription = set(topics)
+        if self.group_id is not None:
+            self.broker.join(self.group_id, self.member_id, self._subscription)
+            self._refresh_assignment()
+        else:
+            self._set_assignment(
+                {
+                    TopicPartition(topic, partition)
+                    for topic in self._subscription
+                    for partition in self.broker.partitions_for(topic)
+                }
+            )
+
+    def unsubscribe(self) -> None:
+        if self.group_id is not None:
+            self.broker.leave(self.group_id, self.member_id)
+        self._subscription = set()
+        self._set_assignment(set())
+
+    def subscription(self) -> Set[str]:
+        return set(self._subscription)
+
+    def assign(self, partitions: Iterable[TopicPartition]) -> None:
+        """
+        Manually assigns partitions, without group management.
+        """
+        if self._subscription:
+            raise IllegalStateError("Subscription and manual assignment are exclusive")
+        self._set_assignment(set(partitions))
+
+    def assignment(self) -> Set[TopicPartition]:
+        self._refresh_assignment()
+        return set(self._assignment)
+
+    def _set_assignment(self, partitions: Set[TopicPartition]) -> None:
+        self._assignment = partitions
+        self._positions = {
+            partition: offset
+            for partition, offset in self._positions.items()
+            if partition in partitions
+        }
+
+    def _refresh_assignment(self) -> None:
+        if self.group_id is None or not self._subscription:
+            return
+
+        generation, partitions = self.broker.get_assignment(
+            self.group_id, self.member_id
+        )
+        if generation == self._generation:
+            return
+
+        # offsets of the partitions being revoked are committed before the
+        # rebalance completes, as kafka-python does with auto commit enabled
+        if self.enable_auto_commit and self._generation is not None:
+            self.commit()
+        self._generation = generation
+        self._set_assignment(partitions)
+
+    def _get_position(self, partition: TopicPartition) -> int:
+        if partition not in self._positions:
+            committed = (
+                self.broker.committed(self.group_id, partition)
+                if self.group_id is not None
+                else None
+            )
+            if committed is not None:
+                self._positions[partition] = committed.offset
+            elif self.auto_offset_reset == "earliest":
+                self._positions[partition] = 0
+            else:
+                self._positions[partition] = self.broker.end_offset(partition)
+        return self._positions[partition]
+
+    def _deserialize(self, record: ConsumerRecord) -> ConsumerRecord:
+        key, value = record.key, record.value
+        if key is not None and self.key_deserializer:
+            key = self.key_deserializer(key)
+        if value is not None and self.value_deserializer:
+            value = self.value_deserializer(value)
+        return record._replace(key=key, value=value)
+
+    def _fetch(self, max_records: int, update_offsets: bool) -> dict:
+        records = {}
+        for partition in sorted(self._assignment):
+            if max_records <= 0:
+                break
+
+            position = self._get_position(partition)
+            fetched = self.broker.fetch(partition, position, max_records)
+            if not fetched:
+                continue
+
+            records[partition] = [self._deserialize(record) for record in fetched]
+            max_records -= len(fetched)
+            if update_offsets:
+                self._positions[partition] = position + len(fetched)
+        return records
+
+    def poll(
+        self,
+        timeout_ms: int = 0,
+        max_records: Optional[int] = None,
+        update_offsets: bool = True,
+    ) -> Dict[TopicPartition, List[ConsumerRecord]]:
+        """
+        Returns the records fetched from the assigned partitions, by partition.
+        Blocks up to `timeout_ms` until records are available.
+        """
+        if self._closed:
+            raise IllegalStateError("Consumer is closed")
+
+        deadline = monotonic() + timeout_ms / 1000
+        while True:
+            self._refresh_assignment()
+            if (
+                self.enable_auto_commit
+                and monotonic() - self._last_commit >= self.auto_commit_interval
+            ):
+                self.commit()
+
+            if records := self._fetch(
+                max_records or self.max_poll_records, update_offsets
+            ):
+                return records
+
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return {}
+            self.broker.wait(remaining)
+
+    def commit(
+        self, offsets: Optional[Dict[TopicPartition, OffsetAndMetadata]] = None
+    ) -> None:
+        """
+        Commits the given offsets, by default the positions of the assigned partitions.
+        """
+        if self.group_id is None:
+            raise IllegalStateError("Requires group_id")
+
+        if offsets is None:
+            offsets = {
+                partition: OffsetAndMetadata(offset, "")
+                for partition, offset in self._positions.items()
+                if partition in self._assignment
+            }
+        self.broker.commit(self.group_id, offsets)
+        self._last_commit = monotonic()
+
+    def commit_async(self, offsets=None, callback=None) -> None:
+        self.commit(offsets)
+        if callback:
+            callback(offsets, None)
+
+    def committed(self, partition: TopicPartition) -> Optional[int]:
+        committed = self.broker.committed(self.group_id, partition)
+        return committed.offset if committed is not None else None
+
+    def position(self, partition: TopicPartition) -> int:
+        return self._get_position(partition)
+
+    def seek(self, partition: TopicPartition, offset: int) -> None:
+        self._positions[partition] = offset
+
+    def seek_to_beginning(self, *partitions: TopicPartition) -> None:
+        for partition in partitions or self._assignment:
+            self._positions[partition] = 0
+
+    def seek_to_end(self, *partitions: TopicPartition) -> None:
+        for partition in partitions or self._assignment:
+            self._positions[partition] = self.broker.end_offset(partition)
+
+    def beginning_offsets(self, partitions: Iterable[TopicPartition]) -> dict:
+        return {partition: 0 for partition in partitions}
+
+    def end_offsets(self, partitions: Iterable[TopicPartition]) -> dict:
+        return {
+            partition: self.broker.end_offset(partition) for partition in partitions
+        }
+
+    def partitions_for_topic(self, topic: str) -> Set[int]:
+        return self.broker.partitions_for(topic)
+
+    def topics(self) -> Set[str]:
+        return self.broker.topics()
+
+    def bootstrap_connected(self) -> bool:
+        return not self._closed
+
+    def close(self, autocommit: bool = True) -> None:
+        if self._closed:
+            return
+        if autocommit and self.enable_auto_commit:
+            self.commit()
+        if self.group_id is not None and self._subscription:
+            self.broker.leave(self.group_id, self.member_id)
+        self._closed = True
+
+
+class InMemoryAIOKafkaProducer:
+    """
+    This class implements the subset of aiokafka's `AIOKafkaProducer` used by the project.
+    """
+
+    def __init__(
+        self,
+        broker: Optional[InMemoryKafkaBroker] = None,
+        key_serializer: Optional[Callable] = None,
+        value_serializer: Optional[Callable] = None,
+        **configs,
+    ) -> None:
+        self._producer = InMemoryKafkaProducer(
+            broker=broker,
+            key_serializer=key_serializer,
+            value_serializer=value_serializer,
+        )
+
+    async def start(self) -> None:
+        return None
+
+    async def stop(self) -> None:
+        self._producer.close()
+
+    async def send_and_wait(
+        self,
+        topic: str,
+        value: Any = None,
+        key: Any = None,
+        partition: Optional[int] = None,
+        timestamp_ms: Optional[int] = None,
+        headers: Optional[list] = None,
+    ) -> RecordMetadata:
+        return self._producer.send(
+            topic,
+            value=value,
+            key=key,
+            headers=headers,
+            partition=partition,
+            timestamp_ms=timestamp_ms,
+        ).get()
+
+
+# names of the kafka-python and aiokafka clients, see utils.kafka_mixins.transports
+KafkaProducer = InMemoryKafkaProducer
+KafkaConsumer = InMemoryKafkaConsumer
+AIOKafkaProducer = InMemoryAIOKafkaProducer
+
+memory_broker = InMemoryKafkaBroker(partitions=settings.KAFKA_MEMORY_PARTITIONS)
@@ -0,0 +1,72 @@
+"""
+This file contains the registry of the kafka clients shared within a process.
+
+Clients are registered by name and constructed on first use, constructing a client
+does not connect to kafka, see the kafka mixins. Every process (gunicorn worker,
+celery worker) ends up with its own connections, created after it was forked.
+"""
+
+import threading
+from typing import Callable, Dict
+
+from .async_producer import BaseAsyncKafkaProducer
+from .kafka_consumer_mixin import BaseKafkaConsumer, BaseKafkaConsumerMixin
+from .kafka_producer_mixin import BaseKafkaProducer, BaseKafkaProducerMixin
+
+
+class KafkaClientRegistry:
+    """
+    This class holds named kafka producers and consumers.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._clients: Dict[str, object] = {}
+
+    def get(self, name: str, factory: Callable[[], object]):
+        """
+        Returns the client registered with the given name, constructed with
+        `factory` if it is not registered yet.
+        """
+        if (client := self._clients.get(name)) is None:
+            with self._lock:
+                if (client := self._clients.get(name)) is None:
+                    client = self._clients[name] = factory()
+        return client
+
+    def get_producer(self, name: str = "default", **kwargs) -> BaseKafkaProducerMixin:
+        """
+        Returns the named producer, created with the given arguments on first use.
+        """
+        return self.get(f"producer:{name}", lambda: BaseKafkaProducer(**kwargs))
+
+    def get_async_producer(
+        self, name: str = "default", **kwargs
+    ) -> BaseAsyncKafkaProducer:
+        """
+        Returns the named asyncio producer, created with the given arguments on first use.
+        """
+        return self.get(
+            f"async_producer:{name}", lambda: BaseAsyncKafkaProducer(**kwargs)
+        )
+
+    def get_consumer(self, name: str, **kwargs) -> BaseKafkaConsumerMixin:
+        """
+        Returns the named consumer, created with the given arguments on first use.
+        """
+        return self.get(f"consumer:{name}", lambda: BaseKafkaConsumer(**kwargs))
+
+    def close(self) -> None:
+        """
+        Closes the connections of all the registered clients.
+        """
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+
+        for client in clients:
+            # asyncio producers are closed by their event loop
+            if not isinstance(client, BaseAsyncKafkaProducer):
+                client.close_connection()
+
+
+kafka_clients = KafkaClientRegistry()
@@ -0,0 +1,29 @@
+"""
+This file contains the lookup of kafka transports.
+
+A transport is a module exposing `KafkaProducer` and `KafkaConsumer` classes with the
+kafka-python client interfaces, and its asyncio counterpart a module exposing an
+`AIOKafkaProducer` class with the aiokafka interface. KAFKA_TRANSPORT is either one
+of the aliases below or the dotted path of such a module.
+"""
+
+from importlib import import_module
+from types import ModuleType
+
+TRANSPORTS = {
+    "kafka": "kafka",
+    "memory": "utils.kafka_mixins.memory",
+}
+
+ASYNC_TRANSPORTS = {
+    "kafka": "aiokafka",
+    "memory": "utils.kafka_mixins.memory",
+}
+
+
+def get_transport(name: str, asynchronous: bool = False) -> ModuleType:
+    """
+    Returns the module implementing the given kafka transport.
+    """
+    transports = ASYNC_TRANSPORTS if asynchronous else TRANSPORTS
+    return import_module(transports.get(name, name))
@@ -0,0 +1,110 @@
+"""
+This file contains the wire format of the records sent to kafka.
+
+Group messages are encoded as a msgpack array of their fields, in a fixed order,
+behind a two byte header: a magic byte, which can not start a JSON document, and the
+version of the schema. User ids are sent as their 16 raw bytes and timestamps as
+microseconds since the epoch.
+
+    version 1: [group_id, message, user_id, created_at]
+
+Any other value, and every value when KAFKA_WIRE_FORMAT is "json", is sent as JSON.
+Records without the magic byte are decoded as JSON, so records produced before the
+compact format (or by another producer) are still readable.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+from uuid import UUID
+
+import msgpack
+from django.conf import settings
+
+MAGIC = 0xC1  # never used by msgpack, not a valid first byte of a JSON document
+GROUP_MESSAGE_V1 = 1
+
+GROUP_MESSAGE_FIELDS = ("group_id", "message", "user_id", "created_at")
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_microseconds(value: str) -> int:
+    """
+    Returns the microseconds since the epoch of an ISO 8601 timestamp.
+    """
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is None:
+        raise ValueError("Timestamp without timezone")
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+
+def from_microseconds(value: int) -> str:
+    """
+    Returns the ISO 8601 (UTC) timestamp of microseconds since the epoch.
+    """
+    return (EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+def encode_group_message(value: dict) -> bytes:
+    """
+    Returns the compact encoding of a group message.
+    Raises ValueError or TypeError if a field can not be encoded.
+    """
+    payload = msgpack.packb(
+        [
+            int(value["group_id"]),
+            value["message"],
+            UUID(value["user_id"]).bytes,
+            to_microseconds(value["created_at"]),
+        ],
+        use_bin_type=True,
+    )
+    return bytes((MAGIC, GROUP_MESSAGE_V1)) + payload
+
+
+def decode_group_message(version: int, payload: bytes) -> dict:
+    """
+    Returns the group message of a compact encoded payload.
+    """
+    if version != GROUP_MESSAGE_V1:
+        raise ValueError(f"Unknown group message schema version {version}")
+
+    group_id, message, user_id, created_at = msgpack.unpackb(payload, raw=False)
+    return {
+        "group_id": group_id,
+        "message": message,
+        "user_id": str(UUID(bytes=user_id)),
+        "created_at": from_microseconds(created_at),
+    }
+
+
+def encode_value(value: Any) -> bytes:
+    """
+    Returns the bytes sent to kafka for a record value.
+    """
+    if (
+        settings.KAFKA_WIRE_FORMAT == "msgpack"
+        and isinstance(value, dict)
+        and len(value) == len(GROUP_MESSAGE_FIELDS)
+        and all(field in value for field in GROUP_MESSAGE_FIELDS)
+    ):
+        try:
+            return encode_group_message(value)
+        except (TypeError, ValueError):
+            pass
+
+    return json.dumps(value).encode("utf-8")
+
+
+def decode_value(data: Optional[bytes]) -> Any:
+    """
+    Returns the record value of the bytes received from kafka.
+    """
+    if data is None:
+        return None
+
+    if data[:1] == bytes((MAGIC,)):
+        return decode_group_message(data[1], data[2:])
+
+    return json.loads(data.decode("utf-8"))
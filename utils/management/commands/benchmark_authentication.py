@@ -0,0 +1,76 @@
+"""
+This file contains custom django command to benchmark jwt authentication overhead.
+"""
+
+from timeit import timeit
+from uuid import uuid4
+
+from django.core.management import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from utils.authentication import (
+    JWTAuthentication,
+    create_user_jwt_token,
+    decode_user_jwt_token,
+    verified_tokens,
+)
+
+
+class Command(BaseCommand):
+    """
+    This command is used to measure the per request cost of jwt authentication.
+    """
+
+    help = "Benchmark jwt verification with and without the verified token cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=10000)
+        parser.add_argument(
+            "--user-id",
+            help="Existing user id, used to benchmark the full authenticate call.",
+        )
+
+    def report(self, name: str, seconds: float, iterations: int) -> None:
+        """
+        Writes the per operation cost of a benchmark.
+        """
+        self.stdout.write(f"{name:<32} {seconds / iterations * 1_000_000:>10.2f} us/op")
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        token = create_user_jwt_token(user_id=options["user_id"] or uuid4())
+
+        verified_tokens.clear()
+        self.report(
+            "jwt.decode",
+            timeit(lambda: decode_user_jwt_token(token), number=iterations),
+            iterations,
+        )
+
+        verified_tokens.set(token, decode_user_jwt_token(token))
+        self.report(
+            "verified token cache",
+            timeit(lambda: verified_tokens.get(token), number=iterations),
+            iterations,
+        )
+
+        if not options["user_id"]:
+            return
+
+        authentication = JWTAuthentication()
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        def authenticate_cold():
+            verified_tokens.clear()
+            authentication.authenticate(request)
+
+        self.report(
+            "authenticate (cold token cache)",
+            timeit(authenticate_cold, number=iterations),
+            iterations,
+        )
+        self.report(
+            "authenticate (warm token cache)",
+            timeit(lambda: authentication.authenticate(request), number=iterations),
+            iterations,
+        )
@@ -0,0 +1,128 @@
+"""
+This file contains custom django command to benchmark real-time fan-out of large groups.
+"""
+
+import asyncio
+from time import perf_counter
+from uuid import uuid4
+
+from django.core.management import BaseCommand
+from django.utils.timezone import now
+
+from groups.models import GroupMessage
+from realtime.broker import GroupMessageBroker
+from realtime.publisher import (
+    get_group_nodes_key,
+    get_node_channel,
+    publish_group_messages,
+    serialize_group_messages,
+)
+from utils.redis import get_redis_client
+
+
+class Command(BaseCommand):
+    """
+    This command is used to simulate broadcasting messages to a large group, spread
+    over several gateway nodes, and to compare it with per recipient delivery.
+    """
+
+    help = "Benchmark real-time fan-out throughput for a large group."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--members", type=int, default=100000)
+        parser.add_argument("--nodes", type=int, default=10)
+        parser.add_argument("--messages", type=int, default=1000)
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--publish",
+            action="store_true",
+            help="Also measure publishing through redis, using the cache's redis.",
+        )
+
+    def get_batches(self, group_id: int, messages: int, batch_size: int):
+        """
+        Returns batches of unsaved group messages, as the consumer would persist them.
+        """
+        created_at = now()
+        group_messages = [
+            GroupMessage(
+                id=index + 1,
+                group_id=group_id,
+                created_by_id=uuid4(),
+                message=f"benchmark message {index}",
+                created_at=created_at,
+            )
+            for index in range(messages)
+        ]
+        return [
+            group_messages[index : index + batch_size]
+            for index in range(0, messages, batch_size)
+        ]
+
+    def benchmark_dispatch(self, group_id: int, frames: list, receivers: int) -> float:
+        """
+        Returns the time taken by a node to queue every frame for its local receivers.
+        """
+        broker = GroupMessageBroker()
+        broker._queues[group_id] = {asyncio.Queue() for _ in range(receivers)}
+
+        start = perf_counter()
+        for frame in frames:
+            broker.dispatch(group_id, frame)
+        return perf_counter() - start
+
+    def benchmark_publish(self, group_id: int, batches: list, nodes: int) -> float:
+        """
+        Returns the time taken to publish every batch to the group's nodes via redis.
+        """
+        client = get_redis_client()
+        node_ids = [f"benchmark-{uuid4().hex[:8]}" for _ in range(nodes)]
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(*(get_node_channel(node_id) for node_id in node_ids))
+        client.sadd(get_group_nodes_key(group_id), *node_ids)
+
+        try:
+            start = perf_counter()
+            for batch in batches:
+                publish_group_messages(batch)
+            return perf_counter() - start
+        finally:
+            client.delete(get_group_nodes_key(group_id))
+            pubsub.close()
+
+    def handle(self, *args, **options):
+        members, nodes = options["members"], options["nodes"]
+        group_id = -1  # never collides with a real group
+        batches = self.get_batches(group_id, options["messages"], options["batch_size"])
+
+        start = perf_counter()
+        frames = [serialize_group_messages(group_id, batch) for batch in batches]
+        serialize_seconds = perf_counter() - start
+
+        receivers = members // nodes
+        dispatch_seconds = self.benchmark_dispatch(group_id, frames, receivers)
+        deliveries = len(frames) * receivers
+
+        self.stdout.write(
+            f"group of {members} members over {nodes} nodes, "
+            f"{options['messages']} messages in {len(batches)} batches"
+        )
+        self.stdout.write(
+            f"redis publishes: {len(batches) * nodes} "
+            f"(per recipient delivery: {len(batches) * members})"
+        )
+        self.stdout.write(
+            f"serialization: {serialize_seconds * 1000:.2f} ms "
+            f"(per recipient serialization: ~{serialize_seconds * members:.2f} s)"
+        )
+        self.stdout.write(
+            f"node dispatch: {deliveries} deliveries in {dispatch_seconds:.3f} s "
+            f"({deliveries / dispatch_seconds:,.0f} deliveries/s per node)"
+        )
+
+        if options["publish"]:
+            publish_seconds = self.benchmark_publish(group_id, batches, nodes)
+            self.stdout.write(
+                f"publish: {len(batches)} batches in {publish_seconds:.3f} s "
+                f"({options['messages'] / publish_seconds:,.0f} messages/s)"
+            )
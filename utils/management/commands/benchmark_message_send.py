@@ -0,0 +1,213 @@
+"""
+This file contains custom django command to load test the group message send API.
+"""
+
+import json
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+
+from groups.apis.v1 import CreateGroupMessageAPI
+from groups.models import Group, GroupMember
+from groups.services import create_group, create_group_member
+from users.services import get_or_create_user
+from utils.authentication import create_user_jwt_token
+from utils.kafka_mixins import BaseKafkaProducer
+
+STAGES = ("auth", "validation", "produce")
+
+_current = threading.local()
+
+
+class TimedKafkaProducer:
+    """
+    This class wraps a kafka producer and records the time spent producing.
+    """
+
+    def __init__(self, producer: BaseKafkaProducer) -> None:
+        self.producer = producer
+
+    def send_message(self, *args, **kwargs) -> None:
+        started_at = perf_counter()
+        try:
+            self.producer.send_message(*args, **kwargs)
+        finally:
+            _current.timings["produce"] = perf_counter() - started_at
+
+
+class TimedCreateGroupMessageAPI(CreateGroupMessageAPI):
+    """
+    This class records the time spent in every stage of the create group message API.
+    Validation covers request body validation and the group membership checks.
+    """
+
+    def perform_authentication(self, request):
+        started_at = perf_counter()
+        try:
+            super().perform_authentication(request)
+        finally:
+            _current.timings["auth"] = perf_counter() - started_at
+
+    def post(self, request):
+        started_at = perf_counter()
+        try:
+            return super().post(request)
+        finally:
+            _current.timings["validation"] = (
+                perf_counter() - started_at - _current.timings.get("produce", 0)
+            )
+
+
+def summarize(samples: list[float]) -> dict:
+    """
+    Returns the latency percentiles of the samples in milliseconds.
+    """
+    if not samples:
+        return {}
+
+    samples = sorted(samples)
+
+    def percentile(fraction: float) -> float:
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": percentile(0.50) * 1000,
+        "p90_ms": percentile(0.90) * 1000,
+        "p99_ms": percentile(0.99) * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+class Command(BaseCommand):
+    """
+    This command is used to measure latency and throughput of the message send path.
+
+    Synthetic users and groups are created (or reused) through the services, every
+    request goes through the full API stack with a real jwt, the local redis and
+    postgres. Messages are produced to the in-process kafka stand-in.
+    """
+
+    help = "Load test POST /v1/groups/message/ and report latencies as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--groups", type=int, default=5)
+        parser.add_argument("--requests", type=int, default=5000)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--warmup", type=int, default=100)
+        parser.add_argument("--message-size", type=int, default=64)
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def setup_fixtures(self, users: int, groups: int) -> list[tuple[str, int]]:
+        """
+        Creates the synthetic users and groups, every user is a member of every group.
+        Returns (token, group id) pairs to send messages with.
+        """
+        user_ids = []
+        for index in range(users):
+            success, user = get_or_create_user(
+                email=f"bench-user-{index}@wemessage.local",
+                username=f"bench_user_{index}",
+                first_name="Bench",
+            )
+            if not success:
+                raise CommandError(f"Failed to create user: {user}")
+            user_ids.append(user.uuid)
+
+        group_ids = []
+        for index in range(groups):
+            tag = f"bench-group-{index}"
+            if not (group := Group.active_objects.filter(tag=tag).first()):
+                success, group = create_group(
+                    name=tag, tag=tag, description="", created_by_id=user_ids[0]
+                )
+                if not success:
+                    raise CommandError(f"Failed to create group: {group}")
+            group_ids.append(group.id)
+
+            members = set(
+                GroupMember.active_objects.filter(group=group).values_list(
+                    "user_id", flat=True
+                )
+            )
+            for user_id in user_ids:
+                if user_id not in members:
+                    create_group_member(group_id=group.id, user_id=user_id)
+
+        tokens = [create_user_jwt_token(user_id=user_id) for user_id in user_ids]
+        return [
+            (tokens[index % len(tokens)], group_ids[index % len(group_ids)])
+            for index in range(len(tokens) * len(group_ids))
+        ]
+
+    def handle(self, *args, **options):
+        senders = self.setup_fixtures(options["users"], options["groups"])
+        message = "x" * options["message_size"]
+
+        # messages are never sent to the brokers, whatever KAFKA_TRANSPORT is
+        TimedCreateGroupMessageAPI.kafka_producer = TimedKafkaProducer(
+            BaseKafkaProducer(transport="memory")
+        )
+        view = TimedCreateGroupMessageAPI.as_view()
+        factory = APIRequestFactory()
+
+        def send(index: int):
+            token, group_id = senders[index % len(senders)]
+            request = factory.post(
+                "/v1/groups/message/",
+                {"group_id": group_id, "message": message},
+                format="json",
+                HTTP_AUTHORIZATION=f"Bearer {token}",
+            )
+            _current.timings = {}
+            started_at = perf_counter()
+            response = view(request)
+            return response.status_code, perf_counter() - started_at, _current.timings
+
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            list(executor.map(send, range(options["warmup"])))
+
+            started_at = perf_counter()
+            results = list(executor.map(send, range(options["requests"])))
+            elapsed = perf_counter() - started_at
+
+        errors = sum(1 for status, _latency, _timings in results if status != 200)
+        report = {
+            "benchmark": "message_send",
+            "config": {
+                key: options[key]
+                for key in (
+                    "users",
+                    "groups",
+                    "requests",
+                    "concurrency",
+                    "warmup",
+                    "message_size",
+                )
+            },
+            "kafka_transport": "memory",
+            "database": settings.DATABASES["default"]["ENGINE"],
+            "elapsed_s": elapsed,
+            "throughput_rps": len(results) / elapsed,
+            "errors": errors,
+            "latency": summarize([latency for _status, latency, _timings in results]),
+            "stages": {
+                stage: summarize(
+                    [timings[stage] for _s, _l, timings in results if stage in timings]
+                )
+                for stage in STAGES
+            },
+        }
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output)
+        self.stdout.write(output)
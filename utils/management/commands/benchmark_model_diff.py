@@ -0,0 +1,73 @@
+"""
+This file contains custom django command to benchmark model change tracking cost.
+"""
+
+from datetime import datetime, timezone
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+
+from groups.models import Group, GroupMessage
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    This command is used to measure instantiation cost of models with and without
+    change tracking, without hitting the database.
+    """
+
+    help = "Benchmark instantiation cost of models using ModelDiffMixin."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000)
+
+    def get_row(self, model, index):
+        """
+        Returns a fake database row for the model.
+        """
+        values = {
+            "id": index + 1,
+            "uuid": f"00000000-0000-0000-0000-{index:012d}",
+            "created_at": datetime.now(timezone.utc),
+            "updated_at": datetime.now(timezone.utc),
+            "date_joined": datetime.now(timezone.utc),
+            "is_active": True,
+            "group_id": 1,
+            "user_id": None,
+        }
+        return [
+            values.get(field.attname, f"{field.attname}-{index}")
+            for field in model._meta.concrete_fields
+        ]
+
+    def benchmark(self, model, rows: int) -> float:
+        """
+        Returns the time taken to instantiate `rows` instances of a model from db rows.
+        """
+        field_names = [field.attname for field in model._meta.concrete_fields]
+        row = self.get_row(model, 0)
+
+        start = perf_counter()
+        for _ in range(rows):
+            model.from_db("default", field_names, row)
+        return perf_counter() - start
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+
+        for model in (Group, GroupMessage, User):
+            track_changes = model.track_changes
+            try:
+                for tracked in (True, False):
+                    model.track_changes = tracked
+                    seconds = self.benchmark(model, rows)
+                    self.stdout.write(
+                        f"{model.__name__:<14} tracked={str(tracked):<6}"
+                        f"{seconds:>8.3f}s for {rows} rows "
+                        f"({seconds / rows * 1_000_000:.2f} us/row)"
+                    )
+            finally:
+                model.track_changes = track_changes
@@ -0,0 +1,90 @@
+"""
+This file contains custom django command to measure process startup time.
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+
+from utils.kafka_mixins import kafka_clients
+
+# run in a fresh interpreter, so that nothing is imported yet
+STARTUP_SCRIPT = """
+import json
+from time import perf_counter
+
+started_at = perf_counter()
+import django
+
+django.setup()
+setup_at = perf_counter()
+
+from django.urls import get_resolver
+
+get_resolver().url_patterns
+print(json.dumps({"django_setup": setup_at - started_at, "url_conf": perf_counter() - setup_at}))
+"""
+
+
+class Command(BaseCommand):
+    """
+    This command is used to measure how long a process (gunicorn worker, celery
+    worker, manage.py) takes to start, i.e. django setup and importing every view.
+    """
+
+    help = "Measure django startup and url conf import time, report as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument(
+            "--connect",
+            action="store_true",
+            help="Also measure creating the kafka producer, connecting to the broker(s).",
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def run_startup(self) -> dict:
+        """
+        Returns the stage timings of a fresh process starting up.
+        """
+        started_at = perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT], capture_output=True, text=True
+        )
+        total = perf_counter() - started_at
+        if result.returncode:
+            raise CommandError(f"Startup failed: {result.stderr}")
+
+        return {**json.loads(result.stdout.strip().splitlines()[-1]), "process": total}
+
+    def handle(self, *args, **options):
+        runs = [self.run_startup() for _run in range(options["runs"])]
+        report = {
+            "benchmark": "startup",
+            "runs": options["runs"],
+            "stages": {
+                stage: {
+                    "median_ms": statistics.median(run[stage] for run in runs) * 1000,
+                    "min_ms": min(run[stage] for run in runs) * 1000,
+                }
+                for stage in runs[0]
+            },
+        }
+
+        if options["connect"]:
+            started_at = perf_counter()
+            kafka_clients.get_producer().producer
+            report["stages"]["kafka_producer"] = {
+                "median_ms": (perf_counter() - started_at) * 1000
+            }
+            kafka_clients.close()
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output)
+        self.stdout.write(output)
@@ -0,0 +1,61 @@
+"""
+This file contains custom django command to report the lag of the message consumer.
+"""
+
+import json
+import os
+
+from django.core.management import BaseCommand, CommandError
+
+from utils.kafka_mixins import BaseKafkaConsumer
+
+
+class Command(BaseCommand):
+    """
+    This command is used to report the lag of the message consumer group, per partition.
+
+    The consumer does not subscribe to the topics, so it never joins the group nor
+    triggers a rebalance, it only reads the committed offsets of the group.
+    """
+
+    help = "Report the lag of the message consumer group as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--topics",
+            help="Comma separated topics, defaults to the KAFKA_TOPICS environment variable.",
+        )
+        parser.add_argument(
+            "--max-lag",
+            type=int,
+            help="Exit with an error if the total lag is above this number of records.",
+        )
+
+    def handle(self, *args, **options):
+        topics = (options["topics"] or os.environ["KAFKA_TOPICS"]).split(",")
+        consumer = BaseKafkaConsumer(topics=[])
+        try:
+            partition_lags = consumer.get_partition_lags(topics)
+        finally:
+            consumer.close_connection()
+
+        lag = {}
+        for partition, partition_lag in partition_lags.items():
+            lag.setdefault(partition.topic, {})[partition.partition] = partition_lag
+        total_lag = sum(partition_lags.values())
+
+        self.stdout.write(
+            json.dumps(
+                {
+                    "group_id": consumer.get_group_id(),
+                    "total_lag": total_lag,
+                    "lag": lag,
+                },
+                indent=2,
+            )
+        )
+
+        if options["max_lag"] is not None and total_lag > options["max_lag"]:
+            raise CommandError(
+                f"Total lag {total_lag} is above the maximum of {options['max_lag']}"
+            )
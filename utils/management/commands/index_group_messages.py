@@ -0,0 +1,29 @@
+"""
+This file contains custom django command to index existing group messages for search.
+"""
+
+from django.core.management import BaseCommand
+
+from groups.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    This command is used to index the group messages created before search was
+    enabled, or missed by the CDC stream. New messages are indexed when they are created.
+    """
+
+    help = "Index group messages which are not indexed for search yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        total = 0
+
+        while indexed := backend.backfill(batch_size=options["batch_size"]):
+            total += indexed
+            self.stdout.write(f"Indexed {total} messages")
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} messages in total"))
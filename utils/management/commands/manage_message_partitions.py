@@ -0,0 +1,73 @@
+"""
+This file contains custom django command to maintain group message partitions.
+"""
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.utils.timezone import now
+
+from groups.partitions import (
+    add_months,
+    create_partition,
+    detach_partition,
+    get_partition_name,
+    list_partitions,
+)
+
+
+class Command(BaseCommand):
+    """
+    This command is used to pre-create upcoming monthly partitions of group messages
+    and to detach (or drop) the partitions older than the retention period.
+    Meant to be run periodically, e.g. daily from cron.
+    """
+
+    help = "Create upcoming and detach expired group message partitions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.GROUP_MESSAGE_PARTITIONS_AHEAD,
+            help="Number of upcoming months to create partitions for.",
+        )
+        parser.add_argument(
+            "--retention-months",
+            type=int,
+            default=settings.GROUP_MESSAGE_RETENTION_MONTHS,
+            help="Partitions older than this many months are detached, 0 keeps all.",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop expired partitions instead of keeping them as archive tables.",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        current_month = now().date().replace(day=1)
+
+        for months in range(options["months_ahead"] + 1):
+            month = add_months(current_month, months)
+            if options["dry_run"]:
+                self.stdout.write(f"Would ensure {get_partition_name(month)}")
+            elif create_partition(month):
+                self.stdout.write(f"Created {get_partition_name(month)}")
+
+        if not options["retention_months"]:
+            return
+
+        oldest = get_partition_name(
+            add_months(current_month, -options["retention_months"])
+        )
+        for name in list_partitions():
+            # partition names sort chronologically, see get_partition_name
+            if name >= oldest:
+                continue
+
+            if options["dry_run"]:
+                self.stdout.write(f"Would detach {name}")
+                continue
+
+            detach_partition(name, drop=options["drop"])
+            self.stdout.write(f"{'Dropped' if options['drop'] else 'Detached'} {name}")
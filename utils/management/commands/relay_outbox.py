@@ -0,0 +1,113 @@
+"""
+This file contains custom django command to relay the outbox events to kafka.
+"""
+
+import logging
+from contextlib import contextmanager
+from time import sleep
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connection
+
+from utils.kafka_mixins import kafka_clients
+from utils.models import OutboxEvent
+from utils.outbox import get_message
+
+logger = logging.getLogger("default")
+
+# key of the postgres advisory lock held by the relay sending events ("outbox")
+RELAY_LOCK_KEY = 0x6F7574626F78
+
+
+@contextmanager
+def relay_lock():
+    """
+    Holds the relay advisory lock, yields whether it was acquired.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [RELAY_LOCK_KEY])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [RELAY_LOCK_KEY])
+
+
+def relay_events(batch_size: int) -> int:
+    """
+    Sends the oldest outbox events to kafka, then deletes them.
+
+    Events of a row must reach kafka in the order of the changes, consumers do not
+    compare versions, so a single relay sends events at a time: a batch is sent and
+    deleted under an advisory lock, other relays wait for the next batch. No
+    transaction is held while waiting for kafka, the events are deleted once
+    acknowledged. An error leaves them for the next attempt, so an event may be
+    sent twice but never after a later event of its row.
+    Returns the number of relayed events.
+    """
+    with relay_lock() as acquired:
+        if not acquired:
+            return 0
+
+        events = list(OutboxEvent.objects.order_by("id")[:batch_size])
+        if not events:
+            return 0
+
+        keys = {event.id: event.key for event in events}
+        kafka_clients.get_producer().send_messages_batch(
+            topic=settings.OUTBOX_TOPIC,
+            messages=[get_message(event) for event in events],
+            key_selector=lambda message: keys[message["id"]],
+        )
+        OutboxEvent.objects.filter(id__in=keys).delete()
+
+    return len(events)
+
+
+class Command(BaseCommand):
+    """
+    This command is used to relay the outbox events to kafka, see utils.outbox.
+    Several relays can run for availability, one of them sends at a time.
+    """
+
+    help = "Relay the outbox events to kafka in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.OUTBOX_RELAY_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.OUTBOX_RELAY_INTERVAL,
+            help="Seconds to wait when the outbox is empty.",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Relay the pending events and exit."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                try:
+                    relayed = relay_events(options["batch_size"])
+                except Exception as error:
+                    logger.error(f"Failed to relay outbox events: {str(error)}")
+                    if options["once"]:
+                        raise
+                    sleep(options["interval"])
+                    continue
+
+                if relayed:
+                    logger.info(f"Relayed {relayed} outbox events")
+                elif options["once"]:
+                    return
+                else:
+                    sleep(options["interval"])
+        except KeyboardInterrupt:
+            logger.info("Warmly closing outbox relay.....")
+        finally:
+            kafka_clients.close()
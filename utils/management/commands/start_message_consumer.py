@@ -1,23 +1,133 @@
 """
 This file contains custom django command to run kafka consumer for group messages.
+
+Offsets are committed by the command, never automatically: group messages are
+buffered before being dispatched, so the offsets of the consumed records are only
+committed once nothing consumed is left in the buffer. A crash leaves the buffered
+messages uncommitted, they are consumed again once the consumer restarts.
 """
 
 import logging
 import os
+import signal
+from time import monotonic
 
 import schedule
+from django.conf import settings
 from django.core.management import BaseCommand
 
-from groups.tasks import bulk_create_group_messages
-from message_sdk import capture_cdc_events
-from utils.kafka_mixins.kafka_consumer_mixin import BaseKafkaConsumer
+from groups.tasks import bulk_create_group_messages, flush_read_state
+from message_sdk import capture_cdc_events, capture_outbox_events
+from utils.batching import AdaptiveBatchController
+from utils.kafka_mixins import ConsumerLagMonitor, kafka_clients, start_health_server
+from utils.tracing import CELERY_TRACES_HEADER, extract_trace
 
 logger = logging.getLogger("default")
 
-consumer = BaseKafkaConsumer(
-    topics=os.environ["KAFKA_TOPICS"].split(","),
-    bootstrap_servers=os.environ["KAFKA_SERVERS"].split(","),
+# bounds the time between two runs of the scheduled jobs
+MAX_POLL_TIMEOUT = 0.1  # in seconds
+
+
+def get_topics() -> list[str]:
+    """
+    Returns the topics of group messages and CDC events.
+    """
+    return os.environ["KAFKA_TOPICS"].split(",")
+
+
+def get_consumer():
+    """
+    Returns the kafka consumer of group messages and CDC events.
+    """
+    return kafka_clients.get_consumer(
+        "messages", topics=get_topics(), enable_auto_commit=False
+    )
+
+
+class PendingMessages:
+    """
+    This class buffers the consumed group messages until a batch is due, that is
+    once it is full or its oldest message lingered long enough.
+    """
+
+    def __init__(self) -> None:
+        self.records = []
+        self.since = None
+        # whether records were consumed since the offsets were last committed
+        self.uncommitted = False
+
+    def add(self, records: list) -> None:
+        if not self.records:
+            self.since = monotonic()
+        self.records.extend(records)
+
+    def get_poll_timeout(self, linger: float) -> float:
+        """
+        Returns how long the next poll may wait for messages, in seconds.
+        """
+        if not self.records:
+            return MAX_POLL_TIMEOUT
+        return max(0, min(MAX_POLL_TIMEOUT, self.since + linger - monotonic()))
+
+    def is_due(self, batch_size: int, linger: float) -> bool:
+        return bool(self.records) and (
+            len(self.records) >= batch_size or monotonic() - self.since >= linger
+        )
+
+    def flush(self, batch_size: int) -> None:
+        """
+        Dispatches the buffered messages to celery, in batches of `batch_size`.
+        """
+        records, self.records, self.since = self.records, [], None
+        for index in range(0, len(records), batch_size):
+            dispatch_group_messages(records[index : index + batch_size])
+
+    def commit(self) -> None:
+        """
+        Commits the offsets of the consumed records, once all of them are dispatched.
+        """
+        if self.uncommitted and not self.records:
+            get_consumer().commit()
+            self.uncommitted = False
+
+
+pending_messages = PendingMessages()
+batch_controller = AdaptiveBatchController(
+    target_latency=settings.CONSUMER_WRITE_LATENCY_TARGET,
+    min_batch_size=settings.CONSUMER_BATCH_SIZE_MIN,
+    max_batch_size=settings.CONSUMER_BATCH_SIZE_MAX,
+    min_linger=settings.CONSUMER_LINGER_MIN,
+    max_linger=settings.CONSUMER_LINGER_MAX,
+    adjust_interval=settings.CONSUMER_BATCH_ADJUST_INTERVAL,
+    batch_size=settings.CONSUMER_BATCH_SIZE,
 )
+lag_monitor = ConsumerLagMonitor(
+    get_consumer(), topics=get_topics(), interval=settings.CONSUMER_LAG_INTERVAL
+)
+
+
+def dispatch_group_messages(records: list) -> None:
+    """
+    This method is used to send a batch of group messages to be written by celery.
+    """
+
+    traces = [extract_trace(record.headers) for record in records]
+    bulk_create_group_messages.apply_async(
+        args=([record.value for record in records],),
+        headers=(
+            {CELERY_TRACES_HEADER: traces}
+            if any(trace is not None for trace in traces)
+            else None
+        ),
+    )
+
+
+def get_lag() -> int | None:
+    """
+    Returns the number of group messages consumed or waiting in kafka, not dispatched.
+    """
+    lag = get_consumer().get_lag(topics=[settings.MESSAGE_CONSUMER_TOPIC])
+    return None if lag is None else lag + len(pending_messages.records)
 
 
 def poll_server():
@@ -25,32 +135,74 @@ def poll_server():
     This method is used to poll kafka server.
     """
 
-    messages = consumer.consume_messages()
+    batch_controller.maybe_adjust(get_lag)
+    batch_size, linger = batch_controller.batch_size, batch_controller.linger
+
+    messages = get_consumer().consume_messages(
+        timeout_ms=int(pending_messages.get_poll_timeout(linger) * 1000),
+        max_records=max(1, batch_size - len(pending_messages.records)),
+    )
 
     for topic_partition, records in messages.items():
         topic = topic_partition.topic
+        lag_monitor.record_consumed(topic, len(records))
 
+        pending_messages.uncommitted = True
         if topic.startswith("cdc"):
             capture_cdc_events.delay([record.value for record in records])
             continue
 
-        if topic != "message-app":
+        if topic == settings.OUTBOX_TOPIC:
+            capture_outbox_events.delay([record.value for record in records])
+            continue
+
+        if topic != settings.MESSAGE_CONSUMER_TOPIC:
             raise Exception(f"Unknown topic {topic}")
 
-        bulk_create_group_messages.delay([record.value for record in records])
+        pending_messages.add(records)
+
+    if pending_messages.is_due(batch_size, linger):
+        pending_messages.flush(batch_size)
+    pending_messages.commit()
+
+
+class Shutdown:
+    """
+    This class records the termination signal, the polling loop stops between two
+    polls so a batch is never left half dispatched.
+    """
+
+    requested = False
+
+    @classmethod
+    def request(cls, signum, frame) -> None:
+        cls.requested = True
 
 
 def schedule_polling():
     """
     This method is used to continuously poll kafka server for messages.
     """
+    signal.signal(signal.SIGINT, Shutdown.request)
+    signal.signal(signal.SIGTERM, Shutdown.request)
     try:
-        schedule.every(0.25).seconds.do(poll_server)
-        while True:
+        schedule.every(settings.READ_STATE_FLUSH_INTERVAL).seconds.do(
+            flush_read_state.delay
+        )
+        # kafka clients are not thread safe, lags are computed by the polling thread
+        schedule.every(settings.CONSUMER_LAG_INTERVAL).seconds.do(lag_monitor.update)
+        if settings.CONSUMER_HEALTH_PORT:
+            start_health_server(lag_monitor, port=settings.CONSUMER_HEALTH_PORT)
+        while not Shutdown.requested:
+            poll_server()
             schedule.run_pending()
-    except KeyboardInterrupt:
+
         logger.info("Warmly closing consumer.....")
-        consumer.close_connection()
+        pending_messages.flush(batch_controller.batch_size)
+        pending_messages.commit()
+    finally:
+        # on errors the offsets are left uncommitted, the records are consumed again
+        kafka_clients.close()
 
 
 class Command(BaseCommand):
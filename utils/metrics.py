@@ -0,0 +1,215 @@
+"""
+This file contains a lightweight, process local metrics registry.
+
+Metrics are aggregated in memory and periodically flushed to a redis hash so that
+every worker process (gunicorn, celery, kafka consumer) contributes to a single
+set of counters which can be rendered in prometheus text format. Flushes happen
+in a background thread, recording a metric never waits on redis.
+"""
+
+import atexit
+import logging
+import os
+import random
+import threading
+from collections import defaultdict
+from time import sleep
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger("default")
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+DEFAULT_SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _format_metric(name: str, labels: Dict[str, str]) -> str:
+    """
+    Returns the prometheus representation of a metric name and its labels.
+    """
+    if not labels:
+        return name
+
+    formatted_labels = ",".join(
+        f'{label}="{value}"' for label, value in sorted(labels.items())
+    )
+    return f"{name}{{{formatted_labels}}}"
+
+
+class MetricsRegistry:
+    """
+    This class is used to record counters, gauges and histograms for the project.
+
+    Counters and histograms are accumulated as deltas and added to redis on flush,
+    gauges are overwritten on flush.
+    """
+
+    counters_key = "METRICS:COUNTERS"
+    gauges_key = "METRICS:GAUGES"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._start_lock = threading.Lock()
+        self._started = False
+        # threads do not survive a fork, forked workers start their own
+        os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.flush)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started = False
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Returns whether metrics collection is enabled.
+        """
+        return getattr(settings, "METRICS_ENABLED", True)
+
+    @staticmethod
+    def should_sample(rate: float) -> bool:
+        """
+        Returns True for roughly `rate` fraction of the calls.
+        """
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        """
+        Increment a counter by the given value.
+        """
+        if not self.enabled:
+            return
+
+        metric = _format_metric(name, labels)
+        with self._lock:
+            self._counters[metric] += value
+        self.start()
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """
+        Set a gauge to the given value.
+        """
+        if not self.enabled:
+            return
+
+        metric = _format_metric(name, labels)
+        with self._lock:
+            self._gauges[metric] = value
+        self.start()
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS,
+        **labels,
+    ) -> None:
+        """
+        Record an observation in a cumulative histogram.
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            for bucket in buckets:
+                if value <= bucket:
+                    self._counters[
+                        _format_metric(f"{name}_bucket", {**labels, "le": bucket})
+                    ] += 1
+            self._counters[
+                _format_metric(f"{name}_bucket", {**labels, "le": "+Inf"})
+            ] += 1
+            self._counters[_format_metric(f"{name}_sum", labels)] += value
+            self._counters[_format_metric(f"{name}_count", labels)] += 1
+        self.start()
+
+    def start(self) -> None:
+        """
+        Starts the thread flushing the recorded metrics every METRICS_FLUSH_INTERVAL
+        seconds, once per process.
+        """
+        if self._started:
+            return
+
+        with self._start_lock:
+            if self._started:
+                return
+
+            threading.Thread(
+                target=self._flush_forever, name="metrics-flush", daemon=True
+            ).start()
+            self._started = True
+
+    def _flush_forever(self) -> None:
+        while True:
+            sleep(getattr(settings, "METRICS_FLUSH_INTERVAL", 10))
+            try:
+                self.flush()
+            except Exception as error:
+                logger.warning(f"Failed to flush metrics: {str(error)}")
+
+    def flush(self) -> None:
+        """
+        Push all the recorded metrics to redis.
+        """
+        with self._lock:
+            counters, self._counters = self._counters, defaultdict(float)
+            gauges, self._gauges = self._gauges, {}
+
+        if not counters and not gauges:
+            return
+
+        # importing here since redis connection should only be resolved once django is ready
+        from utils.redis import get_redis_client, make_cache_key
+
+        try:
+            pipeline = get_redis_client().pipeline(transaction=False)
+            for metric, value in counters.items():
+                pipeline.hincrbyfloat(make_cache_key(self.counters_key), metric, value)
+            if gauges:
+                pipeline.hset(make_cache_key(self.gauges_key), mapping=gauges)
+            pipeline.execute()
+        except Exception as error:
+            logger.warning(f"Failed to flush metrics: {str(error)}")
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Returns all the metrics aggregated across processes.
+        """
+        from utils.redis import get_redis_client, make_cache_key
+
+        self.flush()
+        client = get_redis_client()
+        metrics = {}
+        for key in (self.counters_key, self.gauges_key):
+            for metric, value in client.hgetall(make_cache_key(key)).items():
+                metrics[metric.decode("utf-8")] = float(value)
+        return metrics
+
+    def render_prometheus(self, metrics: Optional[Dict[str, float]] = None) -> str:
+        """
+        Returns the metrics in prometheus text exposition format.
+        """
+        metrics = self.snapshot() if metrics is None else metrics
+        return "".join(
+            f"{metric} {value:g}\n" for metric, value in sorted(metrics.items())
+        )
+
+
+metrics = MetricsRegistry()
@@ -2,6 +2,9 @@
 This module contains the base models for the project.
 """
 
+import inspect
+from typing import Iterable
+
 from django.conf import settings
 from django.db import models
 from django.db.models import Manager
@@ -45,16 +48,71 @@ class BaseModel(ModelDiffMixin, models.Model):
 
         abstract = True
 
+    def __init_subclass__(cls, **kwargs):
+        """
+        Collect the validators of the model once, at class creation.
+        Methods starting with validate_ are run on every save and classmethods
+        starting with bulk_validate_ are run with all the instances on bulk creation.
+        """
+        super().__init_subclass__(**kwargs)
+
+        validators, bulk_validators = [], []
+        for name in dir(cls):
+            if name.startswith("validate_"):
+                validators.append(name)
+            elif name.startswith("bulk_validate_"):
+                bulk_validators.append(name)
+
+        # attributes are looked up statically, so properties are never evaluated here
+        cls._validators = tuple(
+            name for name in validators if callable(inspect.getattr_static(cls, name))
+        )
+        cls._bulk_validators = tuple(
+            name
+            for name in bulk_validators
+            if isinstance(inspect.getattr_static(cls, name), classmethod)
+        )
+
+    @classmethod
+    def run_bulk_validators(cls, instances: Iterable[models.Model]) -> None:
+        """
+        Run all the bulk_validate_ classmethods of the model on the instances.
+        Meant to be called before bulk_create, which does not call save.
+        """
+        for name in cls._bulk_validators:
+            getattr(cls, name)(instances)
+
     def save(self, *args, **kwargs):
         """
         Override django model save method to call all methods
         starting with validate_ in the model.
         """
 
-        [
-            getattr(self, method)()
-            for method in dir(self)
-            if method.startswith("validate_") and callable(getattr(self, method))
-        ]
+        for name in self._validators:
+            getattr(self, name)()
 
         super().save(*args, **kwargs)
+
+
+class OutboxEvent(models.Model):
+    """
+    This model stores the changes of rows written by the services, in the same
+    transaction as the change itself, until they are relayed to kafka (see utils.outbox).
+    """
+
+    OPERATIONS = (("create", "create"), ("update", "update"), ("delete", "delete"))
+
+    table = models.CharField(max_length=64)
+    operation = models.CharField(max_length=6, choices=OPERATIONS)
+    # kafka key of the event, the events of a row are relayed to the same partition
+    key = models.CharField(max_length=128)
+    before = models.JSONField(null=True)
+    after = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        """
+        Used to define meta information for the model.
+        """
+
+        ordering = ["id"]
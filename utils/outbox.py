@@ -0,0 +1,115 @@
+"""
+This file contains the transactional outbox of row changes.
+
+When OUTBOX_ENABLED, services write an outbox event in the same transaction as the
+change of a row, so an event exists if and only if the change was committed. The
+`relay_outbox` command sends the events to kafka in batches and deletes them, and the
+message consumer hands them to the `MessageConsumer` subscribers, same as the CDC
+events published by debezium.
+
+Events only carry the table, the operation and the rows as plain JSON values, without
+the schema and envelope of debezium events.
+"""
+
+import logging
+from datetime import date, datetime, time
+from typing import Any, Optional
+
+from django.conf import settings
+from django.db.models import Model
+
+from utils.models import OutboxEvent
+
+logger = logging.getLogger("default")
+
+
+def serialize_value(value: Any) -> Any:
+    """
+    Returns the JSON value of a field value, parsed back by `Field.to_python`.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    # files are stored by name, uuids and decimals by their string
+    return getattr(value, "name", None) or str(value)
+
+
+def get_row(instance: Model) -> dict:
+    """
+    Returns the current values of the concrete fields of an instance, by column.
+    """
+    return {
+        field.attname: serialize_value(getattr(instance, field.attname))
+        for field in instance._meta.concrete_fields
+    }
+
+
+def get_initial_row(instance: Model) -> Optional[dict]:
+    """
+    Returns the values of an instance as loaded from the database, that is the row
+    before the changes not saved yet. Must be called before saving the instance.
+    Returns None when the outbox is disabled.
+    """
+    if not settings.OUTBOX_ENABLED:
+        return None
+
+    row = get_row(instance)
+    for name, initial, _current in instance._iter_changes():
+        row[instance._meta.get_field(name).attname] = serialize_value(initial)
+    return row
+
+
+def record_change(
+    instance: Model, operation: str, before: Optional[dict] = None
+) -> Optional[OutboxEvent]:
+    """
+    Writes the outbox event of a saved change of an instance.
+    Meant to be called in the transaction of the change.
+    """
+    if not settings.OUTBOX_ENABLED:
+        return None
+
+    return OutboxEvent.objects.create(
+        table=instance._meta.db_table,
+        operation=operation,
+        key=f"{instance._meta.db_table}:{instance.pk}",
+        before=before,
+        after=get_row(instance) if operation != "delete" else None,
+    )
+
+
+def record_changes(
+    instances: list[Model], operation: str, befores: Optional[list[dict]] = None
+) -> list[OutboxEvent]:
+    """
+    Writes the outbox events of changes saved in bulk (e.g. by `QuerySet.update`),
+    `befores` are the rows of the instances before the changes, by position.
+    """
+    if not settings.OUTBOX_ENABLED or not instances:
+        return []
+
+    befores = befores or [None] * len(instances)
+    return OutboxEvent.objects.bulk_create(
+        OutboxEvent(
+            table=instance._meta.db_table,
+            operation=operation,
+            key=f"{instance._meta.db_table}:{instance.pk}",
+            before=before,
+            after=get_row(instance) if operation != "delete" else None,
+        )
+        for instance, before in zip(instances, befores)
+    )
+
+
+def get_message(event: OutboxEvent) -> dict:
+    """
+    Returns the kafka message of an outbox event.
+    """
+    return {
+        "id": event.id,
+        "table": event.table,
+        "operation": event.operation,
+        "before": event.before,
+        "after": event.after,
+    }
@@ -0,0 +1,19 @@
+"""
+This module contains all the permission classes for the project.
+"""
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import BasePermission
+
+
+class HasMetricsToken(BasePermission):
+    """
+    Allows access only to requests carrying the configured metrics token
+    in the `X-Metrics-Token` header.
+    """
+
+    def has_permission(self, request, view):
+        return bool(settings.METRICS_TOKEN) and constant_time_compare(
+            request.headers.get("X-Metrics-Token", ""), settings.METRICS_TOKEN
+        )
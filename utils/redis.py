@@ -2,14 +2,22 @@
 This file contains basic redis caching implementation over a pythonic class.
 """
 
+import asyncio
+import weakref
+from contextlib import contextmanager
+from time import perf_counter
 from typing import Any, Dict, Optional
 
+import redis.asyncio
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from django.db.models import Model
+from django_redis import get_redis_connection
 
 from groups.models import Group, GroupMember
+from utils.metrics import DEFAULT_SIZE_BUCKETS, metrics
 
 User = get_user_model()
 
@@ -22,11 +30,150 @@ def custom_redis_key_function(key, prefix, _version):
     the `key_prefix`. KEY_FUNCTION can be used to specify an alternate
     function with custom key making behavior.
 
-    Removing the versioning for now
+    Django's cache versioning is not used, since model entries are versioned
+    through their row version instead (see `RedisCacheMixin.set_versioned_cache`).
     """
     return f"{prefix}:{key}"
 
 
+def make_cache_key(key: str) -> str:
+    """
+    Returns the full redis key (including the cache key prefix) for the given key.
+    """
+    return cache.make_key(key)
+
+
+def get_redis_client():
+    """
+    Returns the raw redis client backing the default cache.
+    """
+    return get_redis_connection("default")
+
+
+def get_async_redis_client():
+    """
+    Returns a new asyncio redis client connected to the default cache's server.
+    Meant to be created once per event loop and reused.
+    """
+    if settings.REDIS_BACKEND == "fake":
+        from fakeredis import FakeAsyncRedis
+
+        return FakeAsyncRedis.from_url(settings.CACHES["default"]["LOCATION"])
+
+    return redis.asyncio.from_url(settings.CACHES["default"]["LOCATION"])
+
+
+_loop_clients = weakref.WeakKeyDictionary()
+
+
+def get_loop_redis_client():
+    """
+    Returns the asyncio redis client shared by everything running in the current
+    event loop, created on first use.
+    """
+    loop = asyncio.get_running_loop()
+    if (client := _loop_clients.get(loop)) is None:
+        client = _loop_clients[loop] = get_async_redis_client()
+    return client
+
+
+_registered_scripts = {}
+_registered_async_scripts = weakref.WeakKeyDictionary()
+
+
+def get_redis_script(script: str):
+    """
+    Returns a registered lua script for the given script source.
+    Scripts are registered only once per process and are executed using EVALSHA.
+    """
+    if script not in _registered_scripts:
+        _registered_scripts[script] = get_redis_client().register_script(script)
+    return _registered_scripts[script]
+
+
+def get_async_redis_script(script: str):
+    """
+    Returns a registered lua script for the given script source, bound to the asyncio
+    redis client of the current event loop (see `get_loop_redis_client`).
+    """
+    scripts = _registered_async_scripts.setdefault(asyncio.get_running_loop(), {})
+    if script not in scripts:
+        scripts[script] = get_loop_redis_client().register_script(script)
+    return scripts[script]
+
+
+# The version key holds the version of the cached value, or of the deletion followed
+# by ":deleted" for a tombstone. The two keys can be evicted separately, a value
+# missing behind a live version is written again at the same version.
+
+# KEYS[1]: value key, KEYS[2]: version key
+# ARGV[1]: encoded value, ARGV[2]: version, ARGV[3]: timeout in ms (0 for no expiry)
+VERSIONED_SET_SCRIPT = """
+local current = redis.call('GET', KEYS[2])
+if current then
+    local tombstone = string.find(current, ':deleted', 1, true)
+    local current_version = tonumber(
+        tombstone and string.sub(current, 1, tombstone - 1) or current
+    )
+    local version = tonumber(ARGV[2])
+    if current_version > version then
+        return 0
+    end
+    if current_version == version
+        and (tombstone or redis.call('EXISTS', KEYS[1]) == 1) then
+        return 0
+    end
+end
+if tonumber(ARGV[3]) > 0 then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[3])
+    redis.call('SET', KEYS[2], ARGV[2], 'PX', ARGV[3])
+else
+    redis.call('SET', KEYS[1], ARGV[1])
+    redis.call('SET', KEYS[2], ARGV[2])
+end
+return 1
+"""
+
+# KEYS[1]: value key, KEYS[2]: version key
+# ARGV[1]: version, ARGV[2]: timeout in ms (0 for no expiry)
+VERSIONED_DELETE_SCRIPT = """
+local current = redis.call('GET', KEYS[2])
+if current then
+    local tombstone = string.find(current, ':deleted', 1, true)
+    local current_version = tonumber(
+        tombstone and string.sub(current, 1, tombstone - 1) or current
+    )
+    if current_version > tonumber(ARGV[1]) then
+        return 0
+    end
+end
+redis.call('DEL', KEYS[1])
+if tonumber(ARGV[2]) > 0 then
+    redis.call('SET', KEYS[2], ARGV[1] .. ':deleted', 'PX', ARGV[2])
+else
+    redis.call('SET', KEYS[2], ARGV[1] .. ':deleted')
+end
+return 1
+"""
+
+
+def get_instance_version(instance: Model) -> int:
+    """
+    Returns a monotonic version for a model instance, derived from its `updated_at`
+    field in microseconds since epoch.
+    """
+    return int(instance.updated_at.timestamp() * 1_000_000)
+
+
+def get_payload_size(value: Any) -> int:
+    """
+    Returns the number of bytes a value takes in redis once serialized by the django
+    cache client, which stores integers as their decimal string without pickling.
+    """
+    data = cache.client.encode(value)
+    return len(data) if isinstance(data, (bytes, bytearray)) else len(str(data))
+
+
 class RedisCacheMixin:
     """
     This class is a basic abstraction over django's inbuild caching system.
@@ -59,6 +206,51 @@ class RedisCacheMixin:
         """
         return "".join([self.cache_key_prefix[model], ":", key_name])
 
+    def get_metrics_prefix(self, model: Optional[Model] = None) -> str:
+        """
+        Returns the label used to group cache metrics for the given model.
+        """
+        return self.cache_key_prefix[model] if model else "RAW"
+
+    @contextmanager
+    def record_cache_operation(self, operation: str, model: Optional[Model] = None):
+        """
+        Context manager used to record latency of a cache operation.
+
+        Latency is only recorded for a sampled fraction of the operations
+        (CACHE_METRICS_SAMPLE_RATE), which keeps the overhead negligible in production.
+        The yielded dictionary can be used to attach the payload of the operation, which
+        is then used to record its serialized size: "encoded" for the bytes sent to or
+        read from redis, "payloads" for values serialized by the django cache client.
+        """
+        if not metrics.enabled or not metrics.should_sample(
+            settings.CACHE_METRICS_SAMPLE_RATE
+        ):
+            yield {}
+            return
+
+        prefix = self.get_metrics_prefix(model)
+        sample = {}
+        start = perf_counter()
+        yield sample
+        metrics.observe(
+            "cache_latency_seconds",
+            perf_counter() - start,
+            prefix=prefix,
+            operation=operation,
+        )
+
+        sizes = [len(data) for data in sample.get("encoded", ())]
+        sizes.extend(get_payload_size(value) for value in sample.get("payloads", ()))
+        for size in sizes:
+            metrics.observe(
+                "cache_payload_bytes",
+                size,
+                buckets=DEFAULT_SIZE_BUCKETS,
+                prefix=prefix,
+                operation=operation,
+            )
+
     def set_cache(
         self,
         key_name: str,
@@ -75,11 +267,177 @@ class RedisCacheMixin:
             timeout: The timeout for the cached value. Defaults to django's default cache timeout.
 
         """
-        cache.set(
-            self.get_model_cache_key(key_name, model) if model else key_name,
-            value,
-            timeout=timeout,
+        with self.record_cache_operation("set", model) as sample:
+            cache.set(
+                self.get_model_cache_key(key_name, model) if model else key_name,
+                value,
+                timeout=timeout,
+            )
+            sample["payloads"] = (value,)
+
+        metrics.increment("cache_sets_total", prefix=self.get_metrics_prefix(model))
+
+    def get_versioned_cache_keys(
+        self, key_name: str, model: Optional[Model] = None
+    ) -> tuple[str, str]:
+        """
+        Returns the redis keys used to store the value and the version of a versioned entry.
+        """
+        key = make_cache_key(
+            self.get_model_cache_key(key_name, model) if model else key_name
+        )
+        return key, f"{key}:VER"
+
+    def set_versioned_cache(
+        self,
+        key_name: str,
+        value: Model,
+        timeout: int = DEFAULT_TIMEOUT,
+        model: Optional[Model] = None,
+        version: Optional[int] = None,
+    ) -> bool:
+        """
+        Set a model instance in the cache only if its version is newer than the cached one.
+
+        The compare and set is done atomically on redis, so concurrent or out of order
+        writers (APIs, CDC subscribers) can never regress the cached state.
+
+        Args:
+            key_name: The name of the key to store the value under.
+            value: The model instance to cache.
+            timeout: The timeout for the cached value. Defaults to VERSIONED_CACHE_TIMEOUT.
+            version: The row version of the instance. Defaults to the instance's `updated_at`.
+
+        Returns:
+            bool: True if the value was written, False if a newer version was already cached.
+        """
+        timeout = (
+            settings.VERSIONED_CACHE_TIMEOUT if timeout is DEFAULT_TIMEOUT else timeout
+        )
+        version = get_instance_version(value) if version is None else version
+
+        with self.record_cache_operation("set", model) as sample:
+            data = cache.client.encode(value)
+            written = get_redis_script(VERSIONED_SET_SCRIPT)(
+                keys=self.get_versioned_cache_keys(key_name, model),
+                args=[data, version, int(timeout * 1000) if timeout else 0],
+            )
+            sample["encoded"] = (data,)
+
+        metrics.increment(
+            "cache_sets_total" if written else "cache_stale_writes_total",
+            prefix=self.get_metrics_prefix(model),
+        )
+        return bool(written)
+
+    async def aset_versioned_cache(
+        self,
+        key_name: str,
+        value: Model,
+        timeout: int = DEFAULT_TIMEOUT,
+        model: Optional[Model] = None,
+        version: Optional[int] = None,
+    ) -> bool:
+        """
+        Asyncio version of `set_versioned_cache`, using the event loop's redis client.
+        """
+        timeout = (
+            settings.VERSIONED_CACHE_TIMEOUT if timeout is DEFAULT_TIMEOUT else timeout
+        )
+        version = get_instance_version(value) if version is None else version
+
+        with self.record_cache_operation("set", model) as sample:
+            data = cache.client.encode(value)
+            written = await get_async_redis_script(VERSIONED_SET_SCRIPT)(
+                keys=self.get_versioned_cache_keys(key_name, model),
+                args=[data, version, int(timeout * 1000) if timeout else 0],
+            )
+            sample["encoded"] = (data,)
+
+        metrics.increment(
+            "cache_sets_total" if written else "cache_stale_writes_total",
+            prefix=self.get_metrics_prefix(model),
+        )
+        return bool(written)
+
+    def bulk_set_versioned_cache(
+        self,
+        data: Dict[str, Model],
+        timeout: int = DEFAULT_TIMEOUT,
+        model: Optional[Model] = None,
+    ) -> int:
+        """
+        Set multiple model instances in the cache in a single round trip, each only
+        if its version is newer than the cached one (see `set_versioned_cache`).
+
+        Args:
+            data: A dictionary containing the key name and model instance pairs to cache.
+            timeout: The timeout for the cached values. Defaults to VERSIONED_CACHE_TIMEOUT.
+
+        Returns:
+            int: The number of values written.
+        """
+        if not data:
+            return 0
+
+        timeout = (
+            settings.VERSIONED_CACHE_TIMEOUT if timeout is DEFAULT_TIMEOUT else timeout
+        )
+        script = get_redis_script(VERSIONED_SET_SCRIPT)
+
+        with self.record_cache_operation("bulk_set", model) as sample:
+            pipeline = get_redis_client().pipeline(transaction=False)
+            encoded = []
+            for key_name, value in data.items():
+                encoded.append(cache.client.encode(value))
+                script(
+                    keys=self.get_versioned_cache_keys(key_name, model),
+                    args=[
+                        encoded[-1],
+                        get_instance_version(value),
+                        int(timeout * 1000) if timeout else 0,
+                    ],
+                    client=pipeline,
+                )
+            written = sum(pipeline.execute())
+            sample["encoded"] = encoded
+
+        prefix = self.get_metrics_prefix(model)
+        metrics.increment("cache_sets_total", written, prefix=prefix)
+        metrics.increment(
+            "cache_stale_writes_total", len(data) - written, prefix=prefix
+        )
+        return written
+
+    def delete_versioned_cache(
+        self,
+        key_name: str,
+        value: Model,
+        model: Optional[Model] = None,
+        version: Optional[int] = None,
+    ) -> bool:
+        """
+        Delete a cached model instance unless a newer version is already cached.
+
+        The version is retained as a tombstone, so that an older writer cannot
+        re-populate the deleted entry.
+
+        Returns:
+            bool: True if the value was deleted, False if a newer version was already cached.
+        """
+        version = get_instance_version(value) if version is None else version
+        timeout = settings.VERSIONED_CACHE_TIMEOUT
+
+        deleted = get_redis_script(VERSIONED_DELETE_SCRIPT)(
+            keys=self.get_versioned_cache_keys(key_name, model),
+            args=[version, int(timeout * 1000) if timeout else 0],
+        )
+
+        metrics.increment(
+            "cache_deletes_total" if deleted else "cache_stale_writes_total",
+            prefix=self.get_metrics_prefix(model),
         )
+        return bool(deleted)
 
     def bulk_set_cache(
         self,
@@ -94,16 +452,22 @@ class RedisCacheMixin:
             data: A dictionary containing the key name and value pairs to cache.
             timeout: The timeout for the cached values. Defaults to django's default cache timeout.
         """
-        cache.set_many(
-            (
-                {
-                    self.get_model_cache_key(key, model): value
-                    for key, value in data.items()
-                }
-                if model
-                else data
-            ),
-            timeout,
+        with self.record_cache_operation("bulk_set", model) as sample:
+            cache.set_many(
+                (
+                    {
+                        self.get_model_cache_key(key, model): value
+                        for key, value in data.items()
+                    }
+                    if model
+                    else data
+                ),
+                timeout,
+            )
+            sample["payloads"] = data.values()
+
+        metrics.increment(
+            "cache_sets_total", len(data), prefix=self.get_metrics_prefix(model)
         )
 
     def get_cache(self, key_name: str, model: Optional[Model] = None) -> Any:
@@ -117,9 +481,39 @@ class RedisCacheMixin:
             The cached value associated with the given key name, or None if the key does not exist in the cache.
         """
 
-        return cache.get(
-            self.get_model_cache_key(key_name, model) if model else key_name
+        with self.record_cache_operation("get", model) as sample:
+            value = cache.get(
+                self.get_model_cache_key(key_name, model) if model else key_name
+            )
+            if value is not None:
+                sample["payloads"] = (value,)
+
+        metrics.increment(
+            "cache_hits_total" if value is not None else "cache_misses_total",
+            prefix=self.get_metrics_prefix(model),
+        )
+        return value
+
+    async def aget_cache(self, key_name: str, model: Optional[Model] = None) -> Any:
+        """
+        Asyncio version of `get_cache`, using the event loop's redis client.
+        """
+
+        with self.record_cache_operation("get", model) as sample:
+            value = await get_loop_redis_client().get(
+                make_cache_key(
+                    self.get_model_cache_key(key_name, model) if model else key_name
+                )
+            )
+            if value is not None:
+                sample["encoded"] = (value,)
+                value = cache.client.decode(value)
+
+        metrics.increment(
+            "cache_hits_total" if value is not None else "cache_misses_total",
+            prefix=self.get_metrics_prefix(model),
         )
+        return value
 
     def bulk_get_cache(
         self, keys: list[str], model: Optional[Model] = None
@@ -135,9 +529,18 @@ class RedisCacheMixin:
             If a key does not exist in the cache, it will not be included in the returned dictionary.
         """
 
-        return cache.get_many(
-            [self.get_model_cache_key(key, model) for key in keys] if model else keys
-        )
+        with self.record_cache_operation("bulk_get", model) as sample:
+            values = cache.get_many(
+                [self.get_model_cache_key(key, model) for key in keys]
+                if model
+                else keys
+            )
+            sample["payloads"] = values.values()
+
+        prefix = self.get_metrics_prefix(model)
+        metrics.increment("cache_hits_total", len(values), prefix=prefix)
+        metrics.increment("cache_misses_total", len(keys) - len(values), prefix=prefix)
+        return values
 
     def delete_cache(self, key_name: str, model: Optional[Model] = None) -> None:
         """
@@ -148,3 +551,4 @@ class RedisCacheMixin:
         """
 
         cache.delete(self.get_model_cache_key(key_name, model) if model else key_name)
+        metrics.increment("cache_deletes_total", prefix=self.get_metrics_prefix(model))
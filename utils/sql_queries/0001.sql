@@ -0,0 +1,19 @@
+BEGIN;
+
+--
+-- Create model OutboxEvent
+--
+CREATE TABLE
+    "utils_outboxevent" (
+        "id" bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+        "table" varchar(64) NOT NULL,
+        "operation" varchar(6) NOT NULL,
+        "key" varchar(128) NOT NULL,
+        "before" jsonb NULL,
+        "after" jsonb NULL,
+        "created_at" timestamp
+        with
+            time zone NOT NULL
+    );
+
+COMMIT;
\ No newline at end of file
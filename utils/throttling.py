@@ -0,0 +1,300 @@
+"""
+This file contains the token bucket throttles of the project.
+
+Buckets live in redis and are updated by a lua script, so every process shares the
+same budget. A rate of "120/min" is a bucket of 120 tokens refilled at 2 tokens per
+second, allowing bursts up to the full bucket.
+
+While a bucket is at least half full, the script leases several tokens at once and
+the process spends them locally, so callers well under their limit skip the redis
+round-trip on most requests. Leased tokens are already taken from the bucket, the
+limit can never be exceeded. A lease lasts about as long as the bucket takes to
+refill it, the tokens left when it expires are given back to the bucket by the next
+call of the process for that bucket, so a caller spread over several processes does
+not lose its burst to idle leases.
+"""
+
+import logging
+import math
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+from django.conf import settings
+from redis.exceptions import RedisError
+from rest_framework.throttling import SimpleRateThrottle
+
+from utils.metrics import metrics
+from utils.redis import get_async_redis_script, get_redis_script, make_cache_key
+
+logger = logging.getLogger("default")
+
+# KEYS[1]: bucket key
+# ARGV[1]: capacity, ARGV[2]: refill rate in tokens per second, ARGV[3]: lease size,
+# ARGV[4]: unspent tokens of an expired lease given back to the bucket
+# Returns {tokens granted, milliseconds until a token is available}
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local lease = tonumber(ARGV[3])
+local refund = tonumber(ARGV[4])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(
+    capacity, tokens + refund + math.max(0, now - updated_at) * rate / 1000
+)
+
+local granted = 0
+local retry_after = 0
+-- close to the limit every token is taken on its own, so none is held by a lease
+if lease > 1 and tokens >= math.max(2 * lease, capacity / 2) then
+    granted = lease
+elseif tokens >= 1 then
+    granted = 1
+else
+    retry_after = math.ceil((1 - tokens) * 1000 / rate)
+end
+
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', now)
+-- an untouched bucket is full again after this long
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) * 1000 / rate) + 1000)
+return {granted, retry_after}
+"""
+
+
+class TokenLeases:
+    """
+    Bounded, in-process LRU store of the tokens leased from the redis buckets.
+    """
+
+    def __init__(self, max_size: int, timeout: float) -> None:
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> bool:
+        """
+        Spends a leased token of the bucket, returns False if none is left.
+        An expired lease is kept until it is released, see `release`.
+        """
+        with self._lock:
+            if not (entry := self._entries.get(key)):
+                return False
+
+            remaining, expires_at = entry
+            if expires_at <= monotonic():
+                return False
+
+            if remaining <= 1:
+                del self._entries[key]
+            else:
+                self._entries[key] = (remaining - 1, expires_at)
+            return True
+
+    def release(self, key: str) -> int:
+        """
+        Drops the lease of the bucket, returns its unspent tokens.
+        """
+        with self._lock:
+            remaining, _expires_at = self._entries.pop(key, (0, None))
+            return remaining
+
+    def add(self, key: str, tokens: int, timeout: float) -> None:
+        """
+        Stores tokens leased from the bucket for `timeout` seconds (at most the
+        lease timeout), replacing any previous lease.
+        """
+        if tokens <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (
+                tokens,
+                monotonic() + min(timeout, self.timeout),
+            )
+            self._entries.move_to_end(key)
+            # evicted leases are not given back, their tokens return with the refill
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+leases = TokenLeases(
+    max_size=settings.THROTTLE_LEASE_CACHE_SIZE,
+    timeout=settings.THROTTLE_LEASE_TIMEOUT,
+)
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    This class throttles requests with a redis token bucket per cache key.
+    Requests are allowed when redis is unavailable.
+    """
+
+    cache_format = "THROTTLE:%(scope)s:%(ident)s"
+
+    def __init__(self):
+        super().__init__()
+        self.retry_after = None
+
+    @property
+    def refill_rate(self) -> float:
+        """
+        Returns the number of tokens added to the bucket per second.
+        """
+        return self.num_requests / self.duration
+
+    def get_lease_size(self) -> int:
+        """
+        Returns the number of tokens leased at once, at most a tenth of the bucket.
+        """
+        return max(1, min(settings.THROTTLE_LEASE_SIZE, self.num_requests // 10))
+
+    def get_rate(self):
+        rate = super().get_rate()
+        return None if rate and rate.lower() == "off" else rate
+
+    def get_script_args(self) -> list:
+        return [
+            self.num_requests,
+            self.refill_rate,
+            self.get_lease_size(),
+            leases.release(self.key),
+        ]
+
+    def record_decision(self, decision: str) -> None:
+        metrics.increment(
+            "throttle_decisions_total", scope=self.scope, decision=decision
+        )
+
+    def finish(self, granted: int, retry_after: int) -> bool:
+        """
+        Keeps the extra leased tokens and returns whether the request is allowed.
+        """
+        if not granted:
+            self.retry_after = retry_after / 1000
+            self.record_decision("throttled")
+            return False
+
+        # the bucket refills the leased tokens in this time
+        leases.add(self.key, granted - 1, timeout=granted / self.refill_rate)
+        self.record_decision("allowed")
+        return True
+
+    def check_local(self, request, view) -> bool | None:
+        """
+        Returns the decision taken without redis, None if redis must be asked.
+        """
+        if self.rate is None:
+            return True
+
+        if (key := self.get_cache_key(request, view)) is None:
+            return True
+
+        self.key = make_cache_key(key)
+        if leases.take(self.key):
+            self.record_decision("local")
+            return True
+        return None
+
+    def allow_request(self, request, view):
+        if (allowed := self.check_local(request, view)) is not None:
+            return allowed
+
+        try:
+            granted, retry_after = get_redis_script(TOKEN_BUCKET_SCRIPT)(
+                keys=[self.key], args=self.get_script_args()
+            )
+        except RedisError as error:
+            logger.warning(f"Failed to throttle {self.scope}: {str(error)}")
+            self.record_decision("error")
+            return True
+
+        return self.finish(int(granted), int(retry_after))
+
+    async def aallow_request(self, request, view) -> bool:
+        """
+        Asyncio version of `allow_request`.
+        """
+        if (allowed := self.check_local(request, view)) is not None:
+            return allowed
+
+        try:
+            granted, retry_after = await get_async_redis_script(TOKEN_BUCKET_SCRIPT)(
+                keys=[self.key], args=self.get_script_args()
+            )
+        except RedisError as error:
+            logger.warning(f"Failed to throttle {self.scope}: {str(error)}")
+            self.record_decision("error")
+            return True
+
+        return self.finish(int(granted), int(retry_after))
+
+    def wait(self):
+        """
+        Returns the number of seconds until the next token, rounded up since it is
+        sent as an integer Retry-After header.
+        """
+        if self.retry_after is None:
+            return None
+        return max(1, math.ceil(self.retry_after))
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Throttles authenticated users, anonymous requests are left to other throttles.
+    """
+
+    scope = "message_user"
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return self.cache_format % {"scope": self.scope, "ident": request.user.pk}
+
+
+class GroupTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Throttles the messages sent to a group, whoever the sender is.
+    The group is read from the `group_id` of the request body.
+    """
+
+    scope = "message_group"
+
+    def get_cache_key(self, request, view):
+        try:
+            group_id = int(request.data.get("group_id"))
+        except (AttributeError, TypeError, ValueError):
+            return None
+        return self.cache_format % {"scope": self.scope, "ident": group_id}
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Throttles requests by client ip, see NUM_PROXIES in the DRF settings.
+    """
+
+    scope = "message_ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": self.get_ident(request),
+        }
+
+
+# the group bucket is shared by all the members, so it is checked last
+MESSAGE_THROTTLE_CLASSES = (
+    UserTokenBucketThrottle,
+    IPTokenBucketThrottle,
+    GroupTokenBucketThrottle,
+)
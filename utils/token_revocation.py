@@ -0,0 +1,247 @@
+"""
+This file contains the jwt revocation list and its bloom filter fast path.
+
+Revoked token ids (jti) are stored in redis as individual keys expiring along with the
+token, and appended to a redis stream. Every process replicates the stream into a local
+bloom filter, refreshed by a background thread, so checking a token which is not
+revoked (the common case) never touches the network. Only bloom filter hits are
+confirmed against redis.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import threading
+from time import monotonic, sleep, time
+from typing import Callable, Iterable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from utils.metrics import metrics
+from utils.redis import get_loop_redis_client, get_redis_client, make_cache_key
+
+logger = logging.getLogger("default")
+
+
+class BloomFilter:
+    """
+    A simple bloom filter over a bytearray, using double hashing of a blake2b digest.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(
+            8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        )  # number of bits
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(
+            digest[8:], "little"
+        )
+        return (
+            (first + index * second) % self.size for index in range(self.hash_count)
+        )
+
+    def add(self, item: str) -> None:
+        """
+        Adds an item to the filter.
+        """
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class TokenRevocationList:
+    """
+    This class is used to revoke jwt tokens and check whether a token is revoked.
+    """
+
+    log_key = "JWT:REVOCATIONS"
+    revoked_key = "JWT:REVOKED"
+
+    def __init__(
+        self, capacity: int, error_rate: float, refresh_interval: float
+    ) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started = False
+        self._listeners = []
+        self._reset()
+        # threads do not survive a fork, forked workers start their own
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started = False
+
+    def _reset(self) -> None:
+        self._bloom_filter = BloomFilter(self.capacity, self.error_rate)
+        self._last_id = None
+        self._last_refresh = None
+
+    def get_revoked_key(self, jti: str) -> str:
+        """
+        Returns the redis key marking a token id as revoked.
+        """
+        return make_cache_key(f"{self.revoked_key}:{jti}")
+
+    def revoke(self, jti: str, expires_at: int) -> None:
+        """
+        Revoke a token id until the token expires.
+        """
+        ttl = int(expires_at - time())
+        if ttl <= 0:
+            return
+
+        client = get_redis_client()
+        pipeline = client.pipeline()
+        pipeline.set(self.get_revoked_key(jti), 1, ex=ttl)
+        pipeline.xadd(make_cache_key(self.log_key), {"jti": jti})
+        # entries older than the token lifetime can never match a valid token
+        pipeline.xtrim(
+            make_cache_key(self.log_key),
+            minid=int((time() - settings.JWT_EXPIRY) * 1000),
+            approximate=True,
+        )
+        pipeline.execute()
+
+        with self._lock:
+            self._bloom_filter.add(jti)
+
+    def add_listener(self, listener: Callable[[list[str]], None]) -> None:
+        """
+        Registers a callable receiving the token ids revoked since the last refresh,
+        called from the refreshing thread.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, jtis: Iterable[str]) -> None:
+        jtis = list(jtis)
+        if not jtis:
+            return
+
+        for listener in list(self._listeners):
+            try:
+                listener(jtis)
+            except Exception as error:
+                logger.warning(f"Failed to notify token revocations: {str(error)}")
+
+    def refresh_due(self) -> bool:
+        """
+        Returns whether the refresh interval has elapsed since the last refresh.
+        """
+        return (
+            self._last_refresh is None
+            or monotonic() - self._last_refresh >= self.refresh_interval
+        )
+
+    def start(self) -> None:
+        """
+        Loads the revocation log into the bloom filter and starts the thread refreshing
+        it every `refresh_interval` seconds, once per process.
+        """
+        with self._start_lock:
+            if self._started:
+                return
+
+            self.refresh(force=True)
+            threading.Thread(
+                target=self._refresh_forever, name="token-revocations", daemon=True
+            ).start()
+            self._started = True
+
+    def _refresh_forever(self) -> None:
+        while True:
+            sleep(self.refresh_interval)
+            try:
+                self.refresh(force=True)
+            except Exception as error:
+                logger.warning(f"Failed to refresh token revocations: {str(error)}")
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Replicate the revocations added since the last refresh into the bloom filter.
+        Refreshes happen at most once every `refresh_interval` seconds.
+        """
+        if not force and not self.refresh_due():
+            return
+
+        with self._lock:
+            self._last_refresh = monotonic()
+            try:
+                entries = get_redis_client().xrange(
+                    make_cache_key(self.log_key),
+                    min=f"({self._last_id}" if self._last_id else "-",
+                )
+            except Exception as error:
+                logger.warning(f"Failed to refresh token revocations: {str(error)}")
+                return
+
+            if self._bloom_filter.count + len(entries) > self.capacity:
+                # filter is saturated, rebuild it from the (trimmed) revocation log
+                self.capacity = max(self.capacity * 2, len(entries) * 2)
+                self._reset()
+                self._last_refresh = monotonic()
+                entries = get_redis_client().xrange(make_cache_key(self.log_key))
+
+            jtis = []
+            for entry_id, fields in entries:
+                jtis.append(fields[b"jti"].decode("utf-8"))
+                self._bloom_filter.add(jtis[-1])
+                self._last_id = entry_id.decode("utf-8")
+
+        self._notify(jtis)
+
+    def is_revoked(self, jti: str | None) -> bool:
+        """
+        Checks whether a token id is revoked.
+        """
+        if not jti:
+            return False
+
+        if not self._started:
+            self.start()
+        if jti not in self._bloom_filter:
+            return False
+
+        metrics.increment("jwt_revocation_bloom_hits_total")
+        return bool(get_redis_client().exists(self.get_revoked_key(jti)))
+
+    async def ais_revoked(self, jti: str | None) -> bool:
+        """
+        Asyncio version of `is_revoked`, the revocations are loaded in a worker thread.
+        """
+        if not jti:
+            return False
+
+        if not self._started:
+            await sync_to_async(self.start, thread_sensitive=False)()
+        if jti not in self._bloom_filter:
+            return False
+
+        metrics.increment("jwt_revocation_bloom_hits_total")
+        return bool(await get_loop_redis_client().exists(self.get_revoked_key(jti)))
+
+
+revoked_tokens = TokenRevocationList(
+    capacity=settings.JWT_REVOCATION_FILTER_CAPACITY,
+    error_rate=settings.JWT_REVOCATION_FILTER_ERROR_RATE,
+    refresh_interval=settings.JWT_REVOCATION_REFRESH_INTERVAL,
+)
@@ -0,0 +1,225 @@
+"""
+This file contains the end to end tracing of group messages.
+
+A sampled message carries a w3c `traceparent` and the timestamps of the hops it went
+through, in kafka headers from the API to the consumer and in celery task headers
+from the consumer to the task persisting it. Once persisted, the latency of every hop
+and the end to end latency are recorded as histograms, and the trace can be exported
+as OTLP/JSON spans to a local file (readable by the OpenTelemetry collector).
+
+Hops, in order:
+    api - message produced by the API
+    polled - message consumed from kafka by the consumer
+    task_started - celery task persisting the message started
+    persisted - message written to postgres
+"""
+
+import json
+import logging
+import os
+import threading
+from functools import cache
+from time import time
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from utils.metrics import metrics
+
+logger = logging.getLogger("default")
+
+TRACEPARENT_HEADER = "traceparent"
+HOPS_HEADER = "wm-hops"
+CELERY_TRACES_HEADER = "wm_traces"
+
+E2E_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (span name, start hop, end hop), children of the root span covering the whole trip
+SPANS = (
+    ("kafka", "api", "polled"),
+    ("celery.queue", "polled", "task_started"),
+    ("db.persist", "task_started", "persisted"),
+)
+
+
+def new_span_id() -> str:
+    return os.urandom(8).hex()
+
+
+def start_trace() -> Optional[List[Tuple[str, bytes]]]:
+    """
+    Returns the kafka headers starting the trace of a message, None if not sampled.
+    """
+    if not metrics.should_sample(settings.TRACING_SAMPLE_RATE):
+        return None
+
+    traceparent = f"00-{os.urandom(16).hex()}-{new_span_id()}-01"
+    return [
+        (TRACEPARENT_HEADER, traceparent.encode("utf-8")),
+        (HOPS_HEADER, json.dumps({"api": time()}).encode("utf-8")),
+    ]
+
+
+def extract_trace(headers: Optional[Iterable[Tuple[str, bytes]]]) -> Optional[dict]:
+    """
+    Returns the trace carried by the kafka headers of a consumed message, with the
+    polled hop recorded. Returns None for messages which are not traced.
+    """
+    headers = dict(headers or ())
+    if TRACEPARENT_HEADER not in headers:
+        return None
+
+    try:
+        trace = {
+            "traceparent": headers[TRACEPARENT_HEADER].decode("utf-8"),
+            "hops": json.loads(headers.get(HOPS_HEADER) or b"{}"),
+        }
+    except ValueError as error:
+        logger.warning(f"Ignoring invalid trace headers: {str(error)}")
+        return None
+
+    record_hop(trace, "polled")
+    return trace
+
+
+def record_hop(trace: Optional[dict], hop: str, timestamp: Optional[float] = None):
+    """
+    Records the time a traced message went through a hop.
+    """
+    if trace is not None:
+        trace["hops"][hop] = time() if timestamp is None else timestamp
+
+
+def get_task_traces(request) -> Optional[list]:
+    """
+    Returns the traces sent in the headers of a celery task. Custom headers are
+    attributes of the request when run by a worker, and in `headers` when run eagerly.
+    """
+    return getattr(request, CELERY_TRACES_HEADER, None) or (
+        getattr(request, "headers", None) or {}
+    ).get(CELERY_TRACES_HEADER)
+
+
+def finish_traces(traces: Iterable[Optional[dict]]) -> None:
+    """
+    Records the hop and end to end latencies of persisted messages and exports them.
+    """
+    traces = [trace for trace in traces if trace is not None]
+    if not traces:
+        return
+
+    for trace in traces:
+        hops = trace["hops"]
+        for name, start, end in SPANS:
+            if start in hops and end in hops:
+                metrics.observe(
+                    "message_hop_latency_seconds",
+                    hops[end] - hops[start],
+                    buckets=E2E_LATENCY_BUCKETS,
+                    hop=name,
+                )
+        if "api" in hops and "persisted" in hops:
+            metrics.observe(
+                "message_e2e_latency_seconds",
+                hops["persisted"] - hops["api"],
+                buckets=E2E_LATENCY_BUCKETS,
+            )
+
+    if exporter := get_exporter():
+        exporter.export(traces)
+
+
+class OTLPFileExporter:
+    """
+    This class writes traces as OTLP/JSON, one export request per line.
+    """
+
+    def __init__(self, path: str, service_name: str) -> None:
+        self.path = path
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def to_nanoseconds(timestamp: float) -> str:
+        # 64 bit integers are strings in OTLP/JSON
+        return str(int(timestamp * 1_000_000_000))
+
+    def get_spans(self, trace: dict) -> list:
+        """
+        Returns the spans of a trace, the root span covers the first to the last hop.
+        """
+        _version, trace_id, root_span_id, _flags = trace["traceparent"].split("-")
+        hops = trace["hops"]
+        if not hops:
+            return []
+
+        spans = [
+            {
+                "traceId": trace_id,
+                "spanId": root_span_id,
+                "name": "group_message",
+                "kind": 1,
+                "startTimeUnixNano": self.to_nanoseconds(min(hops.values())),
+                "endTimeUnixNano": self.to_nanoseconds(max(hops.values())),
+            }
+        ]
+        for name, start, end in SPANS:
+            if start in hops and end in hops:
+                spans.append(
+                    {
+                        "traceId": trace_id,
+                        "spanId": new_span_id(),
+                        "parentSpanId": root_span_id,
+                        "name": name,
+                        "kind": 1,
+                        "startTimeUnixNano": self.to_nanoseconds(hops[start]),
+                        "endTimeUnixNano": self.to_nanoseconds(hops[end]),
+                    }
+                )
+        return spans
+
+    def export(self, traces: List[dict]) -> None:
+        """
+        Appends the spans of the traces to the export file.
+        """
+        try:
+            spans = [span for trace in traces for span in self.get_spans(trace)]
+        except ValueError as error:
+            logger.warning(f"Failed to export traces: {str(error)}")
+            return
+
+        line = json.dumps(
+            {
+                "resourceSpans": [
+                    {
+                        "resource": {
+                            "attributes": [
+                                {
+                                    "key": "service.name",
+                                    "value": {"stringValue": self.service_name},
+                                }
+                            ]
+                        },
+                        "scopeSpans": [
+                            {"scope": {"name": "wemessage.tracing"}, "spans": spans}
+                        ],
+                    }
+                ]
+            },
+            separators=(",", ":"),
+        )
+        with self._lock:
+            with open(self.path, "a") as file:
+                file.write(line + "\n")
+
+
+@cache
+def get_exporter() -> Optional[OTLPFileExporter]:
+    """
+    Returns the trace exporter of the process, None if exporting is disabled.
+    """
+    if not settings.TRACING_EXPORT_PATH:
+        return None
+    return OTLPFileExporter(
+        settings.TRACING_EXPORT_PATH, service_name=settings.TRACING_SERVICE_NAME
+    )
@@ -0,0 +1,11 @@
+"""
+This module contains all the v1 urls for the utils app.
+"""
+
+from django.urls import path
+
+from utils.apis.v1 import *
+
+urlpatterns = [
+    path("metrics/", MetricsAPI.as_view(), name="metrics"),
+]
@@ -2,6 +2,8 @@
 ASGI config for wemessage project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Real-time connections (websockets and server sent events) are served by the
+realtime package, every other request by django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +15,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wemessage.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once django is set up, since it depends on models and settings
+from realtime.app import RealtimeApplication  # noqa: E402
+
+application = RealtimeApplication(django_application)
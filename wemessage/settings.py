@@ -50,6 +50,7 @@ SYSTEM_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 ]
 
 USER_DEFINED_APPS = [
@@ -134,23 +135,57 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
+    # token bucket rates (see utils.throttling), a rate of "off" disables the throttle
+    "DEFAULT_THROTTLE_RATES": {
+        "message_user": os.environ.get("THROTTLE_MESSAGE_USER_RATE") or "120/min",
+        "message_group": os.environ.get("THROTTLE_MESSAGE_GROUP_RATE") or "1200/min",
+        "message_ip": os.environ.get("THROTTLE_MESSAGE_IP_RATE") or "600/min",
+    },
+    # nginx sits in front of the servers, client ips are read from X-Forwarded-For
+    "NUM_PROXIES": int(os.environ.get("NUM_PROXIES") or 1),
 }
 
+# Tokens leased at once from a redis bucket and spent locally
+THROTTLE_LEASE_SIZE = int(os.environ.get("THROTTLE_LEASE_SIZE") or 5)
+# Longest a lease is kept, leases also expire once the bucket refilled their tokens
+THROTTLE_LEASE_TIMEOUT = float(
+    os.environ.get("THROTTLE_LEASE_TIMEOUT") or 1
+)  # in seconds
+# Maximum number of buckets with leased tokens per process
+THROTTLE_LEASE_CACHE_SIZE = int(os.environ.get("THROTTLE_LEASE_CACHE_SIZE") or 10000)
+
 AUTHENTICATION_BACKENDS = [
     "utils.authentication.CustomModelBackend",
 ]
 
-REDIS_LOCATION = (
-    "redis://"
-    ":"
-    f'{os.environ["REDIS_PASSWORD"]}'
-    "@"
-    f'{os.environ["REDIS_HOST"]}'
-    ":"
-    f'{os.environ["REDIS_PORT"]}'
-    "/0"
-)
-
+# Login
+# Password checks run on a bounded pool, logins beyond capacity are rejected
+LOGIN_HASHER_WORKERS = int(os.environ.get("LOGIN_HASHER_WORKERS") or 2)
+LOGIN_HASHER_QUEUE_SIZE = int(os.environ.get("LOGIN_HASHER_QUEUE_SIZE") or 8)
+LOGIN_HASHER_TIMEOUT = float(os.environ.get("LOGIN_HASHER_TIMEOUT") or 5)  # in seconds
+# Maximum login attempts per account within the window
+LOGIN_RATE_LIMIT = int(os.environ.get("LOGIN_RATE_LIMIT") or 10)
+LOGIN_RATE_LIMIT_WINDOW = int(
+    os.environ.get("LOGIN_RATE_LIMIT_WINDOW") or 60 * 5
+)  # in seconds
+
+# "redis" for the redis server, "fake" for an in-process fakeredis server, used for
+# benchmarks and soak tests on a single machine (requires fakeredis and lupa)
+REDIS_BACKEND = os.environ.get("REDIS_BACKEND") or "redis"
+
+if REDIS_BACKEND == "fake":
+    REDIS_LOCATION = "redis://localhost:6379/0"
+else:
+    REDIS_LOCATION = (
+        "redis://"
+        ":"
+        f'{os.environ["REDIS_PASSWORD"]}'
+        "@"
+        f'{os.environ["REDIS_HOST"]}'
+        ":"
+        f'{os.environ["REDIS_PORT"]}'
+        "/0"
+    )
 
 CACHES = {
     "default": {
@@ -165,6 +200,19 @@ CACHES = {
     }
 }
 
+if REDIS_BACKEND == "fake":
+    from fakeredis import FakeConnection
+
+    CACHES["default"]["OPTIONS"]["CONNECTION_POOL_KWARGS"] = {
+        "connection_class": FakeConnection
+    }
+
+# Timeout for model instances cached with a row version.
+# Versioned writes can never regress cached state, so these can live longer.
+VERSIONED_CACHE_TIMEOUT = int(
+    os.environ.get("VERSIONED_CACHE_TIMEOUT") or 60 * 60 * 24
+)  # in seconds
+
 if os.environ.get("LOGGING", "False").lower() == "true":
     LOGGING = {
         "version": 1,
@@ -207,6 +255,117 @@ if os.environ.get("LOGGING", "False").lower() == "true":
     }
 
 MESSAGE_CONSUMER_TOPIC = "message-app"
+# Changes of groups, group members and users are written to an outbox by the services
+# and relayed to this topic (see utils.outbox). The topic must be in KAFKA_TOPICS, and
+# the tables can then be dropped from the debezium table.include.list
+OUTBOX_ENABLED = (os.environ.get("OUTBOX_ENABLED") or "False").lower() == "true"
+OUTBOX_TOPIC = "outbox"
+OUTBOX_RELAY_BATCH_SIZE = int(os.environ.get("OUTBOX_RELAY_BATCH_SIZE") or 500)
+OUTBOX_RELAY_INTERVAL = float(
+    os.environ.get("OUTBOX_RELAY_INTERVAL") or 0.5
+)  # in seconds
+# "kafka" for the kafka brokers, "memory" for the in-process stand-in (benchmarks)
+KAFKA_TRANSPORT = os.environ.get("KAFKA_TRANSPORT") or "kafka"
+# Serve POST /v1/groups/message/ with the asyncio view, only for ASGI workers
+ASYNC_MESSAGE_API = (os.environ.get("ASYNC_MESSAGE_API") or "False").lower() == "true"
+# Number of partitions of every topic of the in-process stand-in
+KAFKA_MEMORY_PARTITIONS = int(os.environ.get("KAFKA_MEMORY_PARTITIONS") or 3)
+# Group messages are sent as "msgpack" (compact, versioned) or "json",
+# consumers decode both (see utils.kafka_mixins.wire)
+KAFKA_WIRE_FORMAT = os.environ.get("KAFKA_WIRE_FORMAT") or "msgpack"
+# Compression of the record batches (gzip, snappy, lz4, zstd), "none" disables it
+KAFKA_COMPRESSION_TYPE = os.environ.get("KAFKA_COMPRESSION_TYPE") or "lz4"
+if KAFKA_COMPRESSION_TYPE == "none":
+    KAFKA_COMPRESSION_TYPE = None
+
+# Real-time delivery, served by the ASGI application (see realtime package)
+REALTIME_WEBSOCKET_PATH = "/v1/realtime/ws/"
+REALTIME_SSE_PATH = "/v1/realtime/sse/"
+# Frames buffered per connection, connections falling further behind are closed
+REALTIME_QUEUE_SIZE = int(os.environ.get("REALTIME_QUEUE_SIZE") or 64)
+# Nodes renew their node registry entries at this interval, entries of nodes which
+# miss two heartbeats expire
+REALTIME_REGISTRY_REFRESH_INTERVAL = int(
+    os.environ.get("REALTIME_REGISTRY_REFRESH_INTERVAL") or 30
+)  # in seconds
+REALTIME_HEARTBEAT_INTERVAL = int(
+    os.environ.get("REALTIME_HEARTBEAT_INTERVAL") or 25
+)  # in seconds
+
+# Number of newest messages of each group buffered in redis, should be larger
+# than the maximum page size of the group messages API.
+GROUP_RECENT_MESSAGES_SIZE = int(os.environ.get("GROUP_RECENT_MESSAGES_SIZE") or 200)
+GROUP_RECENT_MESSAGES_TIMEOUT = int(
+    os.environ.get("GROUP_RECENT_MESSAGES_TIMEOUT") or 60 * 60 * 24 * 7
+)  # in seconds
+
+# Group sequences and read cursors are held in redis and flushed to postgres
+READ_STATE_FLUSH_INTERVAL = int(
+    os.environ.get("READ_STATE_FLUSH_INTERVAL") or 10
+)  # in seconds
+READ_STATE_FLUSH_BATCH_SIZE = int(os.environ.get("READ_STATE_FLUSH_BATCH_SIZE") or 1000)
+
+# Per user index of groups ordered by activity, expires when not read
+USER_GROUPS_INDEX_TIMEOUT = int(
+    os.environ.get("USER_GROUPS_INDEX_TIMEOUT") or 60 * 60 * 24 * 7
+)  # in seconds
+# Pages of the groups of a user are read from a view refreshed at this interval
+USER_GROUPS_VIEW_TIMEOUT = float(
+    os.environ.get("USER_GROUPS_VIEW_TIMEOUT") or 5
+)  # in seconds
+
+# Group messages are partitioned monthly, see manage_message_partitions command.
+GROUP_MESSAGE_PARTITIONS_AHEAD = int(
+    os.environ.get("GROUP_MESSAGE_PARTITIONS_AHEAD") or 3
+)
+# Partitions older than this many months are detached, 0 keeps all of them.
+GROUP_MESSAGE_RETENTION_MONTHS = int(
+    os.environ.get("GROUP_MESSAGE_RETENTION_MONTHS") or 0
+)
+
+# Adaptive batching of the group message consumer, see utils.batching
+CONSUMER_WRITE_LATENCY_TARGET = float(
+    os.environ.get("CONSUMER_WRITE_LATENCY_TARGET") or 0.2
+)  # in seconds
+CONSUMER_BATCH_SIZE = int(os.environ.get("CONSUMER_BATCH_SIZE") or 500)  # initial size
+CONSUMER_BATCH_SIZE_MIN = int(os.environ.get("CONSUMER_BATCH_SIZE_MIN") or 25)
+CONSUMER_BATCH_SIZE_MAX = int(os.environ.get("CONSUMER_BATCH_SIZE_MAX") or 2000)
+CONSUMER_LINGER_MIN = float(os.environ.get("CONSUMER_LINGER_MIN") or 0.01)  # in seconds
+CONSUMER_LINGER_MAX = float(os.environ.get("CONSUMER_LINGER_MAX") or 1)  # in seconds
+CONSUMER_BATCH_ADJUST_INTERVAL = float(
+    os.environ.get("CONSUMER_BATCH_ADJUST_INTERVAL") or 1
+)  # in seconds
+CONSUMER_WRITE_LATENCY_SAMPLES = int(
+    os.environ.get("CONSUMER_WRITE_LATENCY_SAMPLES") or 200
+)
+# Lag monitoring of the message consumer, see utils.kafka_mixins.lag_monitor
+CONSUMER_LAG_INTERVAL = float(
+    os.environ.get("CONSUMER_LAG_INTERVAL") or 10
+)  # in seconds
+# Port of the consumer health and metrics http server, 0 disables it
+CONSUMER_HEALTH_PORT = int(os.environ.get("CONSUMER_HEALTH_PORT") or 8003)
+
+# Message search
+MESSAGE_SEARCH_BACKEND = (
+    os.environ.get("MESSAGE_SEARCH_BACKEND")
+    or "groups.search.postgres.PostgresSearchBackend"
+)
+# Text search configuration used to index and query messages
+MESSAGE_SEARCH_CONFIG = os.environ.get("MESSAGE_SEARCH_CONFIG") or "english"
+
+# Tracing of group messages from the API to postgres, see utils.tracing
+TRACING_SAMPLE_RATE = float(os.environ.get("TRACING_SAMPLE_RATE") or 0.1)
+# Traces are exported as OTLP/JSON lines to this file, empty disables exporting
+TRACING_EXPORT_PATH = os.environ.get("TRACING_EXPORT_PATH") or ""
+TRACING_SERVICE_NAME = os.environ.get("TRACING_SERVICE_NAME") or "wemessage"
+
+# Metrics
+METRICS_ENABLED = (os.environ.get("METRICS_ENABLED") or "True").lower() == "true"
+METRICS_FLUSH_INTERVAL = int(
+    os.environ.get("METRICS_FLUSH_INTERVAL") or 10
+)  # in seconds
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or ""
+CACHE_METRICS_SAMPLE_RATE = float(os.environ.get("CACHE_METRICS_SAMPLE_RATE") or 0.05)
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -230,6 +389,21 @@ AUTH_USER_MODEL = "users.User"
 
 JWT_AUDIENCE = os.environ["JWT_AUDIENCE"]
 JWT_ISSUER = os.environ["JWT_ISSUER"]
+JWT_EXPIRY = int(os.environ.get("JWT_EXPIRY") or 60 * 60 * 24 * 3)  # in seconds
+# Maximum number of verified tokens cached per process
+JWT_VERIFIED_TOKEN_CACHE_SIZE = int(
+    os.environ.get("JWT_VERIFIED_TOKEN_CACHE_SIZE") or 10000
+)
+# Revoked tokens are replicated into a per process bloom filter
+JWT_REVOCATION_FILTER_CAPACITY = int(
+    os.environ.get("JWT_REVOCATION_FILTER_CAPACITY") or 100000
+)
+JWT_REVOCATION_FILTER_ERROR_RATE = float(
+    os.environ.get("JWT_REVOCATION_FILTER_ERROR_RATE") or 0.001
+)
+JWT_REVOCATION_REFRESH_INTERVAL = float(
+    os.environ.get("JWT_REVOCATION_REFRESH_INTERVAL") or 1
+)  # in seconds
 
 
 # Internationalization
@@ -7,4 +7,5 @@ from django.urls import include, path
 urlpatterns = [
     path("users/", include("users.urls.v1")),
     path("groups/", include("groups.urls.v1")),
+    path("utils/", include("utils.urls.v1")),
 ]